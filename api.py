@@ -0,0 +1,169 @@
+"""API HTTP/JSON local sobre ``services``.
+
+Servidor ligero (``http.server`` de la biblioteca estándar, un hilo por
+petición) para integraciones que necesitan registrar o finalizar rentas
+sin pasar por la interfaz de Streamlit. Escucha solo en ``127.0.0.1`` por
+defecto; con ``--token`` (o ``RENTAPP_API_TOKEN``) cada petición debe
+enviar ``Authorization: Bearer <token>``.
+
+Rutas:
+
+- ``GET /equipos?q=texto&limit=N`` y ``GET /clientes?q=texto&limit=N``: búsqueda de texto
+- ``GET /rentas/activas``: rentas con equipos rentados
+- ``POST /equipos`` y ``POST /clientes``: un objeto o una lista; regresa ``{"ids": [...]}``
+- ``PATCH /equipos/<id>`` y ``PATCH /clientes/<id>``: ``{"valores": {...}, "version": N}``; solo cambian las columnas dadas
+- ``DELETE /equipos/<id>?version=N`` y ``DELETE /clientes/<id>?version=N``
+- ``POST /rentas``: una renta o una lista (ver ``services.renta_operations``), en una transacción
+- ``POST /rentas/finalizar``: ``{"ids": [...]}``; ``POST /rentas/<id>/finalizar``: ``{"version": N}``
+
+Los datos inválidos responden 400, los conflictos de concurrencia o de
+disponibilidad 409 y las rutas desconocidas 404.
+
+Uso: ``python -m api [--db ruta] [--puerto 8502] [--host 127.0.0.1] [--token TOKEN]``
+"""
+import argparse
+import hmac
+import json
+import os
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import database
+import migrations
+import services
+import tracing
+
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _records(df):
+    """Filas de un DataFrame como objetos JSON"""
+    return json.loads(df.to_json(orient="records", force_ascii=False))
+
+
+def _as_list(body):
+    return body if isinstance(body, list) else [body]
+
+
+def _object(body):
+    """El cuerpo de las rutas que esperan un objeto JSON"""
+    if not isinstance(body, dict):
+        raise ApiError(400, "El cuerpo debe ser un objeto JSON")
+    return body
+
+
+def route(db_path, rates, method, path, query, body):
+    """Resolver una petición; regresa el objeto JSON de la respuesta"""
+    parts = [part for part in path.split("/") if part]
+    if method == "GET" and len(parts) == 1 and parts[0] in ("equipos", "clientes"):
+        limit = min(int(query.get("limit", ["50"])[0]), 1000)
+        order_by = "marca" if parts[0] == "equipos" else "nombre"
+        return _records(database.search(db_path, parts[0], query.get("q", [""])[0], limit=limit, order_by=order_by))
+    if method == "GET" and parts == ["rentas", "activas"]:
+        return _records(database.active_rentals(db_path, date.today()))
+    if method == "POST" and len(parts) == 1 and parts[0] in ("equipos", "clientes"):
+        return {"ids": services.register(db_path, parts[0], _as_list(body))}
+    if method == "PATCH" and len(parts) == 2 and parts[0] in ("equipos", "clientes"):
+        update = services.update_equipo if parts[0] == "equipos" else services.update_cliente
+        body = _object(body)
+        return {"filas": update(db_path, parts[1], body.get("valores", {}), body.get("version"))}
+    if method == "DELETE" and len(parts) == 2 and parts[0] in ("equipos", "clientes"):
+        version = query.get("version", [None])[0]
+        return {"filas": services.delete_record(db_path, parts[0], parts[1], version)}
+    if method == "POST" and parts == ["rentas"]:
+        return {"ids": services.create_rentas(db_path, _as_list(body), rates)}
+    if method == "POST" and parts == ["rentas", "finalizar"]:
+        ids = _object(body).get("ids", [])
+        if not isinstance(ids, list) or not all(isinstance(id_renta, str) for id_renta in ids):
+            raise ApiError(400, "ids debe ser una lista de IDs de renta")
+        return {"finalizadas": services.finalize_rentas(db_path, ids)}
+    if method == "POST" and len(parts) == 3 and parts[0] == "rentas" and parts[2] == "finalizar":
+        return {"filas": services.finalize_renta(db_path, parts[1], _object(body).get("version"))}
+    raise ApiError(404, f"Ruta desconocida: {method} {path}")
+
+
+def make_handler(db_path, rates, token=None):
+    """Clase de manejador para `ThreadingHTTPServer` ligada a una base y unas tarifas"""
+
+    class Handler(BaseHTTPRequestHandler):
+        server_version = "RentappAPI/1.0"
+
+        def _reply(self, status, payload):
+            data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _handle(self):
+            url = urlsplit(self.path)
+            with tracing.span(f"api.{self.command.lower()}", path=url.path) as span:
+                try:
+                    if token and not hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {token}"):
+                        raise ApiError(401, "Token inválido")
+                    length = int(self.headers.get("Content-Length") or 0)
+                    if length > MAX_BODY_BYTES:
+                        raise ApiError(413, "Cuerpo demasiado grande")
+                    try:
+                        body = json.loads(self.rfile.read(length) or b"{}")
+                    except ValueError:
+                        raise ApiError(400, "El cuerpo no es JSON válido") from None
+                    status, payload = 200, route(db_path, rates, self.command, url.path, parse_qs(url.query), body)
+                except ApiError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except services.ValidationError as e:
+                    status, payload = 400, {"error": str(e)}
+                except database.ConflictError as e:
+                    status, payload = 409, {"error": str(e)}
+                except ValueError as e:
+                    status, payload = 400, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": f"Error interno: {e}"}
+                if span:
+                    span.set(status=status)
+                self._reply(status, payload)
+
+        do_GET = do_POST = do_PATCH = do_DELETE = _handle
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(db_path, host="127.0.0.1", port=8502, token=None, rates=None):
+    """Crear el servidor (sin iniciarlo); ``serve_forever()`` atiende las peticiones"""
+    migrations.migrate(db_path)
+    rates = rates or services.load_rates()
+    return ThreadingHTTPServer((host, port), make_handler(db_path, rates, token))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="rentapp_database.db")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8502)
+    parser.add_argument("--token", default=os.environ.get("RENTAPP_API_TOKEN"))
+    parser.add_argument("--tarifas", help="archivo TOML con la sección [TARIFAS] (por defecto .streamlit/secrets.toml)")
+    args = parser.parse_args()
+
+    server = serve(args.db, args.host, args.puerto, args.token, services.load_rates(args.tarifas))
+    print(f"API en http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,26 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
-import sqlite3
 import os
 from datetime import datetime, timedelta
-import bcrypt
-import re
-from github import Github
 import json
 import tempfile
+import atexit
+
+import archive
+import auth
+import availability
+import database
+import exporter
+import importer
+import migrations
+import quote
+import reminders
+import rollups
+import services
+import snapshots
+import sync
+import tracing
 
 # Configuración de la página
 st.set_page_config(page_title="Arrendamiento MarTech Rent", layout="wide")
@@ -58,6 +71,50 @@ st.markdown("""
 # Configuración de GitHub
 GITHUB_TOKEN = st.secrets.get("GITHUB_TOKEN", None)
 REPO_NAME = "Yorchemtz24/rentapp"
+SYNC_DEBOUNCE_SECONDS = float(st.secrets.get("SYNC_DEBOUNCE_SECONDS", 10))
+SYNC_DIR = st.secrets.get("SYNC_DIR", None)
+
+# Sesiones: firma de tokens y vigencia
+SESSION_SECRET = st.secrets.get("SESSION_SECRET", None)
+SESSION_TTL_HOURS = float(st.secrets.get("SESSION_TTL_HOURS", 12))
+# El token viaja en una cookie y no en la URL (historial, encabezado Referer, enlaces copiados)
+SESSION_COOKIE = "martech_sesion"
+
+# Días hacia adelante para considerar una renta "por vencer"
+EXPIRY_HORIZON_DAYS = int(st.secrets.get("EXPIRY_HORIZON_DAYS", 3))
+
+# Recordatorios de rentas por vencer (sección [RECORDATORIOS]; sin `envio` no se envían)
+REMINDERS_CONFIG = dict(st.secrets.get("RECORDATORIOS", {}))
+
+# Instrumentación para el panel de diagnóstico (apagada por defecto)
+TRACING_ENABLED = bool(st.secrets.get("TRACING_ENABLED", False))
+TRACING_EXPORT = st.secrets.get("TRACING_EXPORT", None)
+TRACING_WINDOW = int(st.secrets.get("TRACING_WINDOW", 1000))
+ADMIN_USERS = list(st.secrets.get("ADMIN_USERS", ["admin"]))
+
+# Tarifas por duración, descuentos por volumen e IVA de las cotizaciones (sección [TARIFAS])
+RATES = quote.rate_table(st.secrets.get("TARIFAS", {}))
+
+@st.cache_resource
+def get_tracer():
+    """Configurar la instrumentación una sola vez por proceso"""
+    return tracing.configure(TRACING_ENABLED, TRACING_WINDOW, TRACING_EXPORT)
+
+get_tracer()
+
+@st.cache_resource
+def get_session_secret():
+    """Llave para firmar tokens de sesión (aleatoria por proceso si no se configura)"""
+    return SESSION_SECRET.encode("utf-8") if SESSION_SECRET else os.urandom(32)
+
+def set_session_cookie(token, max_age):
+    """Guardar (o con `max_age` 0, borrar) la cookie de sesión del navegador.
+
+    Streamlit solo permite leer cookies, así que se escribe desde un
+    componente HTML del mismo origen; se lee al recargar con ``st.context.cookies``.
+    """
+    cookie = f"{SESSION_COOKIE}={token}; path=/; max-age={int(max_age)}; SameSite=Strict"
+    components.html(f"<script>window.parent.document.cookie = {json.dumps(cookie)};</script>", height=0)
 
 # SOLUCIÓN MEJORADA: Configuración de base de datos persistente
 def get_db_path():
@@ -75,179 +132,232 @@ def get_db_path():
 
 DB_PATH = get_db_path()
 
+@st.cache_resource
+def get_snapshot_store():
+    """Destino de los snapshots: GitHub si hay token, o un directorio local (SYNC_DIR)"""
+    if GITHUB_TOKEN:
+        repo = sync.github_repo(GITHUB_TOKEN, REPO_NAME)
+    elif SYNC_DIR:
+        repo = sync.LocalRepo(SYNC_DIR)
+    else:
+        return None
+    return snapshots.SnapshotStore(repo)
+
 # Función mejorada para descargar base de datos de GitHub
 def download_db_from_github():
-    """Descargar base de datos desde GitHub si existe"""
-    if not GITHUB_TOKEN:
+    """Restaurar la base de datos desde los snapshots (o la copia completa heredada)"""
+    store = get_snapshot_store()
+    if store is None:
         return False
     
     try:
-        g = Github(GITHUB_TOKEN)
-        repo = g.get_repo(REPO_NAME)
-        
-        try:
-            contents = repo.get_contents("db/database.db")
-            with open(DB_PATH, "wb") as f:
-                f.write(contents.decoded_content)
+        if store.restore(DB_PATH) or sync.download_file(store.repo, DB_PATH):
             st.info("✅ Base de datos descargada desde GitHub")
             return True
-        except:
-            st.info("ℹ️ No se encontró base de datos en GitHub, creando nueva...")
-            return False
+        st.info("ℹ️ No se encontró base de datos en GitHub, creando nueva...")
+        return False
     except Exception as e:
         st.warning(f"⚠️ No se pudo descargar desde GitHub: {e}")
         return False
 
+@st.cache_resource
+def get_sync_worker():
+    """Sincronizador de fondo compartido por todas las sesiones del proceso"""
+    store = get_snapshot_store()
+    if store is None:
+        return None
+    # Las particiones del historial se suben solo cuando cambian
+    particiones_enviadas = {}
+
+    def push():
+        resultado = store.push(DB_PATH)
+        archive.push_partitions(store.repo, DB_PATH, particiones_enviadas)
+        return resultado
+
+    worker = sync.SyncWorker(push, debounce_seconds=SYNC_DEBOUNCE_SECONDS)
+    atexit.register(worker.stop)
+    return worker
+
 # Función mejorada para subir base de datos a GitHub
 def upload_db_to_github():
-    """Subir base de datos a GitHub"""
-    if not GITHUB_TOKEN:
-        st.warning("⚠️ GitHub token no configurado. Los cambios solo se guardan localmente.")
-        return True
+    """Programar la subida de la base de datos a GitHub en segundo plano"""
+    worker = get_sync_worker()
+    if worker is not None:
+        worker.mark_dirty()
+    return True
+
+def show_sync_status():
+    """Mostrar el estado de la sincronización con GitHub"""
+    worker = get_sync_worker()
+    if worker is None:
+        st.caption("💾 Sincronización no configurada: los cambios solo se guardan localmente")
+        return
+    status = worker.status()
+    if status["last_error"]:
+        st.warning(f"⚠️ No se pudo sincronizar con GitHub: {status['last_error']}")
+    if status["pending"]:
+        st.caption("🔄 Sincronización pendiente")
+    elif status["last_success"]:
+        st.caption(f"☁️ Sincronizado {status['last_success']:%H:%M:%S}")
+
+# Inicialización mejorada de base de datos
+@st.cache_resource(show_spinner=False)
+def _initialize_db_once():
+    """Descargar, migrar y preparar la base una sola vez por proceso"""
+    # Primero intentar descargar desde GitHub si no existe localmente
+    if not os.path.exists(DB_PATH):
+        download_db_from_github()
     
-    try:
-        if not os.path.exists(DB_PATH):
-            return False
-            
-        g = Github(GITHUB_TOKEN)
-        repo = g.get_repo(REPO_NAME)
-        
-        with open(DB_PATH, "rb") as file:
-            content = file.read()
-        
+    cambios = migrations.migrate(DB_PATH)
+    store = get_snapshot_store()
+    if store is not None:
+        # Las particiones del historial no se suben con la base principal
         try:
-            # Intentar actualizar archivo existente
-            contents = repo.get_contents("db/database.db")
-            repo.update_file(contents.path, "Update database.db", content, contents.sha)
-        except:
-            # Crear archivo si no existe
-            repo.create_file("db/database.db", "Create database.db", content)
-        
-        st.success("✅ Base de datos sincronizada con GitHub")
-        return True
-    except Exception as e:
-        st.warning(f"⚠️ No se pudo sincronizar con GitHub: {e}")
-        return True
+            archive.restore_partitions(store.repo, DB_PATH)
+        except Exception as e:
+            st.warning(f"⚠️ No se pudo descargar el historial de rentas: {e}")
+    
+    # Crear usuario admin por defecto si no existe
+    with database.transaction(DB_PATH) as conn:
+        if auth.create_user(conn, "admin", "12345"):
+            database.touch(DB_PATH, "usuarios")
+            cambios.append("admin")
+    
+    # Programar la subida a GitHub solo si la inicialización cambió algo
+    if cambios:
+        upload_db_to_github()
+    return cambios
 
-# Inicialización mejorada de base de datos
 def initialize_db():
     """Inicializar la base de datos con persistencia mejorada"""
     try:
-        # Primero intentar descargar desde GitHub si no existe localmente
-        if not os.path.exists(DB_PATH):
-            download_db_from_github()
-        
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Crear tablas si no existen
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS equipos (
-                id_equipo TEXT PRIMARY KEY,
-                marca TEXT,
-                modelo TEXT,
-                caracteristicas TEXT,
-                estado TEXT,
-                precio_base REAL
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS clientes (
-                id_cliente TEXT PRIMARY KEY,
-                nombre TEXT,
-                contacto TEXT,
-                correo TEXT
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS rentas (
-                id_renta TEXT PRIMARY KEY,
-                cliente TEXT,
-                contacto TEXT,
-                equipos TEXT,
-                fecha_inicio TEXT,
-                fecha_fin TEXT,
-                subtotal REAL,
-                precio REAL
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS usuarios (
-                usuario TEXT PRIMARY KEY,
-                password TEXT
-            )
-        """)
-        
-        # Crear usuario admin por defecto si no existe
-        cursor.execute("SELECT COUNT(*) FROM usuarios WHERE usuario = 'admin'")
-        if cursor.fetchone()[0] == 0:
-            hashed_password = bcrypt.hashpw("12345".encode('utf-8'), bcrypt.gensalt())
-            cursor.execute("INSERT INTO usuarios (usuario, password) VALUES (?, ?)",
-                          ("admin", hashed_password.decode('utf-8')))
-        
-        conn.commit()
-        conn.close()
-        
-        # Subir a GitHub después de inicializar
-        upload_db_to_github()
+        # Si falla no queda en caché y se reintenta en el siguiente rerun
+        _initialize_db_once()
         return True
-        
     except Exception as e:
         st.error(f"Error inicializando base de datos: {e}")
         return False
 
 # Funciones auxiliares mejoradas
 def read_table(table_name):
-    """Leer tabla de la base de datos con reintentos"""
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            conn = sqlite3.connect(DB_PATH, timeout=30)
-            df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
-            conn.close()
-            return df
-        except Exception as e:
-            if attempt == max_retries - 1:
-                st.error(f"Error leyendo tabla {table_name}: {e}")
-                return pd.DataFrame()
-            st.warning(f"Reintentando lectura de tabla {table_name}... (intento {attempt + 1})")
-
-def write_table(table_name, df):
-    """Escribir tabla en la base de datos con reintentos y sincronización"""
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            conn = sqlite3.connect(DB_PATH, timeout=30)
-            df.to_sql(table_name, conn, if_exists='replace', index=False)
-            conn.close()
-            
-            # Sincronizar con GitHub después de escribir
-            upload_db_to_github()
-            return True
-        except Exception as e:
-            if attempt == max_retries - 1:
-                st.error(f"Error escribiendo tabla {table_name}: {e}")
-                return False
-            st.warning(f"Reintentando escritura en tabla {table_name}... (intento {attempt + 1})")
+    """Leer tabla de la base de datos (los bloqueos se reintentan con espera en la capa de datos)"""
+    try:
+        return database.read_table(DB_PATH, table_name)
+    except Exception as e:
+        st.error(f"Error leyendo tabla {table_name}: {e}")
+        return pd.DataFrame()
+
+def run_service(action, *args, **kwargs):
+    """Ejecutar una operación de `services` mostrando sus errores; regresa su resultado o None"""
+    try:
+        result = action(DB_PATH, *args, **kwargs)
+    except services.ValidationError as e:
+        st.error(f"❌ {e}")
+    except database.ConflictError as e:
+        # Control de concurrencia optimista: no se aplicó ningún cambio del lote
+        st.warning(f"⚠️ {e}. Los datos se recargaron; revisa y vuelve a intentar.")
+    except Exception as e:
+        st.error(f"Error escribiendo en la base de datos: {e}")
+    else:
+        # Sincronizar con GitHub después de escribir
+        upload_db_to_github()
+        return result
+    return None
+
+PAGE_SIZES = [25, 50, 100, 250]
+# Resultados de búsqueda que cargan los selectores de Nueva Renta
+SEARCH_LIMIT = 50
+
+def read_page(table_name, key, sort_columns, filters=()):
+    """Mostrar controles de paginación y leer solo la página visible (filtros y orden en SQL)"""
+    try:
+        total = database.count_rows(DB_PATH, table_name, filters)
+        col_orden, col_dir, col_tam, col_pag = st.columns(4)
+        order_by = col_orden.selectbox("Ordenar por", sort_columns, key=f"{key}_orden")
+        descending = col_dir.selectbox("Dirección", ["Ascendente", "Descendente"], key=f"{key}_dir") == "Descendente"
+        page_size = col_tam.selectbox("Filas por página", PAGE_SIZES, key=f"{key}_tam")
+        pages = max(1, -(-total // page_size))
+        if st.session_state.get(f"{key}_pag", 1) > pages:
+            st.session_state[f"{key}_pag"] = pages
+        page = col_pag.number_input("Página", min_value=1, max_value=pages, value=1, step=1, key=f"{key}_pag")
+        offset = (page - 1) * page_size
+        df = database.read_page(DB_PATH, table_name, filters, order_by, descending, page_size, offset)
+        st.caption(f"Mostrando {offset + 1 if len(df) else 0}–{offset + len(df)} de {total}")
+        return df, total
+    except Exception as e:
+        st.error(f"Error leyendo tabla {table_name}: {e}")
+        return pd.DataFrame(), 0
+
+def search_results(table_name, text, filters=()):
+    """Mostrar los resultados de búsqueda más relevantes (hasta la página más grande)"""
+    try:
+        df = database.search(DB_PATH, table_name, text, filters, PAGE_SIZES[-1])
+        st.caption(f"{len(df)} resultados ordenados por relevancia"
+                   + ("; refina la búsqueda para ver otros" if len(df) == PAGE_SIZES[-1] else ""))
+        return df, len(df)
+    except Exception as e:
+        st.error(f"Error buscando en {table_name}: {e}")
+        return pd.DataFrame(), 0
 
-def validate_email(email):
-    pattern = r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$"
-    return re.match(pattern, email) is not None
+def es_admin():
+    """El usuario de la sesión puede ver el panel de diagnóstico"""
+    return st.session_state.get("usuario") in ADMIN_USERS
 
-def validate_phone(phone):
-    pattern = r"^\+?\d{10,15}$"
-    return re.match(pattern, phone) is not None
+def export_controls(table_name):
+    """Descargar `table_name` completa o filtrada como CSV o Parquet (escritura por bloques)"""
+    with st.expander("⬇️ Exportar"):
+        formato = st.radio("Formato", exporter.FORMATS, horizontal=True, key=f"{table_name}_exp_formato")
+        desde = hasta = None
+        if table_name == "rentas" and st.checkbox("Filtrar por fechas", key=f"{table_name}_exp_fechas"):
+            col_desde, col_hasta = st.columns(2)
+            desde = col_desde.date_input("Desde", value=datetime.now() - timedelta(days=30), key=f"{table_name}_exp_desde")
+            hasta = col_hasta.date_input("Hasta", value=datetime.now(), key=f"{table_name}_exp_hasta")
+        cliente = None
+        if table_name in ("rentas", "clientes"):
+            cliente = st.text_input("Cliente (nombre exacto, opcional)", key=f"{table_name}_exp_cliente") or None
+        if st.button("Preparar archivo", key=f"{table_name}_exp_preparar"):
+            # Se escribe a un archivo temporal bloque por bloque y solo el resultado se envía al navegador
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                ruta = os.path.join(tmp_dir, f"{table_name}.{formato}")
+                try:
+                    total = exporter.export(DB_PATH, table_name, ruta, formato, desde, hasta, cliente)
+                except Exception as e:
+                    st.error(f"❌ Error al exportar: {e}")
+                    return
+                with open(ruta, "rb") as f:
+                    contenido = f.read()
+            st.download_button(f"Descargar {total:,} filas", contenido, file_name=f"{table_name}.{formato}",
+                               mime="text/csv" if formato == "csv" else "application/octet-stream",
+                               key=f"{table_name}_exp_descargar")
 
 def highlight_status(val):
     color = 'green' if val == 'disponible' else 'orange' if val == 'rentado' else 'red'
     return f'background-color: {color}; color: white;'
 
+@st.cache_resource(show_spinner=False)
+def start_due_rentals_once(hoy):
+    """Marcar como rentados los equipos de las reservas que ya empezaron (una vez por día y proceso).
+
+    Las rentas que empiezan el día en que se registran ya marcan sus equipos al guardarse.
+    """
+    return availability.start_due_rentals(DB_PATH, hoy)
+
+@st.cache_resource
+def get_reminder_scheduler():
+    """Programador de recordatorios compartido por todas las sesiones (None si no está configurado)"""
+    sender = reminders.make_sender(REMINDERS_CONFIG)
+    if sender is None:
+        return None
+    scheduler = reminders.ReminderScheduler(
+        DB_PATH, sender, EXPIRY_HORIZON_DAYS, float(REMINDERS_CONFIG.get("intervalo_segundos", 300)),
+        on_change=upload_db_to_github)
+    atexit.register(scheduler.stop)
+    return scheduler
+
 # Inicializar base de datos al inicio
 if initialize_db():
     st.success("✅ Base de datos inicializada correctamente", icon="✅")
+    get_reminder_scheduler()
 else:
     st.error("❌ Error al inicializar la base de datos")
 
@@ -255,6 +365,25 @@ else:
 if "authenticated" not in st.session_state:
     st.session_state.authenticated = False
 
+# Al recargar la página se reutiliza el token firmado de la cookie sin pedir la contraseña
+if not st.session_state.authenticated and not st.session_state.get("cookie_revisada"):
+    st.session_state.cookie_revisada = True
+    token = st.context.cookies.get(SESSION_COOKIE)
+    if token:
+        usuario_token = auth.verify_token(DB_PATH, get_session_secret(), token)
+        if usuario_token:
+            st.session_state.authenticated = True
+            st.session_state.usuario = usuario_token
+        else:
+            st.session_state.cookie_borrar = True
+# Las versiones anteriores dejaban el token en la URL: se quita sin usarlo
+if "token" in st.query_params:
+    del st.query_params["token"]
+if st.session_state.pop("cookie_borrar", False):
+    set_session_cookie("", 0)
+if "cookie_pendiente" in st.session_state:
+    set_session_cookie(st.session_state.pop("cookie_pendiente"), SESSION_TTL_HOURS * 3600)
+
 if not st.session_state.authenticated:
     st.subheader("🔐 Iniciar Sesión")
     with st.form("login_form"):
@@ -265,26 +394,21 @@ if not st.session_state.authenticated:
             if not username or not password:
                 st.error("Por favor, ingrese usuario y contraseña")
             else:
-                df_usuarios = read_table("usuarios")
-                if df_usuarios.empty:
-                    st.error("Error al acceder a la base de datos de usuarios")
-                else:
-                    user = df_usuarios[df_usuarios["usuario"] == username]
-                    if user.empty:
+                try:
+                    valido = auth.authenticate(DB_PATH, username, password)
+                    if valido is None:
                         st.error("Usuario no encontrado")
+                    elif valido:
+                        st.session_state.authenticated = True
+                        st.session_state.usuario = username
+                        st.session_state.cookie_pendiente = auth.issue_token(DB_PATH, get_session_secret(), username,
+                                                                             SESSION_TTL_HOURS * 3600)
+                        st.success("✅ Inicio de sesión exitoso")
+                        st.rerun()
                     else:
-                        stored_password = user.iloc[0]["password"]
-                        try:
-                            if isinstance(stored_password, str):
-                                stored_password = stored_password.encode('utf-8')
-                            if bcrypt.checkpw(password.encode('utf-8'), stored_password):
-                                st.session_state.authenticated = True
-                                st.success("✅ Inicio de sesión exitoso")
-                                st.rerun()
-                            else:
-                                st.error("❌ Contraseña incorrecta")
-                        except Exception as e:
-                            st.error(f"❌ Error al verificar contraseña: {e}")
+                        st.error("❌ Contraseña incorrecta")
+                except Exception as e:
+                    st.error(f"❌ Error al verificar contraseña: {e}")
 else:
     # Agregar indicador de estado de persistencia
     col1, col2 = st.columns([3, 1])
@@ -293,320 +417,494 @@ else:
             st.success("🟢 DB Activa")
         else:
             st.error("🔴 DB Error")
+        show_sync_status()
     
     if "view" not in st.session_state:
         st.session_state.view = "Inicio"
 
-    if st.session_state.view == "Inicio":
-        st.title("🏠 Panel Principal - Arrendamiento MarTech Rent")
-        st.markdown("Selecciona una opción para continuar:")
-
-        col1, col2, col3 = st.columns(3)
-
-        if col1.button("📋 Registro de Equipos", use_container_width=True):
-            st.session_state.view = "Registro de Equipos"
-            st.rerun()
-        if col2.button("👤 Registro de Clientes", use_container_width=True):
-            st.session_state.view = "Registro de Clientes"
-            st.rerun()
-        if col3.button("📝 Nueva Renta", use_container_width=True):
-            st.session_state.view = "Nueva Renta"
-            st.rerun()
-
-        col4, col5, col6 = st.columns(3)
-
-        if col4.button("🔍 Seguimiento de Rentas", use_container_width=True):
-            st.session_state.view = "Seguimiento de Rentas"
-            st.rerun()
-        if col5.button("📦 Inventario", use_container_width=True):
-            st.session_state.view = "Inventario"
-            st.rerun()
-        if col6.button("📁 Listado de Clientes", use_container_width=True):
-            st.session_state.view = "Listado de Clientes"
-            st.rerun()
-
-        col7, col8, col9 = st.columns(3)
-
-        if col7.button("📁 Listado de Rentas", use_container_width=True):
-            st.session_state.view = "Listado de Rentas"
-            st.rerun()
-        if col8.button("✅ Finalizar Renta", use_container_width=True):
-            st.session_state.view = "Finalizar Renta"
-            st.rerun()
-        if col9.button("🚪 Cerrar Sesión", use_container_width=True):
-            st.session_state.authenticated = False
-            st.success("✅ Sesión cerrada")
-            st.rerun()
-
-    elif st.session_state.view == "Registro de Equipos":
-        st.subheader("📋 Registrar Nuevo Equipo")
-        with st.form("form_equipo"):
-            df_equipos = read_table("equipos")
-            nuevo_id = f"ME{len(df_equipos) + 1:04d}"
-            st.text_input("ID del Equipo", value=nuevo_id, disabled=True)
-            marca = st.text_input("Marca")
-            modelo = st.text_input("Modelo")
-            caracteristicas = st.text_area("Características")
-            estado = st.selectbox("Estado", ["disponible", "rentado", "mantenimiento"])
-            precio_base = st.number_input("Precio Base de Renta ($)", min_value=0.0, step=0.01)
-            submitted = st.form_submit_button("Registrar Equipo")
-            if submitted:
-                if not marca or not modelo:
-                    st.error("❌ Marca y modelo son obligatorios")
-                elif precio_base <= 0:
-                    st.error("❌ El precio base debe ser mayor a 0")
-                else:
-                    nuevo = pd.DataFrame([[nuevo_id, marca, modelo, caracteristicas, estado, precio_base]],
-                                        columns=["id_equipo", "marca", "modelo", "caracteristicas", "estado", "precio_base"])
-                    df_equipos = pd.concat([df_equipos, nuevo], ignore_index=True)
-                    if write_table("equipos", df_equipos):
-                        st.success("✅ Equipo registrado correctamente")
+    # Un span por rerun con el tiempo de la vista activa
+    with tracing.span(f"view.{st.session_state.view}"):
+        if st.session_state.view == "Inicio":
+            st.title("🏠 Panel Principal - Arrendamiento MarTech Rent")
+            resumen = database.expiry_summary(DB_PATH, datetime.now().date(), EXPIRY_HORIZON_DAYS)
+            col_curso, col_vencer, col_vencidas, col_reservas = st.columns(4)
+            col_curso.metric("Rentas en curso", resumen["en_curso"])
+            col_vencer.metric(f"Por vencer ({EXPIRY_HORIZON_DAYS} días)", resumen["por_vencer"])
+            col_vencidas.metric("Vencidas", resumen["vencidas"])
+            col_reservas.metric("Reservas futuras", resumen["reservas"])
+            st.markdown("Selecciona una opción para continuar:")
+
+            col1, col2, col3 = st.columns(3)
+
+            if col1.button("📋 Registro de Equipos", use_container_width=True):
+                st.session_state.view = "Registro de Equipos"
+                st.rerun()
+            if col2.button("👤 Registro de Clientes", use_container_width=True):
+                st.session_state.view = "Registro de Clientes"
+                st.rerun()
+            if col3.button("📝 Nueva Renta", use_container_width=True):
+                st.session_state.view = "Nueva Renta"
+                st.rerun()
+
+            col4, col5, col6 = st.columns(3)
+
+            if col4.button("🔍 Seguimiento de Rentas", use_container_width=True):
+                st.session_state.view = "Seguimiento de Rentas"
+                st.rerun()
+            if col5.button("📦 Inventario", use_container_width=True):
+                st.session_state.view = "Inventario"
+                st.rerun()
+            if col6.button("📁 Listado de Clientes", use_container_width=True):
+                st.session_state.view = "Listado de Clientes"
+                st.rerun()
+
+            col7, col8, col9 = st.columns(3)
+
+            if col7.button("📁 Listado de Rentas", use_container_width=True):
+                st.session_state.view = "Listado de Rentas"
+                st.rerun()
+            if col8.button("✅ Finalizar Renta", use_container_width=True):
+                st.session_state.view = "Finalizar Renta"
+                st.rerun()
+            if col9.button("🚪 Cerrar Sesión", use_container_width=True):
+                # Los tokens emitidos (la cookie de este u otro navegador) dejan de ser válidos
+                auth.revoke_tokens(DB_PATH, st.session_state.usuario)
+                st.session_state.authenticated = False
+                st.session_state.pop("usuario", None)
+                st.session_state.cookie_borrar = True
+                st.success("✅ Sesión cerrada")
+                st.rerun()
+
+            col10, col11, col12 = st.columns(3)
+
+            if col10.button("📥 Importación Masiva", use_container_width=True):
+                st.session_state.view = "Importación Masiva"
+                st.rerun()
+            if es_admin() and col11.button("📊 Analítica", use_container_width=True):
+                st.session_state.view = "Analítica"
+                st.rerun()
+            if es_admin() and col12.button("🩺 Diagnóstico", use_container_width=True):
+                st.session_state.view = "Diagnóstico"
+                st.rerun()
+
+        elif st.session_state.view == "Registro de Equipos":
+            st.subheader("📋 Registrar Nuevo Equipo")
+            with st.form("form_equipo"):
+                # El identificador definitivo se asigna de la secuencia al guardar
+                st.text_input("ID del Equipo", value=database.peek_id(DB_PATH, "ME"), disabled=True)
+                marca = st.text_input("Marca")
+                modelo = st.text_input("Modelo")
+                caracteristicas = st.text_area("Características")
+                estado = st.selectbox("Estado", ["disponible", "rentado", "mantenimiento"])
+                precio_base = st.number_input("Precio por día ($)", min_value=0.0, step=0.01)
+                submitted = st.form_submit_button("Registrar Equipo")
+                if submitted:
+                    nuevo_id = run_service(services.register_equipo, marca, modelo, precio_base, caracteristicas, estado)
+                    if nuevo_id is not None:
+                        st.success(f"✅ Equipo {nuevo_id} registrado correctamente")
                         st.rerun()
-                    else:
-                        st.error("❌ Fallo al registrar el equipo")
-        if st.button("⬅️ Regresar al inicio"):
-            st.session_state.view = "Inicio"
-            st.rerun()
-
-    elif st.session_state.view == "Registro de Clientes":
-        st.subheader("👤 Registrar Nuevo Cliente")
-        with st.form("form_cliente"):
-            df_clientes = read_table("clientes")
-            nuevo_id = f"MC{len(df_clientes) + 1:04d}"
-            st.text_input("ID del Cliente", value=nuevo_id, disabled=True)
-            nombre = st.text_input("Nombre Completo")
-            contacto = st.text_input("Teléfono")
-            correo = st.text_input("Correo Electrónico")
-            submitted = st.form_submit_button("Registrar Cliente")
-            if submitted:
-                if not nombre or not contacto or not correo:
-                    st.error("❌ Todos los campos son obligatorios")
-                elif not validate_email(correo):
-                    st.error("❌ Correo electrónico inválido")
-                elif not validate_phone(contacto):
-                    st.error("❌ Teléfono inválido (debe tener 10-15 dígitos)")
-                else:
-                    nuevo = pd.DataFrame([[nuevo_id, nombre, contacto, correo]], 
-                                        columns=["id_cliente", "nombre", "contacto", "correo"])
-                    df_clientes = pd.concat([df_clientes, nuevo], ignore_index=True)
-                    if write_table("clientes", df_clientes):
-                        st.success("✅ Cliente registrado correctamente")
+            if st.button("⬅️ Regresar al inicio"):
+                st.session_state.view = "Inicio"
+                st.rerun()
+
+        elif st.session_state.view == "Registro de Clientes":
+            st.subheader("👤 Registrar Nuevo Cliente")
+            with st.form("form_cliente"):
+                # El identificador definitivo se asigna de la secuencia al guardar
+                st.text_input("ID del Cliente", value=database.peek_id(DB_PATH, "MC"), disabled=True)
+                nombre = st.text_input("Nombre Completo")
+                contacto = st.text_input("Teléfono")
+                correo = st.text_input("Correo Electrónico")
+                submitted = st.form_submit_button("Registrar Cliente")
+                if submitted:
+                    nuevo_id = run_service(services.register_cliente, nombre, contacto, correo)
+                    if nuevo_id is not None:
+                        st.success(f"✅ Cliente {nuevo_id} registrado correctamente")
                         st.rerun()
-                    else:
-                        st.error("❌ Fallo al registrar el cliente")
-        if st.button("⬅️ Regresar al inicio"):
-            st.session_state.view = "Inicio"
-            st.rerun()
-
-    elif st.session_state.view == "Nueva Renta":
-        st.subheader("📝 Registrar Nueva Renta")
-        equipos = read_table("equipos")
-        disponibles = equipos[equipos.estado == "disponible"]
-        clientes = read_table("clientes")
-        df_rentas = read_table("rentas")
-        if disponibles.empty:
-            st.warning("⚠️ No hay equipos disponibles para rentar.")
-        elif clientes.empty:
-            st.warning("⚠️ No hay clientes registrados.")
-        else:
-            with st.form("form_renta"):
-                nuevo_id_renta = f"RE-{len(df_rentas) + 1:04d}"
-                st.text_input("ID de Renta", value=nuevo_id_renta, disabled=True)
-                cliente_seleccionado = st.selectbox("Cliente", clientes.nombre.tolist())
-                cliente_info = clientes[clientes.nombre == cliente_seleccionado].iloc[0]
-                contacto = cliente_info.contacto
-                correo = cliente_info.correo
-                st.markdown(f"**📞 Contacto:** {contacto}")
-                st.markdown(f"**✉️ Correo:** {correo}")
-                equipos_seleccionados = st.multiselect("Seleccionar Equipos", disponibles.id_equipo.tolist())
-                precios_equipos = {}
-                if equipos_seleccionados:
+            if st.button("⬅️ Regresar al inicio"):
+                st.session_state.view = "Inicio"
+                st.rerun()
+
+        elif st.session_state.view == "Nueva Renta":
+            st.subheader("📝 Registrar Nueva Renta")
+            # Las fechas van fuera del formulario para recalcular los equipos libres al cambiarlas
+            col_inicio, col_fin = st.columns(2)
+            fecha_inicio = col_inicio.date_input("Fecha de Inicio", value=datetime.now())
+            fecha_fin = col_fin.date_input("Fecha de Fin", value=datetime.now() + timedelta(days=7))
+            hoy = datetime.now().date()
+            start_due_rentals_once(hoy)
+            # Los selectores solo cargan los mejores resultados de la búsqueda, no las tablas completas
+            col_buscar_cliente, col_buscar_equipo = st.columns(2)
+            buscar_cliente = col_buscar_cliente.text_input("Buscar cliente", placeholder="Nombre, correo o teléfono",
+                                                           key="renta_buscar_cliente")
+            buscar_equipo = col_buscar_equipo.text_input("Buscar equipo", placeholder="Marca, modelo o características",
+                                                         key="renta_buscar_equipo")
+            # Equipos sin renta que se traslape con el periodo; si empieza hoy también deben estar disponibles ahora.
+            # El traslape se excluye en la consulta para que el límite cuente solo equipos libres
+            filtros = [("estado", "=", "disponible") if fecha_inicio <= hoy else ("estado", "!=", "mantenimiento")]
+            if fecha_fin > fecha_inicio:
+                filtros.append(("id_equipo", "libre", (fecha_inicio, fecha_fin)))
+            disponibles = database.search(DB_PATH, "equipos", buscar_equipo, filtros, SEARCH_LIMIT, "marca")
+            # Los ya elegidos se conservan solo si siguen libres en las fechas actuales
+            elegidos = database.read_rows(DB_PATH, "equipos", st.session_state.get("renta_equipos", []), filtros)
+            if not elegidos.empty:
+                disponibles = pd.concat([elegidos, disponibles], ignore_index=True).drop_duplicates("id_equipo") \
+                    if not disponibles.empty else elegidos
+            clientes = database.search(DB_PATH, "clientes", buscar_cliente, limit=SEARCH_LIMIT, order_by="nombre")
+            if fecha_fin <= fecha_inicio:
+                st.error("❌ La fecha de fin debe ser posterior a la fecha de inicio")
+            elif disponibles.empty:
+                st.warning("⚠️ Ningún equipo disponible en esas fechas coincide con la búsqueda." if buscar_equipo
+                           else "⚠️ No hay equipos disponibles para rentar en esas fechas.")
+            elif clientes.empty:
+                st.warning("⚠️ Ningún cliente coincide con la búsqueda." if buscar_cliente
+                           else "⚠️ No hay clientes registrados.")
+            else:
+                # Fuera del formulario para que los equipos elegidos se conserven al cambiar la búsqueda
+                opciones = disponibles.set_index("id_equipo")
+                equipos_seleccionados = st.multiselect(
+                    "Seleccionar Equipos", opciones.index.tolist(), key="renta_equipos",
+                    default=[e for e in st.session_state.get("renta_equipos", []) if e in opciones.index],
+                    format_func=lambda e: f"{e} · {opciones.marca[e]} {opciones.modelo[e]}")
+                if len(disponibles) >= SEARCH_LIMIT:
+                    st.caption(f"Se muestran los {SEARCH_LIMIT} mejores resultados; busca para encontrar otros equipos.")
+                with st.form("form_renta"):
+                    # El identificador definitivo se asigna de la secuencia al guardar
+                    st.text_input("ID de Renta", value=database.peek_id(DB_PATH, "RE-"), disabled=True)
+                    nombres = clientes.set_index("id_cliente")
+                    id_cliente = st.selectbox("Cliente", nombres.index.tolist(),
+                                              format_func=lambda c: f"{nombres.nombre[c]} · {nombres.correo[c]}")
+                    cliente_info = nombres.loc[id_cliente]
+                    contacto = cliente_info.contacto
+                    correo = cliente_info.correo
+                    st.markdown(f"**📞 Contacto:** {contacto}")
+                    st.markdown(f"**✉️ Correo:** {correo}")
+                    # Precio sugerido por duración (memorizado); editar una línea solo vuelve a sumar
+                    dias = int(quote.rental_days(fecha_inicio, fecha_fin))
+                    tarifas = quote.price_index(disponibles)
+                    sugeridos = quote.suggested_prices(tarifas, equipos_seleccionados, fecha_inicio, fecha_fin, RATES)
+                    precios_equipos = {}
                     for equipo in equipos_seleccionados:
-                        precio_base = disponibles[disponibles.id_equipo == equipo].precio_base.iloc[0]
-                        precio_base = float(precio_base) if pd.notnull(precio_base) else 0.0
-                        precio = st.number_input(
-                            f"Precio de Renta para {equipo} (Precio base: ${precio_base:.2f})", 
-                            min_value=0.0, step=0.01, value=precio_base,
+                        precios_equipos[equipo] = st.number_input(
+                            f"Precio de Renta para {equipo} ({dias} días, tarifa diaria: ${tarifas[equipo]:.2f})",
+                            min_value=0.0, step=0.01, value=sugeridos[equipo],
                             key=f"precio_{equipo}"
                         )
-                        precios_equipos[equipo] = precio
-                subtotal = sum(precios_equipos.values()) if precios_equipos else 0.0
-                st.markdown(f"**Subtotal (sin IVA):** ${subtotal:.2f}")
-                incluir_iva = st.checkbox("Incluir IVA del 16% (México)")
-                total = subtotal + (subtotal * 0.16 if incluir_iva else 0.0)
-                if incluir_iva:
-                    st.markdown(f"**IVA (16%):** ${(subtotal * 0.16):.2f}")
-                st.markdown(f"**Total:** ${total:.2f}")
-                fecha_inicio = st.date_input("Fecha de Inicio", value=datetime.now())
-                fecha_fin = st.date_input("Fecha de Fin", value=datetime.now() + timedelta(days=7))
-                submitted = st.form_submit_button("Registrar Renta")
-                if submitted:
-                    if not equipos_seleccionados:
-                        st.error("❌ Debe seleccionar al menos un equipo")
-                    elif fecha_fin <= fecha_inicio:
-                        st.error("❌ La fecha de fin debe ser posterior a la fecha de inicio")
-                    elif subtotal <= 0:
-                        st.error("❌ El subtotal debe ser mayor a 0")
-                    else:
-                        equipos_json = json.dumps(equipos_seleccionados)
-                        nuevo = pd.DataFrame([[nuevo_id_renta, cliente_seleccionado, contacto, equipos_json, fecha_inicio, fecha_fin, subtotal, total]],
-                                            columns=["id_renta", "cliente", "contacto", "equipos", "fecha_inicio", "fecha_fin", "subtotal", "precio"])
-                        df_rentas = pd.concat([df_rentas, nuevo], ignore_index=True)
-                        if write_table("rentas", df_rentas):
-                            for equipo in equipos_seleccionados:
-                                equipos.loc[equipos.id_equipo == equipo, "estado"] = "rentado"
-                            if write_table("equipos", equipos):
-                                st.success("✅ Renta registrada correctamente")
-                                st.rerun()
-                            else:
-                                st.error("❌ Fallo al actualizar el estado de los equipos")
-                        else:
-                            st.error("❌ Fallo al registrar la renta")
-        if st.button("⬅️ Regresar al inicio"):
-            st.session_state.view = "Inicio"
-            st.rerun()
-
-    elif st.session_state.view == "Seguimiento de Rentas":
-        st.subheader("🔍 Seguimiento de Rentas")
-        df = read_table("rentas")
-        if df.empty:
-            st.info("ℹ️ No hay rentas registradas.")
-        else:
-            try:
-                df["equipos"] = df["equipos"].apply(lambda x: json.loads(x) if isinstance(x, str) and x else [])
-                df["fecha_fin"] = pd.to_datetime(df["fecha_fin"])
-                hoy = datetime.now()
-                df["dias_restantes"] = (df["fecha_fin"] - hoy).dt.days
-                st.dataframe(df)
-                proximas = df[df.dias_restantes <= 3]
-                if not proximas.empty:
-                    st.warning("⚠️ Rentas próximas a vencer:")
-                    st.dataframe(proximas[["id_renta", "cliente", "equipos", "fecha_fin", "dias_restantes"]])
-            except Exception as e:
-                st.error(f"❌ Error al procesar fechas o equipos: {e}")
-        if st.button("⬅️ Regresar al inicio"):
-            st.session_state.view = "Inicio"
-            st.rerun()
-
-    elif st.session_state.view == "Inventario":
-        st.subheader("📦 Inventario de Equipos")
-        equipos = read_table("equipos")
-        if not equipos.empty:
-            styled_equipos = equipos.sort_values(by="estado").style.applymap(highlight_status, subset=['estado'])
-            st.dataframe(styled_equipos)
-            with st.expander("✏️ Editar Equipo"):
-                equipo_a_editar = st.selectbox("Seleccionar Equipo a Editar", equipos.id_equipo.tolist(), key="edit_equipo_select")
-                if equipo_a_editar:
-                    equipo_info = equipos[equipos.id_equipo == equipo_a_editar].iloc[0]
-                    with st.form("form_editar_equipo"):
-                        marca_edit = st.text_input("Marca", value=equipo_info.marca)
-                        modelo_edit = st.text_input("Modelo", value=equipo_info.modelo)
-                        caracteristicas_edit = st.text_area("Características", value=equipo_info.caracteristicas)
-                        estado_edit = st.selectbox("Estado", ["disponible", "rentado", "mantenimiento"], index=["disponible", "rentado", "mantenimiento"].index(equipo_info.estado))
-                        precio_base_edit = st.number_input("Precio Base de Renta ($)", min_value=0.0, step=0.01, value=float(equipo_info.precio_base))
-                        eliminar = st.checkbox("Eliminar este equipo")
-                        submitted = st.form_submit_button("Guardar Cambios")
-                        if submitted:
-                            if eliminar:
-                                equipos = equipos[equipos.id_equipo != equipo_a_editar]
-                                st.success("🗑️ Equipo eliminado")
-                            else:
-                                equipos.loc[equipos.id_equipo == equipo_a_editar, ["marca", "modelo", "caracteristicas", "estado", "precio_base"]] = \
-                                    [marca_edit, modelo_edit, caracteristicas_edit, estado_edit, precio_base_edit]
-                            if write_table("equipos", equipos):
-                                st.success("✅ Datos actualizados")
-                                st.rerun()
-                            else:
-                                st.error("❌ Error al guardar cambios")
-        else:
-            st.info("ℹ️ No hay equipos registrados.")
-        if st.button("⬅️ Regresar al inicio"):
-            st.session_state.view = "Inicio"
-            st.rerun()
-
-    elif st.session_state.view == "Listado de Clientes":
-        st.subheader("📁 Listado de Clientes")
-        df_clientes = read_table("clientes")
-        if not df_clientes.empty:
-            st.dataframe(df_clientes)
-            with st.expander("✏️ Editar Cliente"):
-                cliente_a_editar = st.selectbox("Seleccionar Cliente a Editar", df_clientes.id_cliente.tolist(), key="edit_cliente_select")
-                if cliente_a_editar:
-                    cliente_info = df_clientes[df_clientes.id_cliente == cliente_a_editar].iloc[0]
-                    with st.form("form_editar_cliente"):
-                        nombre_edit = st.text_input("Nombre Completo", value=cliente_info.nombre)
-                        contacto_edit = st.text_input("Teléfono", value=cliente_info.contacto)
-                        correo_edit = st.text_input("Correo Electrónico", value=cliente_info.correo)
-                        eliminar = st.checkbox("Eliminar este cliente")
-                        submitted = st.form_submit_button("Guardar Cambios")
-                        if submitted:
-                            if eliminar:
-                                df_clientes = df_clientes[df_clientes.id_cliente != cliente_a_editar]
-                                st.success("🗑️ Cliente eliminado")
-                            else:
-                                df_clientes.loc[df_clientes.id_cliente == cliente_a_editar, ["nombre", "contacto", "correo"]] = \
-                                    [nombre_edit, contacto_edit, correo_edit]
-                            if write_table("clientes", df_clientes):
-                                st.success("✅ Datos actualizados")
-                                st.rerun()
-                            else:
-                                st.error("❌ Error al guardar cambios")
-        else:
-            st.info("ℹ️ No hay clientes registrados.")
-        if st.button("⬅️ Regresar al inicio"):
-            st.session_state.view = "Inicio"
-            st.rerun()
-
-    elif st.session_state.view == "Listado de Rentas":
-        st.subheader("📁 Listado de Rentas")
-        df_rentas = read_table("rentas")
-        if not df_rentas.empty:
-            df_rentas["equipos"] = df_rentas["equipos"].apply(lambda x: json.loads(x) if isinstance(x, str) and x else [])
-            st.dataframe(df_rentas)
-        else:
-            st.info("ℹ️ No hay rentas registradas.")
-        if st.button("⬅️ Regresar al inicio"):
-            st.session_state.view = "Inicio"
-            st.rerun()
+                    incluir_iva = st.checkbox(f"Incluir IVA del {RATES.iva:.0%} (México)")
+                    cotizacion = quote.totals(list(precios_equipos.values()), RATES, incluir_iva)
+                    subtotal, total = cotizacion["subtotal"], cotizacion["total"]
+                    if cotizacion["descuento"]:
+                        st.markdown(f"**Importe:** ${cotizacion['importe']:.2f}")
+                        st.markdown(f"**Descuento por volumen:** -${cotizacion['descuento']:.2f}")
+                    st.markdown(f"**Subtotal (sin IVA):** ${subtotal:.2f}")
+                    if incluir_iva:
+                        st.markdown(f"**IVA ({RATES.iva:.0%}):** ${cotizacion['iva']:.2f}")
+                    st.markdown(f"**Total:** ${total:.2f}")
+                    submitted = st.form_submit_button("Registrar Renta")
+                    if submitted:
+                        # Las versiones que vio el usuario detectan si otro cambió los equipos mientras tanto
+                        versiones = {equipo: opciones.version[equipo] for equipo in equipos_seleccionados}
+                        nuevo_id_renta = run_service(services.create_renta, id_cliente, precios_equipos, fecha_inicio,
+                                                     fecha_fin, incluir_iva, versiones, rates=RATES, hoy=hoy)
+                        if nuevo_id_renta is not None:
+                            st.success(f"✅ Renta {nuevo_id_renta} registrada correctamente")
+                            st.rerun()
+            if st.button("⬅️ Regresar al inicio"):
+                st.session_state.view = "Inicio"
+                st.rerun()
+
+        elif st.session_state.view == "Seguimiento de Rentas":
+            st.subheader("🔍 Seguimiento de Rentas")
+            hoy = datetime.now().date()
+            horizonte = st.number_input("Días para considerar una renta por vencer", min_value=0, max_value=365,
+                                        value=EXPIRY_HORIZON_DAYS, step=1, key="seguimiento_horizonte")
+            # Los grupos se calculan en SQLite con rangos sobre el índice de fecha_fin
+            vencidas = database.overdue_rentals(DB_PATH, hoy, limit=PAGE_SIZES[-1])
+            proximas = database.expiring_rentals(DB_PATH, hoy, horizonte, limit=PAGE_SIZES[-1])
+            columnas = ["id_renta", "cliente", "contacto", "equipos", "fecha_fin", "dias_restantes"]
+            if not vencidas.empty:
+                st.error(f"🚨 Rentas vencidas sin finalizar: {len(vencidas)}")
+                st.dataframe(vencidas[columnas], hide_index=True)
+            if not proximas.empty:
+                st.warning(f"⚠️ Rentas que vencen en los próximos {horizonte} días: {len(proximas)}")
+                st.dataframe(proximas[columnas], hide_index=True)
+            elif vencidas.empty:
+                st.success("✅ No hay rentas vencidas ni por vencer")
+
+            with st.expander("📨 Recordatorios"):
+                scheduler = get_reminder_scheduler()
+                if scheduler is None:
+                    st.caption("Envío de recordatorios no configurado (sección [RECORDATORIOS] de los secretos)")
+                else:
+                    estado = scheduler.status()
+                    if estado["last_error"]:
+                        st.warning(f"⚠️ Error en la última revisión de recordatorios: {estado['last_error']}")
+                    elif estado["last_run"]:
+                        st.caption(f"Última revisión {estado['last_run']:%H:%M:%S}")
+                    if st.button("📨 Revisar y enviar ahora"):
+                        scheduler.run_now()
+                conteos = reminders.outbox_summary(DB_PATH)
+                col_pend, col_env, col_err = st.columns(3)
+                col_pend.metric("Pendientes", conteos["pendiente"] + conteos["enviando"])
+                col_env.metric("Enviados", conteos["enviado"])
+                col_err.metric("Con error", conteos["error"])
+                recientes = reminders.recent(DB_PATH)
+                if not recientes.empty:
+                    st.dataframe(recientes, hide_index=True)
+
+            st.markdown("#### Todas las rentas")
+            df, total = read_page("rentas", "seguimiento", ["fecha_fin", "id_renta", "cliente", "fecha_inicio"])
+            if total == 0:
+                st.info("ℹ️ No hay rentas registradas.")
+            else:
+                st.dataframe(df.drop(columns="version"))
+            if st.button("⬅️ Regresar al inicio"):
+                st.session_state.view = "Inicio"
+                st.rerun()
+
+        elif st.session_state.view == "Inventario":
+            st.subheader("📦 Inventario de Equipos")
+            buscar = st.text_input("🔎 Buscar", placeholder="Marca, modelo o características", key="inventario_buscar")
+            col_estado, col_marca = st.columns(2)
+            estado_filtro = col_estado.selectbox("Estado", ["Todos", "disponible", "rentado", "mantenimiento"], key="inventario_estado")
+            marca_filtro = col_marca.text_input("Marca (empieza con)", key="inventario_marca")
+            filtros = []
+            if estado_filtro != "Todos":
+                filtros.append(("estado", "=", estado_filtro))
+            if marca_filtro:
+                filtros.append(("marca", "like", f"{marca_filtro}%"))
+            if buscar:
+                equipos, total = search_results("equipos", buscar, filtros)
+            else:
+                equipos, total = read_page("equipos", "inventario", ["estado", "id_equipo", "marca", "modelo", "precio_base"], filtros)
+            if not equipos.empty:
+                # Solo se aplica estilo a la página visible
+                styled_equipos = equipos.drop(columns="version").style.applymap(highlight_status, subset=['estado'])
+                st.dataframe(styled_equipos)
+                with st.expander("✏️ Editar Equipo"):
+                    equipo_a_editar = st.selectbox("Seleccionar Equipo a Editar", equipos.id_equipo.tolist(), key="edit_equipo_select")
+                    if equipo_a_editar:
+                        equipo_info = equipos[equipos.id_equipo == equipo_a_editar].iloc[0]
+                        with st.form("form_editar_equipo"):
+                            marca_edit = st.text_input("Marca", value=equipo_info.marca)
+                            modelo_edit = st.text_input("Modelo", value=equipo_info.modelo)
+                            caracteristicas_edit = st.text_area("Características", value=equipo_info.caracteristicas)
+                            estado_edit = st.selectbox("Estado", ["disponible", "rentado", "mantenimiento"], index=["disponible", "rentado", "mantenimiento"].index(equipo_info.estado))
+                            precio_base_edit = st.number_input("Precio por día ($)", min_value=0.0, step=0.01, value=float(equipo_info.precio_base))
+                            eliminar = st.checkbox("Eliminar este equipo")
+                            submitted = st.form_submit_button("Guardar Cambios")
+                            if submitted:
+                                if eliminar:
+                                    resultado = run_service(services.delete_record, "equipos", equipo_a_editar,
+                                                            equipo_info.version)
+                                else:
+                                    resultado = run_service(services.update_equipo, equipo_a_editar, {
+                                        "marca": marca_edit, "modelo": modelo_edit, "caracteristicas": caracteristicas_edit,
+                                        "estado": estado_edit, "precio_base": precio_base_edit}, equipo_info.version)
+                                if resultado is not None:
+                                    st.success("🗑️ Equipo eliminado" if eliminar else "✅ Datos actualizados")
+                                    st.rerun()
+            else:
+                st.info("ℹ️ No hay equipos registrados." if not (filtros or buscar) else "ℹ️ Ningún equipo coincide con los filtros.")
+            export_controls("equipos")
+            if st.button("⬅️ Regresar al inicio"):
+                st.session_state.view = "Inicio"
+                st.rerun()
+
+        elif st.session_state.view == "Listado de Clientes":
+            st.subheader("📁 Listado de Clientes")
+            buscar = st.text_input("🔎 Buscar", placeholder="Nombre, correo o teléfono", key="clientes_buscar")
+            nombre_filtro = st.text_input("Nombre (empieza con)", key="clientes_nombre")
+            filtros = [("nombre", "like", f"{nombre_filtro}%")] if nombre_filtro else []
+            if buscar:
+                df_clientes, total = search_results("clientes", buscar, filtros)
+            else:
+                df_clientes, total = read_page("clientes", "clientes", ["nombre", "id_cliente", "correo"], filtros)
+            if not df_clientes.empty:
+                st.dataframe(df_clientes.drop(columns="version"))
+                with st.expander("✏️ Editar Cliente"):
+                    cliente_a_editar = st.selectbox("Seleccionar Cliente a Editar", df_clientes.id_cliente.tolist(), key="edit_cliente_select")
+                    if cliente_a_editar:
+                        cliente_info = df_clientes[df_clientes.id_cliente == cliente_a_editar].iloc[0]
+                        with st.form("form_editar_cliente"):
+                            nombre_edit = st.text_input("Nombre Completo", value=cliente_info.nombre)
+                            contacto_edit = st.text_input("Teléfono", value=cliente_info.contacto)
+                            correo_edit = st.text_input("Correo Electrónico", value=cliente_info.correo)
+                            eliminar = st.checkbox("Eliminar este cliente")
+                            submitted = st.form_submit_button("Guardar Cambios")
+                            if submitted:
+                                if eliminar:
+                                    resultado = run_service(services.delete_record, "clientes", cliente_a_editar,
+                                                            cliente_info.version)
+                                else:
+                                    resultado = run_service(services.update_cliente, cliente_a_editar, {
+                                        "nombre": nombre_edit, "contacto": contacto_edit, "correo": correo_edit},
+                                        cliente_info.version)
+                                if resultado is not None:
+                                    st.success("🗑️ Cliente eliminado" if eliminar else "✅ Datos actualizados")
+                                    st.rerun()
+            else:
+                st.info("ℹ️ No hay clientes registrados." if not (filtros or buscar) else "ℹ️ Ningún cliente coincide con los filtros.")
+            export_controls("clientes")
+            if st.button("⬅️ Regresar al inicio"):
+                st.session_state.view = "Inicio"
+                st.rerun()
+
+        elif st.session_state.view == "Listado de Rentas":
+            st.subheader("📁 Listado de Rentas")
+            listado = st.radio("Mostrar", ["Activas", "Historial"], horizontal=True, key="rentas_listado")
+            if listado == "Activas":
+                cliente_filtro = st.text_input("Cliente (empieza con)", key="rentas_cliente")
+                filtros = [("cliente", "like", f"{cliente_filtro}%")] if cliente_filtro else []
+                df_rentas, total = read_page("rentas", "rentas", ["id_renta", "fecha_inicio", "fecha_fin", "cliente", "precio"], filtros)
+                if not df_rentas.empty:
+                    df_rentas = df_rentas.assign(equipos=df_rentas["equipos"].apply(lambda x: json.loads(x) if isinstance(x, str) and x else []))
+                    st.dataframe(df_rentas.drop(columns="version"))
+                else:
+                    st.info("ℹ️ No hay rentas registradas." if not filtros else "ℹ️ Ninguna renta coincide con los filtros.")
+                export_controls("rentas")
+            else:
+                # Rentas finalizadas (de las particiones por año) junto con las activas
+                hoy = datetime.now().date()
+                col1, col2, col3 = st.columns(3)
+                desde = col1.date_input("Iniciadas desde", value=hoy.replace(month=1, day=1), key="historial_desde")
+                hasta = col2.date_input("Hasta", value=hoy, key="historial_hasta")
+                cliente_historial = col3.text_input("Cliente (nombre exacto)", key="historial_cliente")
+                df_historial = archive.history(DB_PATH, desde, hasta, cliente_historial or None)
+                if not df_historial.empty:
+                    st.caption(f"{len(df_historial):,} rentas · ${df_historial.precio.fillna(0).sum():,.2f}")
+                    st.dataframe(df_historial, hide_index=True)
+                else:
+                    st.info("ℹ️ No hay rentas en el periodo seleccionado.")
+            if st.button("⬅️ Regresar al inicio"):
+                st.session_state.view = "Inicio"
+                st.rerun()
             
-    elif st.session_state.view == "Finalizar Renta":
-        st.subheader("✅ Finalizar Renta")
-        df_rentas = read_table("rentas")
-        equipos = read_table("equipos")
+        elif st.session_state.view == "Finalizar Renta":
+            st.subheader("✅ Finalizar Renta")
+            hoy = datetime.now().date()
+            start_due_rentals_once(hoy)
+            rentas_activas = database.active_rentals(DB_PATH, hoy)
         
-        if df_rentas.empty:
-            st.info("ℹ️ No hay rentas activas.")
-        else:
-            df_rentas["equipos"] = df_rentas["equipos"].apply(lambda x: json.loads(x) if isinstance(x, str) and x else [])
-            
-            rentas_activas = df_rentas[df_rentas.equipos.apply(
-                lambda eqs: any(
-                    equipos[equipos.id_equipo == eq].estado.iloc[0] == "rentado" 
-                    for eq in eqs 
-                    if not equipos[equipos.id_equipo == eq].empty
-                )
-            )]
-            
             if rentas_activas.empty:
                 st.info("ℹ️ No hay rentas activas para finalizar.")
             else:
                 with st.form("form_finalizar_renta"):
                     renta_seleccionada = st.selectbox("Renta", rentas_activas.id_renta.tolist())
                     submitted = st.form_submit_button("Finalizar Renta")
-                    
+                
                     if submitted:
-                        equipos_renta = rentas_activas[rentas_activas.id_renta == renta_seleccionada].equipos.iloc[0]
-                        for equipo in equipos_renta:
-                            equipos.loc[equipos.id_equipo == equipo, "estado"] = "disponible"
-                        
-                        df_rentas = df_rentas[df_rentas.id_renta != renta_seleccionada]
-                        df_rentas["equipos"] = df_rentas["equipos"].apply(json.dumps)
-                        
-                        if write_table("equipos", equipos) and write_table("rentas", df_rentas):
+                        version = rentas_activas.set_index("id_renta").version[renta_seleccionada]
+                        # La renta pasa al historial de su año y sale de las activas en la misma transacción
+                        if run_service(services.finalize_renta, renta_seleccionada, version, hoy) is not None:
                             st.success(f"✅ Renta {renta_seleccionada} finalizada")
                             st.rerun()
-                        else:
-                             st.error("❌ Error al finalizar la renta")
-        if st.button("⬅️ Regresar al inicio"):
-            st.session_state.view = "Inicio"
-            st.rerun()
+            if st.button("⬅️ Regresar al inicio"):
+                st.session_state.view = "Inicio"
+                st.rerun()
+
+        elif st.session_state.view == "Importación Masiva":
+            st.subheader("📥 Importación Masiva de Equipos y Clientes")
+            tabla = st.radio("Importar", list(importer.TABLES), horizontal=True)
+            _, requeridas, opcionales = importer.TABLES[tabla]
+            st.caption(f"Columnas obligatorias: {', '.join(requeridas)}"
+                       + (f" · opcionales: {', '.join(opcionales)}" if opcionales else "")
+                       + ". Los identificadores se asignan automáticamente.")
+            archivo = st.file_uploader("Archivo CSV o Excel", type=["csv", "xlsx"])
+            if archivo is not None and st.button("Importar"):
+                barra = st.progress(0.0, text="Importando...")
+                tamano = max(archivo.size, 1)
+                try:
+                    reporte = importer.import_file(
+                        DB_PATH, tabla, archivo, filename=archivo.name,
+                        progress=lambda r: barra.progress(min(archivo.tell() / tamano, 1.0),
+                                                          text=f"{r['filas']:,} filas leídas"))
+                except Exception as e:
+                    st.error(f"❌ Error al importar: {e}")
+                else:
+                    barra.progress(1.0, text=f"{reporte['filas']:,} filas leídas")
+                    # Una sola sincronización al terminar toda la importación
+                    if reporte["insertados"]:
+                        upload_db_to_github()
+                    st.session_state.reporte_importacion = reporte
+            reporte = st.session_state.get("reporte_importacion")
+            if reporte:
+                st.success(f"✅ {reporte['insertados']:,} registros de {reporte['tabla']} importados")
+                if reporte["ids"]:
+                    st.caption(f"Identificadores asignados: {reporte['ids'][0][0]} – {reporte['ids'][-1][1]}")
+                if reporte["rechazados"]:
+                    st.warning(f"⚠️ {reporte['rechazados']:,} filas rechazadas")
+                    errores = importer.error_report(reporte)
+                    st.dataframe(errores.head(PAGE_SIZES[-1]), hide_index=True)
+                    st.download_button("Descargar reporte de errores", errores.to_csv(index=False),
+                                       file_name=f"errores_{reporte['tabla']}.csv", mime="text/csv")
+            if st.button("⬅️ Regresar al inicio"):
+                st.session_state.pop("reporte_importacion", None)
+                st.session_state.view = "Inicio"
+                st.rerun()
+
+        elif st.session_state.view == "Analítica":
+            st.subheader("📊 Ingresos y Utilización")
+            if not es_admin():
+                st.error("❌ Solo los administradores pueden ver la analítica")
+            else:
+                col_desde, col_hasta = st.columns(2)
+                hasta = col_hasta.date_input("Hasta", value=datetime.now(), key="analitica_hasta")
+                desde = col_desde.date_input("Desde", value=hasta - timedelta(days=365), key="analitica_desde")
+                if desde > hasta:
+                    st.error("❌ La fecha inicial debe ser anterior a la final")
+                else:
+                    # Solo se leen los resúmenes diarios: el costo no crece con el historial de rentas
+                    totales = rollups.totals(DB_PATH, desde, hasta)
+                    dias_periodo = (hasta - desde).days + 1
+                    n_equipos = database.count_rows(DB_PATH, "equipos")
+                    utilizacion = totales["dias_equipo"] / (n_equipos * dias_periodo) * 100 if n_equipos else 0.0
+                    col_ingresos, col_iva, col_rentas, col_util = st.columns(4)
+                    col_ingresos.metric("Ingresos", f"${totales['ingresos']:,.2f}")
+                    col_iva.metric("IVA", f"${totales['iva']:,.2f}")
+                    col_rentas.metric("Rentas", f"{totales['rentas']:,.0f}")
+                    col_util.metric("Utilización del inventario", f"{utilizacion:.1f}%")
+                    st.caption("Los ingresos se asignan al día de inicio de cada renta y los días rentados a cada "
+                               "día del periodo; las rentas finalizadas se conservan en los resúmenes.")
+
+                    mensual = rollups.monthly_revenue(DB_PATH, desde, hasta)
+                    if mensual.empty:
+                        st.info("ℹ️ No hay rentas en el periodo seleccionado.")
+                    else:
+                        st.markdown("#### Ingresos por mes")
+                        st.bar_chart(mensual, x="mes", y=["subtotal", "iva"])
+                        col_clientes, col_equipos = st.columns(2)
+                        col_clientes.markdown("#### Clientes con más ingresos")
+                        col_clientes.dataframe(rollups.revenue_by_client(DB_PATH, desde, hasta), hide_index=True)
+                        col_equipos.markdown("#### Utilización por equipo (%)")
+                        col_equipos.dataframe(rollups.utilization_by_equipo(DB_PATH, desde, hasta), hide_index=True)
+            if st.button("⬅️ Regresar al inicio"):
+                st.session_state.view = "Inicio"
+                st.rerun()
+
+        elif st.session_state.view == "Diagnóstico":
+            st.subheader("🩺 Diagnóstico de rendimiento")
+            if not es_admin():
+                st.error("❌ Solo los administradores pueden ver el diagnóstico")
+            elif not tracing.enabled():
+                st.info("ℹ️ La instrumentación está apagada. Configura TRACING_ENABLED = true en los secretos "
+                        "(y opcionalmente TRACING_EXPORT con la ruta de un archivo JSONL).")
+            else:
+                resumen = pd.DataFrame(tracing.summary())
+                st.caption(f"Percentiles sobre los últimos {TRACING_WINDOW} registros de cada span; "
+                           "conteos, filas y bytes acumulados desde el último reinicio")
+                if resumen.empty:
+                    st.info("ℹ️ Todavía no hay mediciones")
+                else:
+                    st.dataframe(resumen.sort_values("p95_ms", ascending=False), hide_index=True)
+                if TRACING_EXPORT:
+                    st.caption(f"📄 Exportando cada span a {TRACING_EXPORT}")
+                if st.button("🔄 Reiniciar métricas"):
+                    tracing.reset()
+                    st.rerun()
+                col_pool, col_cache = st.columns(2)
+                col_pool.json(database.pool_stats(DB_PATH))
+                col_cache.json(database.get_cache(DB_PATH).stats())
+            if st.button("⬅️ Regresar al inicio"):
+                st.session_state.view = "Inicio"
+                st.rerun()
@@ -0,0 +1,249 @@
+"""Historial de rentas finalizadas en particiones por año.
+
+Al finalizar, la renta y sus líneas de equipo se mueven de ``rentas`` y
+``renta_equipos`` a ``rentas_historico`` y ``renta_equipos_historico`` en
+un archivo SQLite por año de inicio de la renta (``<base>.historico-AAAA.db``),
+adjuntado a la conexión de escritura para que la copia y el borrado ocurran
+en la misma transacción. Las tablas del historial solo admiten inserciones.
+
+Así la tabla ``rentas`` solo contiene rentas en curso y reservas, y las
+consultas de historial recorren únicamente los años que piden a través de
+``history``.
+"""
+import glob
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import pandas as pd
+
+import database
+import snapshots
+
+HISTORY_COLUMNS = ["id_renta", "cliente", "contacto", "equipos", "fecha_inicio", "fecha_fin",
+                   "subtotal", "precio"]
+
+_DDL = [
+    f"""CREATE TABLE IF NOT EXISTS {{schema}}.rentas_historico (
+        id_renta TEXT PRIMARY KEY,
+        cliente TEXT,
+        contacto TEXT,
+        equipos TEXT,
+        fecha_inicio TEXT,
+        fecha_fin TEXT,
+        subtotal REAL,
+        precio REAL,
+        fecha_finalizacion TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS {schema}.renta_equipos_historico (
+        id_renta TEXT NOT NULL,
+        id_equipo TEXT NOT NULL,
+        precio REAL,
+        PRIMARY KEY (id_renta, id_equipo)
+    )""",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_historico_fecha_inicio ON rentas_historico (fecha_inicio)",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_historico_cliente ON rentas_historico (cliente)",
+] + [
+    f"""CREATE TRIGGER IF NOT EXISTS {{schema}}.{table}_{event.lower()}_bloqueado BEFORE {event} ON {table}
+    BEGIN SELECT RAISE(ABORT, 'El historial de rentas solo admite inserciones'); END"""
+    for table in ("rentas_historico", "renta_equipos_historico") for event in ("UPDATE", "DELETE")
+]
+
+
+def partition_path(db_path, year):
+    """Archivo del historial para las rentas que iniciaron en `year`"""
+    return f"{os.path.splitext(db_path)[0]}.historico-{int(year)}.db"
+
+
+def partitions(db_path):
+    """Particiones existentes como lista ordenada de (año, ruta)"""
+    pattern = re.compile(r"\.historico-(\d{4})\.db$")
+    found = []
+    for path in glob.glob(f"{glob.escape(os.path.splitext(db_path)[0])}.historico-*.db"):
+        match = pattern.search(path)
+        if match:
+            found.append((int(match.group(1)), path))
+    return sorted(found)
+
+
+def _year(fecha):
+    return int(str(fecha)[:4]) if fecha else datetime.now().year
+
+
+def alias(year):
+    """Nombre con el que se adjunta la partición de `year`"""
+    return f"historico_{int(year)}"
+
+
+@contextmanager
+def attached(db_path, *years):
+    """Adjuntar las particiones de `years` a la conexión del hilo (creándolas si no existen).
+
+    SQLite no permite adjuntar dentro de una transacción, así que las
+    escrituras que usen las particiones deben hacerse dentro de este bloque.
+    Cada partición queda como ``historico_AAAA``; SQLite admite hasta 10
+    bases adjuntas a la vez.
+    """
+    with database.connection(db_path) as conn:
+        adjuntas = []
+        try:
+            for year in sorted(set(years)):
+                conn.execute(f"ATTACH DATABASE ? AS {alias(year)}", (partition_path(db_path, year),))
+                adjuntas.append(alias(year))
+                for ddl in _DDL:
+                    conn.execute(ddl.format(schema=alias(year)))
+            yield conn
+        finally:
+            for esquema in adjuntas:
+                conn.execute(f"DETACH DATABASE {esquema}")
+
+
+def finalize_operations(db_path, id_renta, expected_version=None, hoy=None, batch=()):
+    """Año de la partición, operaciones y validación para finalizar `id_renta`.
+
+    Las operaciones liberan los equipos y borran la renta activa; la
+    validación copia antes la renta y sus líneas al historial adjunto. Deben
+    aplicarse dentro de ``attached(db_path, año)``. Un equipo que otra renta
+    ya iniciada a más tardar `hoy` sigue ocupando no se libera; las rentas de
+    `batch` se finalizan junto con esta y no cuentan.
+    """
+    hoy = database.iso_day(hoy or date.today())
+    with database.connection(db_path) as conn:
+        row = conn.execute("SELECT fecha_inicio FROM rentas WHERE id_renta = ?", (id_renta,)).fetchone()
+        ocupados = conn.execute("""
+            SELECT re.id_equipo, re.id_renta
+            FROM renta_equipos re JOIN rentas r ON r.id_renta = re.id_renta
+            WHERE re.id_equipo IN (SELECT id_equipo FROM renta_equipos WHERE id_renta = ?)
+              AND re.id_renta != ? AND r.fecha_inicio <= ?
+        """, (id_renta, id_renta, hoy)).fetchall()
+    if row is None:
+        raise database.ConflictError(f"La renta {id_renta} ya no está activa", "rentas", id_renta)
+    year = _year(row[0])
+    ocupados = {equipo for equipo, otra in ocupados if otra not in batch}
+
+    operations = [database.update("equipos", equipo, {"estado": "disponible"})
+                  for equipo in database.equipos_de_renta(db_path, id_renta) if equipo not in ocupados]
+    operations.append(database.delete("renta_equipos", id_renta))
+    operations.append(database.delete("rentas", id_renta, expected_version=expected_version))
+
+    def guard(conn):
+        # En WAL el COMMIT no es atómico entre archivos: si una finalización anterior
+        # alcanzó a copiar la renta a la partición sin borrarla, reintentar no choca
+        columns = ", ".join(HISTORY_COLUMNS)
+        conn.execute(f"""
+            INSERT OR IGNORE INTO {alias(year)}.rentas_historico ({columns}, fecha_finalizacion)
+            SELECT {columns}, ? FROM main.rentas WHERE id_renta = ?
+        """, (datetime.now().isoformat(timespec="seconds"), id_renta))
+        conn.execute(f"""
+            INSERT OR IGNORE INTO {alias(year)}.renta_equipos_historico (id_renta, id_equipo, precio)
+            SELECT id_renta, id_equipo, precio FROM main.renta_equipos WHERE id_renta = ?
+        """, (id_renta,))
+        database.touch(db_path, "rentas_historico")
+
+    return year, operations, guard
+
+
+def finalize(db_path, id_renta, expected_version=None, hoy=None):
+    """Finalizar una renta moviéndola al historial en una sola transacción"""
+    year, operations, guard = finalize_operations(db_path, id_renta, expected_version, hoy)
+    with attached(db_path, year):
+        return database.apply_operations(db_path, operations, guard=guard)
+
+
+def _read_partition(path, sql, params):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+
+
+def history(db_path, desde=None, hasta=None, cliente=None, include_active=True):
+    """Rentas iniciadas entre `desde` y `hasta` en todas las particiones (y las activas).
+
+    Solo se abren las particiones de los años del rango. La columna
+    ``fecha_finalizacion`` es nula para las rentas que siguen activas; una
+    renta que quedó en la partición y también activa (finalización
+    interrumpida) aparece una sola vez, como activa.
+    """
+    desde = database.iso_day(desde) if desde else None
+    hasta = database.iso_day(hasta) if hasta else None
+    clauses, params = [], []
+    if desde:
+        clauses.append("fecha_inicio >= ?")
+        params.append(desde)
+    if hasta:
+        clauses.append("fecha_inicio <= ?")
+        params.append(hasta)
+    if cliente:
+        clauses.append("cliente = ?")
+        params.append(cliente)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    columns = ", ".join(HISTORY_COLUMNS)
+
+    # Las rentas finalizadas por otro proceso (la API o la línea de comandos) invalidan la caché
+    database.check_external(db_path)
+    cache = database.get_cache(db_path)
+    key = (("rentas", "rentas_historico"), ("historico", desde, hasta, cliente, include_active))
+    version = cache.version(key[0])
+    df = cache.get(key, version)
+    if df is not None:
+        return df
+
+    frames = []
+    for year, path in partitions(db_path):
+        if (desde and year < int(desde[:4])) or (hasta and year > int(hasta[:4])):
+            continue
+        frames.append(_read_partition(path, f"SELECT {columns}, fecha_finalizacion FROM rentas_historico{where}",
+                                      params))
+    if include_active:
+        frames.append(database.query(db_path, ["rentas"], ("historico_activas", desde, hasta, cliente),
+                                     f"SELECT {columns}, NULL AS fecha_finalizacion FROM rentas{where}", params))
+    frames = [frame for frame in frames if not frame.empty]
+    df = (pd.concat(frames, ignore_index=True).drop_duplicates("id_renta", keep="last")
+          .sort_values(["fecha_inicio", "id_renta"], ignore_index=True)
+          if frames else pd.DataFrame(columns=HISTORY_COLUMNS + ["fecha_finalizacion"]))
+    cache.put(key, version, df)
+    return df
+
+
+# Un SnapshotStore por partición, para que cada envío suba solo las páginas cambiadas
+_stores = {}
+
+
+def _store(repo, year):
+    store = _stores.get(year)
+    if store is None or store.repo is not repo:
+        store = _stores[year] = snapshots.SnapshotStore(repo, prefix=f"db/historico-{year}")
+    return store
+
+
+def push_partitions(repo, db_path, pushed):
+    """Subir las particiones modificadas desde el último envío (`pushed`: ruta -> mtime)"""
+    results = {}
+    for year, path in partitions(db_path):
+        mtime = os.path.getmtime(path)
+        if pushed.get(path) != mtime:
+            results[year] = _store(repo, year).push(path)
+            pushed[path] = mtime
+    return results
+
+
+def restore_partitions(repo, db_path):
+    """Descargar las particiones que falten localmente; regresa los años restaurados"""
+    # Los años posibles salen de los resúmenes diarios, que conservan toda renta registrada
+    try:
+        with database.connection(db_path) as conn:
+            first, last = conn.execute("SELECT MIN(dia), MAX(dia) FROM rollup_diario").fetchone()
+    except sqlite3.OperationalError:
+        return []
+    if first is None:
+        return []
+    restored = []
+    for year in range(_year(first), _year(last) + 1):
+        path = partition_path(db_path, year)
+        if not os.path.exists(path) and _store(repo, year).restore(path):
+            restored.append(year)
+    return restored
@@ -0,0 +1,129 @@
+"""Autenticación de usuarios.
+
+La contraseña se busca por llave primaria y bcrypt se ejecuta en un pool de
+hilos acotado para que los inicios de sesión no acaparen el proceso. Tras un
+inicio exitoso se emite un token firmado con expiración; al recargar la
+página se valida el token (HMAC) sin volver a ejecutar bcrypt. La firma
+incluye un contador de sesiones del usuario que se incrementa al cerrar
+sesión, de modo que un token copiado de la URL deja de servir.
+"""
+import base64
+import hashlib
+import hmac
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+import database
+import tracing
+
+# bcrypt es costoso a propósito (~100 ms o más); se limita cuántos corren a la vez
+BCRYPT_WORKERS = 2
+_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
+
+def get_password_hash(db_path, usuario):
+    """Hash guardado del usuario (búsqueda por llave primaria); None si no existe"""
+    with database.connection(db_path) as conn:
+        row = conn.execute("SELECT password FROM usuarios WHERE usuario = ?", (usuario,)).fetchone()
+    return row[0] if row else None
+
+
+def _credentials(db_path, usuario):
+    """(hash, contador de sesiones) del usuario; None si no existe"""
+    with database.connection(db_path) as conn:
+        return conn.execute("SELECT password, sesion_version FROM usuarios WHERE usuario = ?",
+                            (usuario,)).fetchone()
+
+
+def _checkpw(password, stored_hash):
+    if isinstance(stored_hash, str):
+        stored_hash = stored_hash.encode('utf-8')
+    return bcrypt.checkpw(password.encode('utf-8'), stored_hash)
+
+
+def verify_password(password, stored_hash, timeout=30):
+    """Verificar la contraseña con bcrypt en el pool acotado"""
+    return _executor.submit(_checkpw, password, stored_hash).result(timeout)
+
+
+def authenticate(db_path, usuario, password):
+    """Validar credenciales; None si el usuario no existe, o si la contraseña es correcta"""
+    with tracing.span("auth.password") as span:
+        stored_hash = get_password_hash(db_path, usuario)
+        if stored_hash is None:
+            if span:
+                span.set(result="unknown_user")
+            return None
+        valido = verify_password(password, stored_hash)
+        if span:
+            span.set(result="ok" if valido else "bad_password")
+        return valido
+
+
+def create_user(conn, usuario, password):
+    """Crear un usuario si no existe; regresa True si se creó"""
+    if conn.execute("SELECT 1 FROM usuarios WHERE usuario = ?", (usuario,)).fetchone():
+        return False
+    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    conn.execute("INSERT INTO usuarios (usuario, password) VALUES (?, ?)",
+                 (usuario, hashed_password.decode('utf-8')))
+    return True
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _signature(secret, usuario, expires, credentials):
+    # Incluir el hash y el contador hace que cambiar la contraseña o cerrar sesión
+    # invalide los tokens emitidos
+    stored_hash, sesion_version = credentials
+    message = f"{usuario}|{expires}|{stored_hash}|{sesion_version}".encode("utf-8")
+    return hmac.new(secret, message, hashlib.sha256).digest()
+
+
+def issue_token(db_path, secret, usuario, ttl_seconds):
+    """Emitir un token de sesión firmado para `usuario`"""
+    expires = int(time.time()) + int(ttl_seconds)
+    signature = _signature(secret, usuario, expires, _credentials(db_path, usuario))
+    return f"{_b64(usuario.encode('utf-8'))}.{expires}.{_b64(signature)}"
+
+
+def revoke_tokens(db_path, usuario):
+    """Invalidar todos los tokens emitidos para `usuario` (al cerrar sesión)"""
+    with database.transaction(db_path) as conn:
+        conn.execute("UPDATE usuarios SET sesion_version = sesion_version + 1 WHERE usuario = ?", (usuario,))
+        database.touch(db_path, "usuarios")
+
+
+def verify_token(db_path, secret, token):
+    """Usuario del token si la firma es válida y no ha expirado; si no, None"""
+    with tracing.span("auth.token") as span:
+        usuario = _verify_token(db_path, secret, token)
+        if span:
+            span.set(result="ok" if usuario else "rejected")
+        return usuario
+
+
+def _verify_token(db_path, secret, token):
+    try:
+        usuario_b64, expires, signature = token.split(".")
+        usuario = _unb64(usuario_b64).decode("utf-8")
+        expires = int(expires)
+        signature = _unb64(signature)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if expires < time.time():
+        return None
+    credentials = _credentials(db_path, usuario)
+    if credentials is None:
+        return None
+    if not hmac.compare_digest(signature, _signature(secret, usuario, expires, credentials)):
+        return None
+    return usuario
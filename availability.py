@@ -0,0 +1,71 @@
+"""Disponibilidad de equipos por rango de fechas.
+
+Los equipos libres en un periodo se filtran en la consulta de búsqueda
+(operador ``libre`` de ``database.search``) y, al guardar, ``booking_guard``
+vuelve a comprobar los traslapes dentro de la transacción de escritura.
+
+Los intervalos son semiabiertos ``[fecha_inicio, fecha_fin)``: una renta puede
+empezar el mismo día en que termina la anterior.
+"""
+import database
+
+
+class BookingConflict(database.ConflictError):
+    """Algún equipo ya está rentado en el rango de fechas solicitado"""
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        detalle = ", ".join(f"{equipo} ({', '.join(rentas)})" for equipo, rentas in conflicts.items())
+        super().__init__(f"Equipos ya rentados en esas fechas: {detalle}", "renta_equipos")
+
+
+_day = database.iso_day
+
+
+def booking_guard(equipos, inicio, fin, exclude=None):
+    """Validación para `database.apply_operations`: rechaza rentas que se traslapan.
+
+    Se ejecuta dentro de la transacción de escritura, así que dos sesiones no
+    pueden reservar el mismo equipo en fechas que chocan.
+    """
+    inicio, fin = _day(inicio), _day(fin)
+
+    def guard(conn):
+        conflicts = {}
+        for id_equipo in equipos:
+            rows = conn.execute("""
+                SELECT r.id_renta
+                FROM renta_equipos re
+                JOIN rentas r ON r.id_renta = re.id_renta
+                WHERE re.id_equipo = ? AND r.id_renta IS NOT ?
+                  AND r.fecha_inicio < ? AND r.fecha_fin > ?
+            """, (id_equipo, exclude, fin, inicio)).fetchall()
+            if rows:
+                conflicts[id_equipo] = [row[0] for row in rows]
+        if conflicts:
+            raise BookingConflict(conflicts)
+
+    return guard
+
+
+def start_due_rentals(db_path, hoy):
+    """Marcar como rentados los equipos de reservas cuyo periodo ya comenzó.
+
+    Las fechas están normalizadas (migración 6), así que se comparan directo;
+    el orden de los ``CROSS JOIN`` y el ``+`` hacen que SQLite recorra el
+    índice de ``fecha_fin`` (solo las rentas vigentes) y no todos los equipos.
+    """
+    hoy = _day(hoy)
+    with database.connection(db_path) as conn:
+        rows = conn.execute("""
+            SELECT DISTINCT e.id_equipo
+            FROM rentas r
+            CROSS JOIN renta_equipos re ON re.id_renta = r.id_renta
+            CROSS JOIN equipos e ON e.id_equipo = re.id_equipo
+            WHERE r.fecha_fin > ? AND +r.fecha_inicio <= ?
+              AND e.estado = 'disponible'
+        """, (hoy, hoy)).fetchall()
+    if rows:
+        database.apply_operations(db_path, [database.update("equipos", row[0], {"estado": "rentado"})
+                                            for row in rows])
+    return len(rows)
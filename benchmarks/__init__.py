@@ -0,0 +1 @@
+"""Benchmarks de MarTech Rent (se ejecutan con ``python -m benchmarks.<modulo>``)."""
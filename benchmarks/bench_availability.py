@@ -0,0 +1,116 @@
+"""Benchmark de la disponibilidad por fechas con 100k intervalos históricos.
+
+Mide el filtro ``libre`` de ``database.read_page`` (el de la búsqueda de
+Nueva Renta) y ``availability.booking_guard`` sobre una base temporal, y
+compara el resultado con un recorrido completo de los intervalos.
+
+Uso: ``python -m benchmarks.bench_availability [--intervalos N] [--equipos N]``
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+import availability
+import database
+import migrations
+
+
+def generate_intervals(n_intervalos, n_equipos, seed=7):
+    """Rentas consecutivas sin traslape por equipo a lo largo de varios años"""
+    rng = random.Random(seed)
+    cursor = {f"ME{i:06d}": date(2015, 1, 1) + timedelta(days=rng.randint(0, 30)) for i in range(n_equipos)}
+    equipos = list(cursor)
+    intervals = []
+    for n in range(n_intervalos):
+        id_equipo = rng.choice(equipos)
+        inicio = cursor[id_equipo] + timedelta(days=rng.randint(0, 10))
+        fin = inicio + timedelta(days=rng.randint(1, 30))
+        cursor[id_equipo] = fin
+        intervals.append((f"RE-{n:07d}", inicio.isoformat(), fin.isoformat(), id_equipo))
+    return equipos, intervals
+
+
+def naive_free(intervals, equipos, inicio, fin):
+    """Referencia: recorrer todos los intervalos"""
+    ocupados = {eq for _, ini, end, eq in intervals if ini < fin and end > inicio}
+    return [eq for eq in equipos if eq not in ocupados]
+
+
+def load(db_path, equipos, intervals):
+    """Base temporal con los equipos y una renta por intervalo"""
+    migrations.migrate(db_path)
+    with database.transaction(db_path) as conn:
+        conn.executemany("INSERT INTO equipos (id_equipo, marca, modelo, caracteristicas, estado, precio_base) "
+                         "VALUES (?, 'Dell', 'XPS', '', 'disponible', 100)", [(eq,) for eq in equipos])
+        conn.executemany("INSERT INTO rentas (id_renta, cliente, contacto, equipos, fecha_inicio, fecha_fin, "
+                         "subtotal, precio) VALUES (?, 'Benchmark', '5500000000', ?, ?, ?, 100, 116)",
+                         [(id_renta, json.dumps([eq]), ini, end) for id_renta, ini, end, eq in intervals])
+        conn.executemany("INSERT INTO renta_equipos (id_renta, id_equipo, precio) VALUES (?, ?, 100)",
+                         [(id_renta, eq) for id_renta, _, _, eq in intervals])
+
+
+def free(db_path, n_equipos, inicio, fin):
+    """Equipos libres según el filtro ``libre``, como en la búsqueda de Nueva Renta"""
+    df = database.read_page(db_path, "equipos", [("id_equipo", "libre", (inicio, fin))], limit=n_equipos)
+    return sorted(df.id_equipo.tolist())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--intervalos", type=int, default=100_000)
+    parser.add_argument("--equipos", type=int, default=2_000)
+    parser.add_argument("--consultas", type=int, default=200)
+    args = parser.parse_args()
+
+    equipos, intervals = generate_intervals(args.intervalos, args.equipos)
+    fechas = sorted(ini for _, ini, _, _ in intervals)
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_availability.db")
+    start = time.perf_counter()
+    load(db_path, equipos, intervals)
+    build = time.perf_counter() - start
+
+    rng = random.Random(11)
+    consultas = []
+    for _ in range(args.consultas):
+        inicio = rng.choice(fechas)
+        fin = (date.fromisoformat(inicio) + timedelta(days=rng.randint(1, 14))).isoformat()
+        consultas.append((inicio, fin))
+
+    # Sin caché: cada consulta tiene fechas distintas, como al cambiarlas en la vista
+    start = time.perf_counter()
+    for inicio, fin in consultas:
+        free(db_path, len(equipos), inicio, fin)
+    filtro = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i, (inicio, fin) in enumerate(consultas):
+        guard = availability.booking_guard([equipos[i % len(equipos)]], inicio, fin)
+        with database.connection(db_path) as conn:
+            try:
+                guard(conn)
+            except availability.BookingConflict:
+                pass
+    validacion = time.perf_counter() - start
+
+    muestra = consultas[:10]
+    start = time.perf_counter()
+    for inicio, fin in muestra:
+        naive_free(intervals, equipos, inicio, fin)
+    naive = (time.perf_counter() - start) / len(muestra) * len(consultas)
+
+    for inicio, fin in muestra:
+        assert free(db_path, len(equipos), inicio, fin) == sorted(naive_free(intervals, equipos, inicio, fin))
+
+    print(f"intervalos: {len(intervals):,}  equipos: {len(equipos):,}  consultas: {len(consultas)}")
+    print(f"carga de la base: {build:.3f} s")
+    print(f"filtro libre: {filtro:.3f} s total, {filtro / len(consultas) * 1e3:.2f} ms por consulta")
+    print(f"booking_guard: {validacion / len(consultas) * 1e3:.3f} ms por equipo")
+    print(f"recorrido completo (estimado): {naive:.3f} s total, {naive / len(consultas) * 1e3:.2f} ms por consulta")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Prueba de carga del inicio de sesión con N sesiones concurrentes.
+
+Compara el inicio de sesión con contraseña (búsqueda por llave primaria +
+bcrypt en el pool acotado) contra la revalidación con token firmado que se
+usa al recargar la página.
+
+Uso: ``python -m benchmarks.bench_login [--sesiones N] [--usuarios N] [--rondas 12]``
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import bcrypt
+
+import auth
+import database
+
+
+def create_users(db_path, n_usuarios, rounds):
+    """Crear la tabla usuarios con `n_usuarios` (todos con contraseña 'secreto')"""
+    hashed = bcrypt.hashpw(b"secreto", bcrypt.gensalt(rounds)).decode("utf-8")
+    with database.transaction(db_path) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS usuarios (usuario TEXT PRIMARY KEY, password TEXT)")
+        conn.executemany("INSERT OR REPLACE INTO usuarios VALUES (?, ?)",
+                         [(f"user{i:06d}", hashed) for i in range(n_usuarios)])
+
+
+def run_sessions(n_sesiones, intentos, fn):
+    """Ejecutar `fn(sesion, intento)` desde `n_sesiones` hilos; regresa duración y latencias"""
+    latencias = []
+    lock = threading.Lock()
+    barrera = threading.Barrier(n_sesiones)
+
+    def sesion(i):
+        barrera.wait()
+        for j in range(intentos):
+            start = time.perf_counter()
+            fn(i, j)
+            with lock:
+                latencias.append(time.perf_counter() - start)
+
+    hilos = [threading.Thread(target=sesion, args=(i,)) for i in range(n_sesiones)]
+    start = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return time.perf_counter() - start, latencias
+
+
+def report(nombre, duracion, latencias):
+    latencias = sorted(latencias)
+    p95 = latencias[int(len(latencias) * 0.95) - 1] if len(latencias) > 1 else latencias[0]
+    print(f"{nombre:<28} {len(latencias) / duracion:10.1f} por s   "
+          f"p50 {statistics.median(latencias) * 1e3:8.2f} ms   p95 {p95 * 1e3:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sesiones", type=int, default=16)
+    parser.add_argument("--intentos", type=int, default=4)
+    parser.add_argument("--usuarios", type=int, default=10_000)
+    parser.add_argument("--rondas", type=int, default=12, help="costo de bcrypt")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_login.db")
+    create_users(db_path, args.usuarios, args.rondas)
+    secret = os.urandom(32)
+    usuario = lambda i: f"user{(i * 7919) % args.usuarios:06d}"
+
+    print(f"sesiones: {args.sesiones}  intentos por sesión: {args.intentos}  usuarios: {args.usuarios:,}  "
+          f"rondas bcrypt: {args.rondas}  hilos bcrypt: {auth.BCRYPT_WORKERS}")
+
+    def login(i, j):
+        assert auth.authenticate(db_path, usuario(i), "secreto")
+
+    report("contraseña (bcrypt)", *run_sessions(args.sesiones, args.intentos, login))
+
+    tokens = [auth.issue_token(db_path, secret, usuario(i), 3600) for i in range(args.sesiones)]
+
+    def reconnect(i, j):
+        assert auth.verify_token(db_path, secret, tokens[i]) == usuario(i)
+
+    report("token firmado (recarga)", *run_sessions(args.sesiones, args.intentos * 50, reconnect))
+
+
+if __name__ == "__main__":
+    main()
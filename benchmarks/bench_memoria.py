@@ -0,0 +1,111 @@
+"""Memoria residente (RSS) del proceso con muchas sesiones simultáneas.
+
+Simula `--sesiones` sesiones que conservan las tablas de referencia
+(equipos, clientes y rentas) como lo hace un rerun, en dos modos, cada uno
+en un proceso nuevo:
+
+- ``por_sesion``: cada sesión lee sus propios DataFrames con tipos
+  ``object`` y decodifica ``rentas.equipos`` a listas (el flujo original).
+- ``compartida``: las sesiones toman la versión compacta compartida de la
+  caché de ``database`` y derivan de ella sin copiarla.
+
+Uso: ``python -m benchmarks.bench_memoria [--escala N] [--sesiones N] [--db ruta]``
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TABLES = ["equipos", "clientes", "rentas"]
+MODES = ["por_sesion", "compartida"]
+
+
+def rss_bytes():
+    """RSS actual del proceso (en Linux); si no está disponible, el máximo alcanzado"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def run_sessions(db_path, mode, sesiones):
+    """Abrir `sesiones` sesiones en este proceso y medir la memoria que conservan"""
+    import pandas as pd
+
+    import database
+
+    with database.connection(db_path):
+        pass
+    antes = rss_bytes()
+    start = time.perf_counter()
+    sessions = []
+    for _ in range(sesiones):
+        if mode == "por_sesion":
+            with database.connection(db_path) as conn:
+                frames = {table: pd.read_sql_query(f"SELECT * FROM {table}", conn) for table in TABLES}
+            frames["rentas"]["equipos"] = frames["rentas"]["equipos"].apply(
+                lambda x: json.loads(x) if isinstance(x, str) and x else [])
+        else:
+            frames = {table: database.read_table(db_path, table) for table in TABLES}
+            # Lo que una vista deriva sin modificar comparte los datos de la caché
+            frames["disponibles"] = frames["equipos"][["id_equipo", "marca", "estado"]]
+        sessions.append(frames)
+    segundos = time.perf_counter() - start
+    despues = rss_bytes()
+    return {
+        "modo": mode,
+        "sesiones": sesiones,
+        "rss_inicial_mb": round(antes / 2**20, 1),
+        "rss_final_mb": round(despues / 2**20, 1),
+        "mb_por_sesion": round((despues - antes) / 2**20 / sesiones, 2),
+        "bytes_tablas_por_sesion": int(sum(sessions[0][table].memory_usage(deep=True).sum() for table in TABLES)),
+        "segundos": round(segundos, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--escala", type=int, default=20000, help="filas de equipos, clientes y rentas")
+    parser.add_argument("--sesiones", type=int, default=50)
+    parser.add_argument("--db", help="reutilizar una base generada antes con benchmarks.datos")
+    parser.add_argument("--modo", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--salida", default="bench_memoria.json")
+    args = parser.parse_args()
+
+    if args.modo:
+        print(json.dumps(run_sessions(args.db, args.modo, args.sesiones)))
+        return
+
+    if args.db and os.path.exists(args.db):
+        db_path = args.db
+    else:
+        from benchmarks import datos
+
+        db_path = args.db or os.path.join(tempfile.mkdtemp(), "bench_memoria.db")
+        generacion = datos.generate(db_path, args.escala, args.escala, args.escala, 10)
+        print(f"datos generados: {generacion['filas']} en {generacion['segundos']:.2f} s")
+
+    # Cada modo en un proceso nuevo para que la memoria de uno no cuente en el otro
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.environ.get("PYTHONPATH", "")]))
+    resultados = []
+    for mode in MODES:
+        out = subprocess.run([sys.executable, "-m", "benchmarks.bench_memoria", "--modo", mode, "--db", db_path,
+                              "--sesiones", str(args.sesiones)], env=env, capture_output=True, text=True, check=True)
+        resultado = json.loads(out.stdout.strip().splitlines()[-1])
+        resultados.append(resultado)
+        print(f"{mode:12s} RSS {resultado['rss_inicial_mb']:8.1f} → {resultado['rss_final_mb']:8.1f} MB   "
+              f"{resultado['mb_por_sesion']:6.2f} MB por sesión")
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump({"db": db_path, "resultados": resultados}, f, indent=2, ensure_ascii=False)
+    print(f"resultados en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Tiempo de arranque en frío y por rerun de app.py.
+
+Ejecuta la aplicación con ``streamlit.testing`` en un directorio temporal
+(la base se crea ahí). El arranque en frío se mide en un proceso nuevo, e
+incluye importar dependencias e inicializar la base; el rerun se mide
+en el mismo proceso con una sesión ya autenticada en el panel principal,
+junto con cuántas conexiones toma cada rerun del pool de la base.
+
+Uso: ``python -m benchmarks.bench_startup [--reruns N]``
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+
+
+def run_app(reruns):
+    """Medir el primer run y `reruns` reruns de la aplicación en este proceso"""
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.session_state.authenticated = True
+    at.session_state.usuario = "admin"
+    at.run()
+    first = time.perf_counter() - start
+    import database
+
+    db_path = os.path.join(os.getcwd(), "rentapp_database.db")
+    prestamos = lambda: sum(database.pool_stats(db_path)[k] for k in ("created", "reused"))
+    antes = prestamos()
+    tiempos = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        at.run()
+        tiempos.append(time.perf_counter() - start)
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return {
+        "primer_run_s": first,
+        "rerun_ms_mediana": statistics.median(tiempos) * 1e3,
+        "conexiones_por_rerun": (prestamos() - antes) / reruns,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_app(args.reruns)))
+        return
+
+    workdir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, ".streamlit"))
+    with open(os.path.join(workdir, ".streamlit", "secrets.toml"), "w") as f:
+        f.write('SESSION_SECRET = "benchmark"\n')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.environ.get("PYTHONPATH", "")]))
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--child", "--reruns", str(args.reruns)],
+                         cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    resultado = json.loads(out.stdout.strip().splitlines()[-1])
+    resultado["arranque_en_frio_s"] = time.perf_counter() - start
+    print(json.dumps(resultado, indent=1))
+
+
+if __name__ == "__main__":
+    main()
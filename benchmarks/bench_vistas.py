@@ -0,0 +1,249 @@
+"""Tiempos del camino de datos de cada vista con datos sintéticos.
+
+Genera una base con ``benchmarks.datos`` y mide, para cada escenario, la
+primera ejecución sin caché ("frío") y las siguientes ("caliente"):
+inicio de sesión, Nueva Renta, búsqueda de texto, detección de rentas activas de Finalizar
+Renta, cálculo de vencimientos de Seguimiento, los listados paginados y la
+sincronización contra el repositorio falso. El resultado se escribe en JSON
+junto con el commit para comparar cambios entre versiones.
+
+Uso: ``python -m benchmarks.bench_vistas [--escala N] [--repeticiones N] [--salida archivo.json]``
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import auth
+import database
+import services
+import snapshots
+import sync
+from benchmarks import datos
+from benchmarks.repo_falso import FakeRepo
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _stats(tiempos):
+    tiempos = sorted(tiempos)
+    ms = [t * 1000 for t in tiempos]
+    return {
+        "n": len(ms),
+        "min_ms": round(ms[0], 3),
+        "mediana_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+
+def _invalidate(db_path):
+    """Descartar la caché de consultas, como tras una escritura de otra sesión"""
+    database.get_cache(db_path).bump(database.SCHEMA)
+
+
+def lectura_scenarios(db_path, token, secret):
+    """Escenarios de solo lectura: nombre -> función sin argumentos"""
+    dia = date.today()
+
+    def nueva_renta(buscar_equipo="", buscar_cliente=""):
+        # Los selectores cargan solo los mejores resultados de la búsqueda
+        def run():
+            # Como en la vista, el traslape se excluye en la consulta
+            filtros = [("estado", "=", "disponible"), ("id_equipo", "libre", (dia, dia + timedelta(days=7)))]
+            database.search(db_path, "equipos", buscar_equipo, filtros, 50, "marca")
+            database.search(db_path, "clientes", buscar_cliente, limit=50, order_by="nombre")
+        return run
+
+    def seguimiento():
+        database.overdue_rentals(db_path, dia, limit=250)
+        database.expiring_rentals(db_path, dia, 3, limit=250)
+        database.count_rows(db_path, "rentas")
+        database.read_page(db_path, "rentas", (), "fecha_fin", limit=50)
+
+    def listado(table, filters, order_by):
+        def run():
+            database.count_rows(db_path, table, filters)
+            database.read_page(db_path, table, filters, order_by, limit=50, offset=0)
+        return run
+
+    return {
+        "login_password": lambda: auth.authenticate(db_path, "admin", "12345"),
+        "login_token": lambda: auth.verify_token(db_path, secret, token),
+        "nueva_renta_candidatos": nueva_renta(),
+        "nueva_renta_busqueda": nueva_renta("thinkpad 16gb", "ana gar"),
+        "buscar_equipos": lambda: database.search(db_path, "equipos", "len 32gb", limit=250),
+        "buscar_clientes": lambda: database.search(db_path, "clientes", "lu", limit=250),
+        "inicio_resumen": lambda: database.expiry_summary(db_path, dia, 3),
+        "finalizar_rentas_activas": lambda: database.active_rentals(db_path, dia),
+        "seguimiento_vencimientos": seguimiento,
+        "inventario": listado("equipos", [("estado", "=", "disponible")], "marca"),
+        "listado_clientes": listado("clientes", [("nombre", "like", "Ana%")], "nombre"),
+        "listado_rentas": listado("rentas", [("cliente", "like", "Luis%")], "fecha_inicio"),
+    }
+
+
+def run_scenario(db_path, fn, repeticiones):
+    """Medir la primera llamada sin caché y `repeticiones` llamadas con caché"""
+    frio = []
+    for _ in range(max(1, repeticiones // 5)):
+        _invalidate(db_path)
+        start = time.perf_counter()
+        fn()
+        frio.append(time.perf_counter() - start)
+    caliente = []
+    for _ in range(repeticiones):
+        start = time.perf_counter()
+        fn()
+        caliente.append(time.perf_counter() - start)
+    return {"frio": _stats(frio), "caliente": _stats(caliente)}
+
+
+def escritura_scenarios(db_path, repeticiones):
+    """Registrar y finalizar rentas a futuro con las funciones de ``services`` que usa la aplicación.
+
+    Incluye la validación de traslapes, la cotización, las secuencias, el
+    cambio de estado de los equipos y el paso de la renta a su partición del
+    historial.
+    """
+    equipos = database.read_table(db_path, "equipos", cached=False)
+    equipos = equipos[equipos.estado != "mantenimiento"].set_index("id_equipo")
+    id_cliente = database.read_table(db_path, "clientes", cached=False).id_cliente.iloc[0]
+    # Periodos lejanos en el futuro para no chocar con las rentas generadas
+    base = date.today() + timedelta(days=3 * 365)
+    registradas = []
+    tiempos = []
+    for i in range(repeticiones):
+        inicio, fin = base + timedelta(days=7 * i), base + timedelta(days=7 * i + 5)
+        id_equipo = equipos.index[i % len(equipos)]
+        versiones = {id_equipo: database.read_table(db_path, "equipos").set_index("id_equipo").version[id_equipo]}
+        start = time.perf_counter()
+        # Con `hoy` = inicio la renta ya empezó y marca su equipo como rentado, como en la vista
+        registradas.append((services.create_renta(db_path, id_cliente, [id_equipo], inicio, fin,
+                                                  versiones=versiones, hoy=inicio), inicio))
+        tiempos.append(time.perf_counter() - start)
+
+    finalizar = []
+    for id_renta, inicio in registradas:
+        start = time.perf_counter()
+        services.finalize_renta(db_path, id_renta, hoy=inicio)
+        finalizar.append(time.perf_counter() - start)
+    return {"nueva_renta_guardar": {"caliente": _stats(tiempos)},
+            "finalizar_renta_guardar": {"caliente": _stats(finalizar)}}
+
+
+def sync_scenarios(db_path, repeticiones, latency, bandwidth):
+    """Subida completa (flujo original), snapshots con deltas y restauración"""
+    repo = FakeRepo(latency=latency, bandwidth=bandwidth)
+    completa = []
+    for _ in range(max(1, repeticiones // 5)):
+        start = time.perf_counter()
+        content = sync.snapshot_bytes(db_path)
+        try:
+            current = repo.get_contents(sync.REMOTE_PATH)
+        except FileNotFoundError:
+            repo.create_file(sync.REMOTE_PATH, "Create database", content)
+        else:
+            repo.update_file(sync.REMOTE_PATH, "Update database", content, current.sha)
+        completa.append(time.perf_counter() - start)
+
+    store = snapshots.SnapshotStore(repo)
+    start = time.perf_counter()
+    store.push(db_path)
+    base = time.perf_counter() - start
+    deltas = []
+    for i in range(repeticiones):
+        # Una escritura pequeña entre envíos, como un registro desde la interfaz
+        database.apply_operations(db_path, [database.insert("clientes", {
+            "id_cliente": database.NextId("MC"), "nombre": f"Sync {i}"})])
+        start = time.perf_counter()
+        store.push(db_path)
+        deltas.append(time.perf_counter() - start)
+
+    restaurar = []
+    destino = os.path.join(tempfile.mkdtemp(), "restore.db")
+    for _ in range(max(1, repeticiones // 5)):
+        start = time.perf_counter()
+        snapshots.SnapshotStore(repo).restore(destino)
+        restaurar.append(time.perf_counter() - start)
+    return {
+        "sync_subida_completa": {"caliente": _stats(completa)},
+        "sync_snapshot_base": {"caliente": _stats([base])},
+        "sync_snapshot_delta": {"caliente": _stats(deltas)},
+        "sync_restaurar": {"caliente": _stats(restaurar)},
+    }, repo.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--escala", type=int, default=None, help="filas de equipos, clientes y rentas")
+    parser.add_argument("--equipos", type=int, default=1000)
+    parser.add_argument("--clientes", type=int, default=1000)
+    parser.add_argument("--rentas", type=int, default=1000)
+    parser.add_argument("--usuarios", type=int, default=100)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--db", help="reutilizar una base generada antes con benchmarks.datos")
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos por llamada al repositorio")
+    parser.add_argument("--ancho-banda", type=float, default=None, help="bytes por segundo del repositorio")
+    parser.add_argument("--salida", default="bench_vistas.json")
+    args = parser.parse_args()
+    if args.escala:
+        args.equipos = args.clientes = args.rentas = args.escala
+
+    if args.db and os.path.exists(args.db):
+        db_path = args.db
+        generacion = None
+    else:
+        db_path = args.db or os.path.join(tempfile.mkdtemp(), "bench_vistas.db")
+        generacion = datos.generate(db_path, args.equipos, args.clientes, args.rentas, args.usuarios)
+        print(f"datos generados: {generacion['filas']} en {generacion['segundos']:.2f} s")
+
+    secret = os.urandom(32)
+    token = auth.issue_token(db_path, secret, "admin", 3600)
+    escenarios = {}
+    for nombre, fn in lectura_scenarios(db_path, token, secret).items():
+        repeticiones = max(3, args.repeticiones // 5) if nombre == "login_password" else args.repeticiones
+        escenarios[nombre] = run_scenario(db_path, fn, repeticiones)
+        print(f"{nombre:28s} frío {escenarios[nombre]['frio']['mediana_ms']:10.2f} ms   "
+              f"caliente {escenarios[nombre]['caliente']['mediana_ms']:10.2f} ms")
+    escenarios.update(escritura_scenarios(db_path, args.repeticiones))
+    sync_resultados, repo_stats = sync_scenarios(db_path, args.repeticiones, args.latencia, args.ancho_banda)
+    escenarios.update(sync_resultados)
+    for nombre in ("nueva_renta_guardar", "finalizar_renta_guardar", *sync_resultados):
+        print(f"{nombre:28s} {escenarios[nombre]['caliente']['mediana_ms']:10.2f} ms")
+
+    with database.connection(db_path) as conn:
+        filas = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in database.SCHEMA}
+    resultado = {
+        "commit": _commit(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "filas": filas,
+        "db_bytes": os.path.getsize(db_path),
+        "generacion": generacion,
+        "repeticiones": args.repeticiones,
+        "escenarios": escenarios,
+        "repo": repo_stats,
+        "pool": database.pool_stats(db_path),
+        "cache": database.get_cache(db_path).stats(),
+    }
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False, default=str)
+    print(f"resultados en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
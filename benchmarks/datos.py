@@ -0,0 +1,142 @@
+"""Generador de datos sintéticos para los benchmarks.
+
+Llena ``equipos``, ``clientes``, ``rentas`` (con sus líneas en
+``renta_equipos``) y ``usuarios`` con tamaños configurables, de mil a un
+millón de filas. Las fechas imitan una operación real: la mayoría de las
+rentas son históricas y más frecuentes en los meses recientes, una parte
+sigue activa hoy y unas pocas son reservas a futuro.
+
+Uso: ``python -m benchmarks.datos salida.db [--equipos N] [--clientes N] [--rentas N] [--usuarios N]``
+"""
+import argparse
+import json
+import random
+import time
+from datetime import date, timedelta
+from itertools import islice
+
+import bcrypt
+
+import database
+import migrations
+
+CHUNK = 50_000
+MARCAS = ["Dell", "HP", "Lenovo", "Apple", "Asus", "Acer", "Epson", "BenQ", "Canon", "Sony"]
+MODELOS = ["Pro", "Air", "Elite", "Vostro", "ThinkPad", "Inspiron", "PowerLite", "MX", "ZenBook", "Aspire"]
+NOMBRES = ["Ana", "Luis", "María", "José", "Carmen", "Jorge", "Lucía", "Pedro", "Sofía", "Miguel"]
+APELLIDOS = ["García", "Martínez", "López", "Hernández", "González", "Pérez", "Sánchez", "Ramírez", "Torres", "Flores"]
+# Duración en días y su peso: rentas cortas de fin de semana, semanales y mensuales
+DURACIONES = ([1, 2, 3, 5, 7, 14, 30, 60], [10, 12, 14, 12, 22, 14, 12, 4])
+HISTORIA_DIAS = 3 * 365
+IVA = 0.16
+
+
+def _chunks(rows, size=CHUNK):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _equipos(rng, n):
+    for i in range(1, n + 1):
+        marca = rng.choice(MARCAS)
+        yield (f"ME{i:04d}", marca, f"{rng.choice(MODELOS)} {rng.randint(100, 999)}",
+               f"{rng.choice([8, 16, 32])}GB RAM, {rng.choice([256, 512, 1024])}GB SSD",
+               "mantenimiento" if rng.random() < 0.03 else "disponible",
+               float(rng.choice([150, 200, 250, 300, 400, 500])))
+
+
+def _clientes(rng, n):
+    for i in range(1, n + 1):
+        nombre = f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {i}"
+        yield (f"MC{i:04d}", nombre, f"55{rng.randint(10_000_000, 99_999_999)}",
+               f"cliente{i}@ejemplo.com")
+
+
+def _fecha_inicio(rng, hoy):
+    """Días hacia atrás con densidad creciente hacia hoy; ~2% son reservas futuras"""
+    if rng.random() < 0.02:
+        return hoy + timedelta(days=rng.randint(1, 30))
+    return hoy - timedelta(days=int(rng.triangular(0, HISTORIA_DIAS, 0)))
+
+
+def _rentas(rng, n, n_equipos, clientes, hoy):
+    for i in range(1, n + 1):
+        id_renta = f"RE-{i:04d}"
+        inicio = _fecha_inicio(rng, hoy)
+        fin = inicio + timedelta(days=rng.choices(*DURACIONES)[0])
+        equipos = {f"ME{rng.randint(1, n_equipos):04d}": float(rng.choice([150, 200, 250, 300]))
+                   for _ in range(rng.choices([1, 2, 3], [70, 22, 8])[0])}
+        cliente, contacto = clientes[rng.randrange(len(clientes))]
+        subtotal = sum(equipos.values())
+        renta = (id_renta, cliente, contacto, json.dumps(list(equipos)), inicio.isoformat(), fin.isoformat(),
+                 subtotal, round(subtotal * (1 + IVA), 2))
+        yield renta, [(id_renta, id_equipo, precio) for id_equipo, precio in equipos.items()]
+
+
+def generate(db_path, equipos=1000, clientes=1000, rentas=1000, usuarios=10, seed=7, hoy=None):
+    """Crear o ampliar `db_path` con datos sintéticos; regresa filas por tabla y duración"""
+    rng = random.Random(seed)
+    hoy = hoy or date.today()
+    start = time.perf_counter()
+    migrations.migrate(db_path)
+
+    with database.transaction(db_path) as conn:
+        for chunk in _chunks(_equipos(rng, equipos)):
+            conn.executemany("INSERT OR REPLACE INTO equipos (id_equipo, marca, modelo, caracteristicas, estado, "
+                             "precio_base) VALUES (?, ?, ?, ?, ?, ?)", chunk)
+        nombres = []
+        for chunk in _chunks(_clientes(rng, clientes)):
+            conn.executemany("INSERT OR REPLACE INTO clientes (id_cliente, nombre, contacto, correo) "
+                             "VALUES (?, ?, ?, ?)", chunk)
+            nombres.extend((nombre, contacto) for _, nombre, contacto, _ in chunk)
+
+        activos = set()
+        for chunk in _chunks(_rentas(rng, rentas, equipos, nombres, hoy)):
+            conn.executemany("INSERT OR REPLACE INTO rentas (id_renta, cliente, contacto, equipos, fecha_inicio, "
+                             "fecha_fin, subtotal, precio) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             [renta for renta, _ in chunk])
+            lineas = [linea for _, renta_lineas in chunk for linea in renta_lineas]
+            conn.executemany("INSERT OR REPLACE INTO renta_equipos (id_renta, id_equipo, precio) VALUES (?, ?, ?)",
+                             lineas)
+            hoy_iso = hoy.isoformat()
+            activos.update(id_equipo for renta, renta_lineas in chunk if renta[4] <= hoy_iso < renta[5]
+                           for _, id_equipo, _ in renta_lineas)
+        # Los equipos de rentas en curso quedan como rentados, igual que en la aplicación
+        conn.executemany("UPDATE equipos SET estado = 'rentado' WHERE id_equipo = ?", [(e,) for e in activos])
+
+        # bcrypt es lento a propósito: todos los usuarios comparten un hash ('secreto')
+        hashed = bcrypt.hashpw(b"secreto", bcrypt.gensalt()).decode("utf-8")
+        admin = bcrypt.hashpw(b"12345", bcrypt.gensalt()).decode("utf-8")
+        conn.execute("INSERT OR REPLACE INTO usuarios (usuario, password) VALUES ('admin', ?)", (admin,))
+        for chunk in _chunks((f"user{i:06d}", hashed) for i in range(1, usuarios)):
+            conn.executemany("INSERT OR REPLACE INTO usuarios (usuario, password) VALUES (?, ?)", chunk)
+
+        for prefix, total in (("ME", equipos), ("MC", clientes), ("RE-", rentas)):
+            conn.execute("UPDATE secuencias SET valor = MAX(valor, ?) WHERE prefijo = ?", (total, prefix))
+        database.touch(db_path, *database.SCHEMA)
+
+    with database.connection(db_path) as conn:
+        conn.execute("ANALYZE")
+        filas = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in database.SCHEMA}
+    return {"filas": filas, "segundos": round(time.perf_counter() - start, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("db_path")
+    parser.add_argument("--equipos", type=int, default=1000)
+    parser.add_argument("--clientes", type=int, default=1000)
+    parser.add_argument("--rentas", type=int, default=1000)
+    parser.add_argument("--usuarios", type=int, default=10)
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args()
+    resultado = generate(args.db_path, args.equipos, args.clientes, args.rentas, args.usuarios, args.semilla)
+    print(f"filas: {resultado['filas']}  en {resultado['segundos']:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Repositorio en memoria que sustituye a PyGithub en los benchmarks.
+
+Implementa las llamadas que usan ``download_db_from_github`` y
+``upload_db_to_github`` (vía ``sync`` y ``snapshots``) y puede simular la
+latencia por llamada y el ancho de banda de la API de GitHub. Cuenta las
+llamadas y los bytes transferidos para comparar estrategias de sincronización.
+"""
+import threading
+import time
+
+from sync import LocalRepo
+
+
+class FakeRepo:
+    """Archivos en un diccionario con latencia y ancho de banda simulados"""
+
+    def __init__(self, latency=0.0, bandwidth=None):
+        self.latency = latency
+        self.bandwidth = bandwidth  # bytes por segundo; None = sin límite
+        self.files = {}
+        self.calls = {"get_contents": 0, "create_file": 0, "update_file": 0, "delete_file": 0}
+        self.bytes_up = 0
+        self.bytes_down = 0
+        self._lock = threading.Lock()
+
+    def _wait(self, size=0):
+        delay = self.latency + (size / self.bandwidth if self.bandwidth else 0)
+        if delay:
+            time.sleep(delay)
+
+    def get_contents(self, path):
+        with self._lock:
+            self.calls["get_contents"] += 1
+            content = self.files.get(path)
+        if content is None:
+            self._wait()
+            raise FileNotFoundError(f"{path} no existe en el repositorio")
+        with self._lock:
+            self.bytes_down += len(content)
+        self._wait(len(content))
+        return LocalRepo._Contents(path, content)
+
+    def create_file(self, path, message, content):
+        self._wait(len(content))
+        with self._lock:
+            self.calls["create_file"] += 1
+            if path in self.files:
+                raise RuntimeError(f"{path} ya existe")
+            self.files[path] = bytes(content)
+            self.bytes_up += len(content)
+
+    def update_file(self, path, message, content, sha):
+        self._wait(len(content))
+        with self._lock:
+            self.calls["update_file"] += 1
+            current = self.files.get(path)
+            if current is None or LocalRepo._Contents(path, current).sha != sha:
+                raise RuntimeError(f"SHA desactualizado para {path}")
+            self.files[path] = bytes(content)
+            self.bytes_up += len(content)
+
+    def delete_file(self, path, message, sha):
+        self._wait()
+        with self._lock:
+            self.calls["delete_file"] += 1
+            current = self.files.get(path)
+            if current is None or LocalRepo._Contents(path, current).sha != sha:
+                raise RuntimeError(f"SHA desactualizado para {path}")
+            del self.files[path]
+
+    def stats(self):
+        with self._lock:
+            return {"calls": dict(self.calls), "bytes_up": self.bytes_up, "bytes_down": self.bytes_down,
+                    "files": len(self.files), "stored_bytes": sum(map(len, self.files.values()))}
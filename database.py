@@ -0,0 +1,724 @@
+"""Capa de acceso a datos de MarTech Rent sobre SQLite.
+
+Las escrituras se hacen fila por fila con sentencias parametrizadas dentro de
+una sola transacción, de modo que el costo depende del tamaño del cambio y no
+del tamaño de la tabla, y el esquema (llaves primarias) se conserva.
+
+Las conexiones se reutilizan desde un pool por proceso en modo WAL, para que
+los lectores no se bloqueen detrás del escritor.
+
+Las lecturas de tablas completas se guardan en una caché por proceso con un
+número de versión por tabla; cada escritura de la capa de datos incrementa la
+versión al confirmar, de modo que los reruns sin cambios no tocan la base.
+
+Los DataFrames en caché se comparten entre sesiones en formato compacto
+(categorías para columnas con pocos valores, arreglos de Arrow para
+identificadores y fechas) y pandas trabaja en modo copy-on-write: lo que una
+sesión derive de ellos se copia solo al modificarse, sin tocar la versión
+compartida. Una escritura no los modifica, los reemplaza en la caché.
+"""
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pandas as pd
+
+import tracing
+
+# Los DataFrames compartidos nunca se modifican a través de lo que se derive de ellos
+pd.set_option("mode.copy_on_write", True)
+
+# Llave primaria y columnas de cada tabla administrada por la aplicación
+SCHEMA = {
+    "equipos": ("id_equipo", ["id_equipo", "marca", "modelo", "caracteristicas", "estado", "precio_base", "version"]),
+    "clientes": ("id_cliente", ["id_cliente", "nombre", "contacto", "correo", "version"]),
+    "rentas": ("id_renta", ["id_renta", "cliente", "contacto", "equipos", "fecha_inicio", "fecha_fin", "subtotal", "precio",
+                            "version"]),
+    "usuarios": ("usuario", ["usuario", "password", "sesion_version"]),
+    # Líneas de equipo de cada renta; las operaciones por llave afectan todas las líneas de la renta
+    "renta_equipos": ("id_renta", ["id_renta", "id_equipo", "precio"]),
+}
+
+# Tablas con columna `version` para control de concurrencia optimista
+VERSIONED = {"equipos", "clientes", "rentas"}
+
+# Columnas de los resultados en caché que se guardan como categorías o como texto de Arrow
+CATEGORY_COLUMNS = {"estado", "marca"}
+COMPACT_TEXT_COLUMNS = {"id_equipo", "id_cliente", "id_renta", "fecha_inicio", "fecha_fin"}
+
+# Columnas indexadas en `<tabla>_fts` (FTS5, migración 8) con su peso en el orden por relevancia
+SEARCH_COLUMNS = {
+    "equipos": {"marca": 10.0, "modelo": 10.0, "caracteristicas": 1.0},
+    "clientes": {"nombre": 10.0, "correo": 5.0, "contacto": 5.0},
+}
+
+Operation = namedtuple("Operation", ["kind", "table", "key", "values", "expected_version"], defaults=[None])
+
+
+class ConflictError(Exception):
+    """Otro usuario modificó o eliminó la fila desde que se leyó"""
+
+    def __init__(self, message, table=None, key=None):
+        super().__init__(message)
+        self.table = table
+        self.key = key
+
+
+def insert(table, values):
+    """Operación para insertar una fila nueva"""
+    return Operation("insert", table, None, dict(values))
+
+
+def update(table, key, values, expected_version=None):
+    """Operación para actualizar columnas de la fila con llave `key`.
+
+    Con `expected_version` la actualización solo se aplica si la fila sigue
+    en esa versión (compare-and-swap); si no, se lanza ConflictError.
+    """
+    return Operation("update", table, key, dict(values), _version(expected_version))
+
+
+def delete(table, key, expected_version=None):
+    """Operación para eliminar la fila con llave `key` (con `expected_version`, solo si no cambió)"""
+    return Operation("delete", table, key, None, _version(expected_version))
+
+
+def _version(value):
+    # Las versiones leídas con pandas llegan como numpy.int64
+    return None if value is None else int(value)
+
+
+def _columns(table, names):
+    """Validar tabla y columnas contra el esquema conocido (evita inyección SQL)"""
+    if table not in SCHEMA:
+        raise ValueError(f"Tabla desconocida: {table}")
+    pk, columns = SCHEMA[table]
+    unknown = [name for name in names if name not in columns]
+    if unknown:
+        raise ValueError(f"Columnas desconocidas en {table}: {', '.join(unknown)}")
+    return pk
+
+
+# Pragmas aplicados a cada conexión nueva
+PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -16000,  # 16 MB
+    "mmap_size": 128 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+def is_busy_error(error):
+    """Indica si el error es un bloqueo temporal de SQLite"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+class ConnectionPool:
+    """Pool de conexiones SQLite reutilizables para una base de datos.
+
+    Una conexión prestada a un hilo se reutiliza en llamadas anidadas del
+    mismo hilo; al terminar regresa al pool para el siguiente hilo.
+    """
+
+    def __init__(self, db_path, timeout=30, max_idle=8, retries=6, backoff=0.05):
+        self.db_path = db_path
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.retries = retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._idle = []
+        self._local = threading.local()
+        self._stats = {"created": 0, "reused": 0, "closed": 0, "in_use": 0, "busy_retries": 0}
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
+        self.retry_busy(lambda: conn.execute("PRAGMA journal_mode = WAL"))
+        for name, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Prestar una conexión al hilo actual"""
+        current = getattr(self._local, "conn", None)
+        if current is not None:
+            yield current
+            return
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            self._stats["reused" if conn is not None else "created"] += 1
+            self._stats["in_use"] += 1
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._lock:
+                    self._stats["in_use"] -= 1
+                raise
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                self._stats["in_use"] -= 1
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(conn)
+                    conn = None
+                else:
+                    self._stats["closed"] += 1
+            if conn is not None:
+                conn.close()
+
+    def retry_busy(self, fn):
+        """Ejecutar `fn` reintentando con espera exponencial si la base está ocupada"""
+        for attempt in range(self.retries):
+            try:
+                return fn()
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e) or attempt == self.retries - 1:
+                    raise
+                with self._lock:
+                    self._stats["busy_retries"] += 1
+                time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+    def stats(self):
+        """Estadísticas del pool"""
+        with self._lock:
+            return dict(self._stats, idle=len(self._idle))
+
+    def close_all(self):
+        """Cerrar las conexiones inactivas"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._stats["closed"] += len(idle)
+        for conn in idle:
+            conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path):
+    """Pool de conexiones compartido por el proceso para `db_path`"""
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = ConnectionPool(db_path)
+        return pool
+
+
+def pool_stats(db_path):
+    """Estadísticas del pool de `db_path`"""
+    return get_pool(db_path).stats()
+
+
+@contextmanager
+def connection(db_path):
+    """Conexión del pool para lecturas o para el hilo actual"""
+    with get_pool(db_path).connection() as conn:
+        yield conn
+
+
+@contextmanager
+def transaction(db_path):
+    """Ejecutar un bloque dentro de una transacción de escritura"""
+    pool = get_pool(db_path)
+    with pool.connection() as conn:
+        if conn.in_transaction:
+            # Transacción anidada en el mismo hilo: la confirma la externa
+            yield conn
+            return
+        pool.retry_busy(lambda: conn.execute("BEGIN IMMEDIATE"))
+        pool._local.touched = set()
+        try:
+            yield conn
+            versions = _record_versions(conn, pool._local.touched)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            touched, pool._local.touched = pool._local.touched, None
+        # La versión se incrementa después de confirmar para que ninguna
+        # lectura guarde en caché datos sin confirmar con la versión nueva
+        cache = get_cache(db_path)
+        cache.seen(versions)
+        cache.bump(touched)
+
+
+# Cada cuánto se revisa si otro proceso (la API o la línea de comandos) escribió en la base
+EXTERNAL_CHECK_SECONDS = 1.0
+
+
+def _record_versions(conn, tables):
+    """Incrementar en la base la versión de las tablas modificadas, para los demás procesos"""
+    versions = {}
+    try:
+        for table in sorted(tables):
+            versions[table] = conn.execute("""
+                INSERT INTO versiones_tablas (tabla, version) VALUES (?, 1)
+                ON CONFLICT (tabla) DO UPDATE SET version = version + 1
+                RETURNING version
+            """, (table,)).fetchone()[0]
+    except sqlite3.OperationalError as e:
+        # Base todavía sin la migración 9
+        if "no such table" not in str(e):
+            raise
+    return versions
+
+
+def check_external(db_path):
+    """Invalidar la caché si otro proceso escribió desde la última revisión (a lo más una vez por intervalo)"""
+    cache = get_cache(db_path)
+    now = time.monotonic()
+    if now - cache.checked < EXTERNAL_CHECK_SECONDS:
+        return
+    cache.checked = now
+    try:
+        with connection(db_path) as conn:
+            rows = conn.execute("SELECT tabla, version FROM versiones_tablas").fetchall()
+    except sqlite3.OperationalError:
+        return
+    cache.sync_external(dict(rows))
+
+
+def touch(db_path, *tables):
+    """Marcar tablas modificadas; la caché se invalida al confirmar la transacción"""
+    touched = getattr(get_pool(db_path)._local, "touched", None)
+    if touched is not None:
+        touched.update(tables)
+    else:
+        get_cache(db_path).bump(tables)
+
+
+class TableCache:
+    """Caché LRU de consultas, compartida por todas las sesiones.
+
+    Cada entrada se identifica por las tablas que consulta y un nombre, y
+    guarda las versiones de esas tablas con las que se leyó; una escritura
+    incrementa la versión y la entrada deja de ser válida. Los DataFrames se
+    comparten entre sesiones y deben tratarse como solo lectura.
+    """
+
+    def __init__(self, max_entries=32, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+        # Versiones de `versiones_tablas` ya vistas y momento de la última revisión
+        self._external = {}
+        self.checked = 0.0
+
+    def sync_external(self, versions):
+        """Invalidar las tablas cuya versión en la base cambió sin pasar por este proceso"""
+        with self._lock:
+            stale = [table for table, version in versions.items() if self._external.get(table) != version]
+            self._external.update(versions)
+        if stale:
+            self.bump(stale)
+
+    def seen(self, versions):
+        """Registrar las versiones escritas por este proceso para no invalidarlas de nuevo"""
+        with self._lock:
+            self._external.update(versions)
+
+    def version(self, tables):
+        with self._lock:
+            return tuple(self._versions.get(table, 0) for table in tables)
+
+    def bump(self, tables):
+        """Incrementar la versión de las tablas y descartar sus entradas"""
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+                for key in [key for key in self._entries if table in key[0]]:
+                    self._evict(key)
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key, version, df):
+        nbytes = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            if tuple(self._versions.get(table, 0) for table in key[0]) != version or nbytes > self.max_bytes:
+                return
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = (version, df, nbytes)
+            self._bytes += nbytes
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def _evict(self, key):
+        self._bytes -= self._entries.pop(key)[2]
+
+    def stats(self):
+        """Estadísticas de la caché"""
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes)
+
+
+_caches = {}
+
+
+def get_cache(db_path):
+    """Caché de tablas compartida por el proceso para `db_path`"""
+    with _pools_lock:
+        cache = _caches.get(db_path)
+        if cache is None:
+            cache = _caches[db_path] = TableCache()
+        return cache
+
+
+def execute_operation(conn, op):
+    """Ejecutar una operación de fila sobre una conexión abierta"""
+    if op.kind == "insert":
+        _columns(op.table, op.values)
+        names = list(op.values)
+        placeholders = ", ".join("?" for _ in names)
+        sql = f"INSERT INTO {op.table} ({', '.join(names)}) VALUES ({placeholders})"
+        return conn.execute(sql, [op.values[name] for name in names]).rowcount
+    if op.kind == "update":
+        pk = _columns(op.table, op.values)
+        names = list(op.values)
+        assignments = [f"{name} = ?" for name in names]
+        params = [op.values[name] for name in names]
+        if op.table in VERSIONED:
+            assignments.append("version = version + 1")
+        sql = f"UPDATE {op.table} SET {', '.join(assignments)} WHERE {pk} = ?"
+        return _checked(conn, op, sql, params + [op.key], "modificó")
+    if op.kind == "delete":
+        pk = _columns(op.table, [])
+        return _checked(conn, op, f"DELETE FROM {op.table} WHERE {pk} = ?", [op.key], "eliminó")
+    raise ValueError(f"Operación desconocida: {op.kind}")
+
+
+def _checked(conn, op, sql, params, action):
+    """Ejecutar un UPDATE/DELETE comparando la versión esperada de la fila"""
+    if op.expected_version is None:
+        return conn.execute(sql, params).rowcount
+    if op.table not in VERSIONED:
+        raise ValueError(f"La tabla {op.table} no tiene control de versiones")
+    rowcount = conn.execute(sql + " AND version = ?", params + [op.expected_version]).rowcount
+    if rowcount == 0:
+        raise ConflictError(f"Otro usuario {action} {op.key} en {op.table} mientras lo editabas",
+                            op.table, op.key)
+    return rowcount
+
+
+class NextId:
+    """Identificador que se asigna de la secuencia `prefix` dentro de la transacción.
+
+    Puede usarse como valor en varias operaciones del mismo lote (por ejemplo
+    la renta y sus líneas de equipo); todas reciben el mismo identificador.
+    Después de aplicar el lote, `value` contiene el identificador asignado.
+    """
+
+    def __init__(self, prefix, width=4):
+        self.prefix = prefix
+        self.width = width
+        self.value = None
+
+    def format(self, number):
+        return f"{self.prefix}{number:0{self.width}d}"
+
+
+def next_id(conn, prefix, count=1):
+    """Incrementar de forma atómica el contador de `prefix` y regresar el nuevo valor.
+
+    Con `count` > 1 se reserva un bloque consecutivo que termina en el valor regresado.
+    """
+    conn.execute("INSERT OR IGNORE INTO secuencias (prefijo, valor) VALUES (?, 0)", (prefix,))
+    conn.execute("UPDATE secuencias SET valor = valor + ? WHERE prefijo = ?", (int(count), prefix))
+    return conn.execute("SELECT valor FROM secuencias WHERE prefijo = ?", (prefix,)).fetchone()[0]
+
+
+def peek_id(db_path, prefix, width=4):
+    """Próximo identificador de `prefix` sin reservarlo (sin recorrer la tabla)"""
+    with connection(db_path) as conn:
+        row = conn.execute("SELECT valor FROM secuencias WHERE prefijo = ?", (prefix,)).fetchone()
+    return NextId(prefix, width).format((row[0] if row else 0) + 1)
+
+
+def _resolve_ids(conn, op, assigned):
+    """Sustituir los NextId de una operación por identificadores asignados"""
+    def resolve(value):
+        if not isinstance(value, NextId):
+            return value
+        if id(value) not in assigned:
+            value.value = value.format(next_id(conn, value.prefix))
+            assigned[id(value)] = value.value
+        return assigned[id(value)]
+
+    values = {name: resolve(value) for name, value in op.values.items()} if op.values else op.values
+    return op._replace(key=resolve(op.key), values=values)
+
+
+def apply_operations(db_path, operations, guard=None):
+    """Aplicar una lista de operaciones en una sola transacción.
+
+    `guard(conn)` se ejecuta dentro de la transacción antes de las
+    operaciones; si lanza una excepción no se aplica ningún cambio.
+    """
+    # El span incluye el COMMIT, que ocurre al salir de la transacción
+    with tracing.span("db.apply_operations") as span, transaction(db_path) as conn:
+        if guard is not None:
+            guard(conn)
+        touch(db_path, *{op.table for op in operations})
+        assigned = {}
+        operations = [_resolve_ids(conn, op, assigned) for op in operations]
+        changed = sum(execute_operation(conn, op) for op in operations)
+        if span:
+            span.set(rows=changed, tables=",".join(sorted({op.table for op in operations})))
+        return changed
+
+
+def compact(df):
+    """Convertir las columnas conocidas a tipos compactos (categorías y texto de Arrow)"""
+    dtypes = {column: "category" if column in CATEGORY_COLUMNS else "string[pyarrow]" for column in df.columns
+              if (column in CATEGORY_COLUMNS or column in COMPACT_TEXT_COLUMNS) and df[column].dtype == object}
+    return df.astype(dtypes) if dtypes else df
+
+
+def query(db_path, tables, name, sql, params=(), cached=True, span_name="db.query"):
+    """Ejecutar una consulta de lectura como DataFrame, con caché por versión de `tables`"""
+    with tracing.span(span_name, tables=",".join(tables)) as span:
+        cache = get_cache(db_path)
+        key = (tuple(tables), name)
+        # Dentro de una transacción se lee directo para ver los cambios propios
+        cached = cached and getattr(get_pool(db_path)._local, "touched", None) is None
+        if cached:
+            check_external(db_path)
+        version = cache.version(key[0])
+        if cached:
+            df = cache.get(key, version)
+            if df is not None:
+                if span:
+                    span.set(cache="hit", rows=len(df))
+                return df
+        pool = get_pool(db_path)
+        with pool.connection() as conn:
+            df = compact(pool.retry_busy(lambda: pd.read_sql_query(sql, conn, params=params)))
+        if cached:
+            cache.put(key, version, df)
+        if span:
+            span.set(cache="miss", rows=len(df), bytes=int(df.memory_usage(index=False).sum()))
+        return df
+
+
+def read_table(db_path, table_name, cached=True):
+    """Leer una tabla completa como DataFrame (de la caché si no ha cambiado)"""
+    _columns(table_name, [])
+    return query(db_path, [table_name], "*", f"SELECT * FROM {table_name}", cached=cached,
+                 span_name="db.read_table")
+
+
+def migrate_renta_equipos(conn):
+    """Copiar a renta_equipos los equipos guardados como JSON en rentas.equipos"""
+    return conn.execute("""
+        INSERT OR IGNORE INTO renta_equipos (id_renta, id_equipo, precio)
+        SELECT r.id_renta, j.value, NULL
+        FROM rentas r, json_each(r.equipos) j
+        WHERE json_valid(r.equipos)
+          AND NOT EXISTS (SELECT 1 FROM renta_equipos re WHERE re.id_renta = r.id_renta)
+    """).rowcount
+
+
+def renta_equipos_operations(id_renta, precios_equipos):
+    """Operaciones para guardar las líneas de equipo (con su precio) de una renta"""
+    return [insert("renta_equipos", {"id_renta": id_renta, "id_equipo": id_equipo, "precio": precio})
+            for id_equipo, precio in precios_equipos.items()]
+
+
+def equipos_de_renta(db_path, id_renta):
+    """Identificadores de los equipos de una renta"""
+    with connection(db_path) as conn:
+        rows = conn.execute("SELECT id_equipo FROM renta_equipos WHERE id_renta = ? ORDER BY rowid",
+                            (id_renta,)).fetchall()
+    return [row[0] for row in rows]
+
+
+def active_rentals(db_path, hoy):
+    """Rentas ya iniciadas con al menos un equipo en estado rentado (sin las reservas futuras)"""
+    hoy = iso_day(hoy)
+    return query(db_path, ["rentas", "renta_equipos", "equipos"], ("activas", hoy), """
+        SELECT DISTINCT r.*
+        FROM equipos e
+        JOIN renta_equipos re ON re.id_equipo = e.id_equipo
+        JOIN rentas r ON r.id_renta = re.id_renta
+        WHERE e.estado = 'rentado' AND r.fecha_inicio <= ?
+        ORDER BY r.id_renta
+    """, (hoy,), span_name="db.active_rentals")
+
+
+def iso_day(value):
+    """Normalizar una fecha (date, datetime o texto ISO) a 'YYYY-MM-DD'"""
+    if hasattr(value, "isoformat"):
+        value = value.isoformat()
+    return str(value)[:10]
+
+
+# fecha_fin se guarda como 'YYYY-MM-DD' (migración 6), así que los rangos usan el índice
+_EXPIRY_COLUMNS = """id_renta, cliente, contacto, equipos, fecha_inicio, fecha_fin,
+    CAST(julianday(fecha_fin) - julianday(?) AS INTEGER) AS dias_restantes"""
+
+
+def expiring_rentals(db_path, hoy, horizon_days, limit=250):
+    """Rentas que vencen entre hoy y hoy + `horizon_days` días, las más próximas primero"""
+    hoy = iso_day(hoy)
+    limite = (date.fromisoformat(hoy) + timedelta(days=int(horizon_days))).isoformat()
+    return query(db_path, ["rentas"], ("por_vencer", hoy, limite, limit), f"""
+        SELECT {_EXPIRY_COLUMNS} FROM rentas
+        WHERE fecha_fin >= ? AND fecha_fin <= ?
+        ORDER BY fecha_fin, id_renta LIMIT ?
+    """, (hoy, hoy, limite, int(limit)), span_name="db.expiring_rentals")
+
+
+def overdue_rentals(db_path, hoy, limit=250):
+    """Rentas cuya fecha de fin ya pasó y no se han finalizado, las más atrasadas primero"""
+    hoy = iso_day(hoy)
+    return query(db_path, ["rentas"], ("vencidas", hoy, limit), f"""
+        SELECT {_EXPIRY_COLUMNS} FROM rentas
+        WHERE fecha_fin < ?
+        ORDER BY fecha_fin, id_renta LIMIT ?
+    """, (hoy, hoy, int(limit)), span_name="db.overdue_rentals")
+
+
+def expiry_summary(db_path, hoy, horizon_days):
+    """Conteos para el panel de inicio con consultas de rango sobre los índices de fechas"""
+    hoy = iso_day(hoy)
+    limite = (date.fromisoformat(hoy) + timedelta(days=int(horizon_days))).isoformat()
+    df = query(db_path, ["rentas"], ("resumen_vencimientos", hoy, limite), """
+        SELECT (SELECT COUNT(*) FROM rentas WHERE fecha_fin < :hoy) AS vencidas,
+               (SELECT COUNT(*) FROM rentas WHERE fecha_fin >= :hoy AND fecha_fin <= :limite) AS por_vencer,
+               (SELECT COUNT(*) FROM rentas WHERE fecha_fin >= :hoy) AS vigentes,
+               (SELECT COUNT(*) FROM rentas WHERE fecha_inicio > :hoy) AS reservas
+    """, {"hoy": hoy, "limite": limite}, span_name="db.expiry_summary")
+    row = {name: int(value) for name, value in df.iloc[0].items()}
+    # Las reservas futuras también terminan después de hoy; se descuentan de las vigentes
+    return {"en_curso": row["vigentes"] - row["reservas"], "por_vencer": row["por_vencer"],
+            "vencidas": row["vencidas"], "reservas": row["reservas"]}
+
+
+FILTER_OPERATORS = {"=": "= ?", "!=": "!= ?", "like": "LIKE ?", ">=": ">= ?", "<=": "<= ?", "<": "< ?", ">": "> ?"}
+
+# ("id_equipo", "libre", (inicio, fin)): equipos sin renta que se traslape con [inicio, fin).
+# La subconsulta no depende de la fila, así que SQLite la evalúa una sola vez; el `+` hace que
+# recorra el índice de fecha_fin (las rentas que siguen vigentes) y no todas las ya iniciadas
+_FREE_BETWEEN = """{column} NOT IN (
+    SELECT re.id_equipo FROM rentas r JOIN renta_equipos re ON re.id_renta = r.id_renta
+    WHERE r.fecha_fin > ? AND +r.fecha_inicio < ?)"""
+
+
+def _where(table, filters):
+    """Cláusula WHERE parametrizada a partir de filtros (columna, operador, valor)"""
+    _columns(table, [column for column, _, _ in filters])
+    clauses, params = [], []
+    for column, operator, value in filters:
+        if operator == "libre":
+            inicio, fin = value
+            clauses.append(_FREE_BETWEEN.format(column=f"{table}.{column}"))
+            params.extend([iso_day(inicio), iso_day(fin)])
+            continue
+        if operator not in FILTER_OPERATORS:
+            raise ValueError(f"Operador de filtro desconocido: {operator}")
+        clauses.append(f"{column} {FILTER_OPERATORS[operator]}")
+        params.append(value)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def _filter_tables(table, filters):
+    """Tablas de las que depende el resultado (para la caché)"""
+    if any(operator == "libre" for _, operator, _ in filters):
+        return [table, "rentas", "renta_equipos"]
+    return [table]
+
+
+def count_rows(db_path, table, filters=()):
+    """Número de filas de `table` que cumplen los filtros"""
+    where, params = _where(table, filters)
+    df = query(db_path, _filter_tables(table, filters), ("count", tuple(filters)), f"SELECT COUNT(*) AS n FROM {table}{where}", params,
+               span_name="db.count_rows")
+    return int(df.n.iloc[0])
+
+
+def read_page(db_path, table, filters=(), order_by=None, descending=False, limit=50, offset=0):
+    """Leer una página de `table` con filtros y orden resueltos en SQLite"""
+    pk = _columns(table, [order_by] if order_by else [])
+    where, params = _where(table, filters)
+    direction = "DESC" if descending else "ASC"
+    order = f"{order_by} {direction}, {pk} {direction}" if order_by and order_by != pk else f"{pk} {direction}"
+    sql = f"SELECT * FROM {table}{where} ORDER BY {order} LIMIT ? OFFSET ?"
+    name = ("page", tuple(filters), order_by, descending, limit, offset)
+    return query(db_path, _filter_tables(table, filters), name, sql, params + [int(limit), int(offset)],
+                 span_name="db.read_page")
+
+
+def match_expression(text):
+    """Expresión MATCH de FTS5 que busca cada palabra de `text` como prefijo ('' si no hay palabras)"""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", str(text).lower()))
+
+
+def read_rows(db_path, table, keys, filters=()):
+    """Filas de `table` con las llaves dadas que cumplen los filtros"""
+    pk = _columns(table, [])
+    keys = tuple(keys)
+    if not keys:
+        return query(db_path, [table], ("rows", keys), f"SELECT * FROM {table} LIMIT 0")
+    where, params = _where(table, filters)
+    where = f"{where} AND" if where else " WHERE"
+    return query(db_path, _filter_tables(table, filters), ("rows", keys, tuple(filters)),
+                 f"SELECT * FROM {table}{where} {pk} IN ({', '.join('?' * len(keys))})", params + list(keys),
+                 span_name="db.read_rows")
+
+
+def search(db_path, table, text, filters=(), limit=20, order_by=None):
+    """Filas de `table` que coinciden con `text`, las más relevantes primero.
+
+    Sin palabras que buscar regresa las primeras `limit` filas según
+    `order_by`, así que los selectores nunca cargan la tabla completa.
+    """
+    weights = SEARCH_COLUMNS[table]
+    match = match_expression(text)
+    if not match:
+        return read_page(db_path, table, filters, order_by, limit=limit)
+    where, params = _where(table, filters)
+    fts = f"{table}_fts"
+    # La relevancia se calcula en la subconsulta, donde se resuelve el MATCH; los filtros van afuera
+    sql = f"""
+        SELECT * FROM (
+            SELECT t.*, bm25({fts}, {", ".join(str(w) for w in weights.values())}) AS _relevancia
+            FROM {fts} JOIN {table} t ON t.rowid = {fts}.rowid
+            WHERE {fts} MATCH ?
+        ) AS {table}{where}
+        ORDER BY _relevancia LIMIT ?
+    """
+    name = ("search", match, tuple(filters), limit)
+    df = query(db_path, _filter_tables(table, filters), name, sql, [match] + params + [int(limit)],
+               span_name="db.search")
+    return df.drop(columns="_relevancia")
+
@@ -0,0 +1,172 @@
+"""Exportación de rentas, equipos y clientes a CSV o Parquet.
+
+Los resultados se leen de SQLite con ``fetchmany`` en bloques de tamaño fijo
+a través de un generador y cada bloque se escribe de inmediato, así que la
+memoria máxima depende del tamaño del bloque y no del de la tabla. Al
+exportar rentas, la columna JSON ``equipos`` se expande a una fila por
+equipo (con su precio de ``renta_equipos``); las rentas finalizadas se leen
+de las particiones del historial (``archive``) que pueden caer en el rango.
+
+Uso: ``python -m exporter {rentas,equipos,clientes} salida.csv|salida.parquet [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD] [--cliente NOMBRE]``
+"""
+import argparse
+import csv
+
+import pandas as pd
+
+import archive
+import database
+import tracing
+
+CHUNK_SIZE = 5000
+FORMATS = ["csv", "parquet"]
+_SQL_TYPES = {"TEXT": "string", "REAL": "float64", "INTEGER": "Int64"}
+
+# Las rentas se exportan con una fila por equipo; una renta sin equipos conserva una fila
+_RENTAS_SQL = """
+    SELECT r.id_renta, r.cliente, r.contacto, r.fecha_inicio, r.fecha_fin, r.subtotal, r.precio,
+           j.value AS id_equipo, re.precio AS precio_equipo, j.key AS orden
+    FROM {rentas} r
+    LEFT JOIN json_each(CASE WHEN json_valid(r.equipos) THEN r.equipos ELSE '[]' END) j
+    LEFT JOIN {renta_equipos} re ON re.id_renta = r.id_renta AND re.id_equipo = j.value
+"""
+_RENTAS_COLUMNS = "id_renta, cliente, contacto, fecha_inicio, fecha_fin, subtotal, precio, id_equipo, precio_equipo"
+
+
+def _years(db_path, hasta=None):
+    """Años de las particiones del historial con rentas que pueden traslaparse con el rango"""
+    return [year for year, _ in archive.partitions(db_path) if not hasta or year <= int(str(hasta)[:4])]
+
+
+def _query(table, desde=None, hasta=None, cliente=None, years=()):
+    """SQL y parámetros para exportar `table` con los filtros dados (y las particiones de `years`)"""
+    if table not in ("rentas", "equipos", "clientes"):
+        raise ValueError(f"Solo se pueden exportar rentas, equipos o clientes, no {table}")
+    if table != "rentas" and (desde or hasta):
+        raise ValueError("El filtro por fechas solo aplica a rentas")
+    if table == "equipos" and cliente:
+        raise ValueError("El filtro por cliente solo aplica a rentas y clientes")
+
+    clauses, params = [], []
+    if table == "rentas":
+        # Rentas cuyo periodo se traslapa con [desde, hasta]
+        if desde:
+            clauses.append("substr(r.fecha_fin, 1, 10) >= ?")
+            params.append(str(desde)[:10])
+        if hasta:
+            clauses.append("substr(r.fecha_inicio, 1, 10) <= ?")
+            params.append(str(hasta)[:10])
+        if cliente:
+            clauses.append("r.cliente = ?")
+            params.append(cliente)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        # Las activas y cada partición adjunta en un solo resultado ordenado; una renta
+        # que sigue activa tras una finalización interrumpida sale solo de main
+        selects = [_RENTAS_SQL.format(rentas="main.rentas", renta_equipos="main.renta_equipos") + where]
+        for year in years:
+            schema = archive.alias(year)
+            selects.append(_RENTAS_SQL.format(rentas=f"{schema}.rentas_historico",
+                                              renta_equipos=f"{schema}.renta_equipos_historico")
+                           + (where + " AND" if where else " WHERE")
+                           + " r.id_renta NOT IN (SELECT id_renta FROM main.rentas)")
+        return (f"SELECT {_RENTAS_COLUMNS} FROM ({' UNION ALL '.join(selects)}) ORDER BY id_renta, orden",
+                params * len(selects))
+
+    pk, columns = database.SCHEMA[table]
+    sql = f"SELECT {', '.join(c for c in columns if c != 'version')} FROM {table}"
+    if cliente:
+        clauses.append("nombre = ?")
+        params.append(cliente)
+    order = f" ORDER BY {pk}"
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return sql + where + order, params
+
+
+def _dtypes(conn, table, columns):
+    """Tipos fijos por columna para que todos los bloques tengan el mismo esquema"""
+    declared = {row[1]: row[2].upper() for row in conn.execute(f"PRAGMA table_info({table})")}
+    declared.update(id_equipo="TEXT", precio_equipo="REAL")
+    return {column: _SQL_TYPES.get(declared.get(column), "object") for column in columns}
+
+
+def iter_chunks(db_path, table, desde=None, hasta=None, cliente=None, chunk_size=CHUNK_SIZE):
+    """Generador de DataFrames de hasta `chunk_size` filas con el resultado de la exportación"""
+    years = _years(db_path, hasta) if table == "rentas" else []
+    sql, params = _query(table, desde, hasta, cliente, years)
+    with archive.attached(db_path, *years) as conn:
+        cursor = conn.execute(sql, params)
+        columns = [d[0] for d in cursor.description]
+        dtypes = _dtypes(conn, table, columns)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield pd.DataFrame.from_records(rows, columns=columns).astype(dtypes)
+
+
+def write_csv(chunks, out):
+    """Escribir los bloques en `out` (ruta o archivo de texto); regresa el número de filas"""
+    total = 0
+    f = open(out, "w", encoding="utf-8", newline="") if isinstance(out, str) else out
+    try:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(f, header=i == 0, index=False, quoting=csv.QUOTE_MINIMAL)
+            total += len(chunk)
+    finally:
+        if isinstance(out, str):
+            f.close()
+    return total
+
+
+def write_parquet(chunks, out):
+    """Escribir los bloques como grupos de filas de un Parquet; regresa el número de filas"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    total = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False,
+                                         schema=writer.schema if writer is not None else None)
+            if writer is None:
+                writer = pq.ParquetWriter(out, table.schema)
+            writer.write_table(table)
+            total += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return total
+
+
+def export(db_path, table, out, fmt="csv", desde=None, hasta=None, cliente=None, chunk_size=CHUNK_SIZE):
+    """Exportar `table` a `out` en el formato dado; regresa el número de filas escritas"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato desconocido: {fmt}")
+    with tracing.span("export.file", table=table, format=fmt) as span:
+        chunks = iter_chunks(db_path, table, desde, hasta, cliente, chunk_size)
+        total = write_parquet(chunks, out) if fmt == "parquet" else write_csv(chunks, out)
+        if span:
+            span.set(rows=total)
+        return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("tabla", choices=["rentas", "equipos", "clientes"])
+    parser.add_argument("salida")
+    parser.add_argument("--db", default="rentapp_database.db")
+    parser.add_argument("--formato", choices=FORMATS, help="por defecto según la extensión de la salida")
+    parser.add_argument("--desde", help="rentas que terminan en o después de esta fecha")
+    parser.add_argument("--hasta", help="rentas que empiezan en o antes de esta fecha")
+    parser.add_argument("--cliente", help="nombre exacto del cliente")
+    parser.add_argument("--bloque", type=int, default=CHUNK_SIZE, help="filas por bloque")
+    args = parser.parse_args()
+
+    fmt = args.formato or ("parquet" if args.salida.endswith(".parquet") else "csv")
+    total = export(args.db, args.tabla, args.salida, fmt, args.desde, args.hasta, args.cliente, args.bloque)
+    print(f"{total:,} filas exportadas a {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Importación masiva de equipos y clientes desde CSV o Excel.
+
+El archivo se lee por bloques (``read_csv(chunksize=...)`` u openpyxl en modo
+de solo lectura), cada bloque se valida de forma vectorizada con las mismas
+reglas que los formularios y las filas válidas se insertan con
+``executemany`` en una transacción por bloque. Los identificadores se
+reservan de la secuencia en un solo paso por bloque. Las filas rechazadas se
+regresan en un reporte con su número de fila y el motivo.
+
+La importación no sincroniza por sí misma: quien la llama sube la base una
+sola vez al terminar.
+
+Uso: ``python -m importer {equipos,clientes} archivo.csv [--db ruta] [--bloque N] [--errores errores.csv] [--sync-dir DIR]``
+"""
+import argparse
+import os
+from itertools import islice
+
+import pandas as pd
+
+import database
+import migrations
+import snapshots
+import sync
+import tracing
+from validation import valid_emails, valid_phones
+
+CHUNK_SIZE = 5000
+ESTADOS = ["disponible", "rentado", "mantenimiento"]
+
+# Tabla -> (prefijo del identificador, columnas obligatorias, opcionales con su valor por defecto)
+TABLES = {
+    "equipos": ("ME", ["marca", "modelo", "precio_base"], {"caracteristicas": "", "estado": "disponible"}),
+    "clientes": ("MC", ["nombre", "contacto", "correo"], {}),
+}
+
+
+def _excel_chunks(source, chunk_size):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = ["" if cell is None else str(cell) for cell in next(rows, ())]
+        while True:
+            block = list(islice(rows, chunk_size))
+            if not block:
+                return
+            yield pd.DataFrame(block, columns=header).fillna("").astype(str)
+    finally:
+        workbook.close()
+
+
+def read_chunks(source, chunk_size=CHUNK_SIZE, filename=None):
+    """Bloques de texto de un CSV o Excel (ruta o archivo abierto)"""
+    name = filename or (source if isinstance(source, str) else getattr(source, "name", ""))
+    if name.lower().endswith((".xlsx", ".xlsm")):
+        return _excel_chunks(source, chunk_size)
+    return pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_size)
+
+
+def _normalize(table, chunk):
+    chunk = chunk.rename(columns=lambda c: str(c).strip().lower())
+    _, required, defaults = TABLES[table]
+    missing = [column for column in required if column not in chunk.columns]
+    if missing:
+        raise ValueError(f"Faltan columnas en el archivo: {', '.join(missing)}")
+    chunk = chunk.reset_index(drop=True)
+    for column in required + list(defaults):
+        if column in chunk.columns:
+            chunk[column] = chunk[column].astype(str).str.strip()
+        else:
+            chunk[column] = defaults[column]
+    return chunk
+
+
+def validate_chunk(table, chunk):
+    """Motivos de rechazo por fila ('' si la fila es válida) y columnas convertidas"""
+    errors = pd.Series("", index=chunk.index)
+
+    def reject(mask, message):
+        nonlocal errors
+        errors = errors.where(~mask, errors + message + "; ")
+
+    if table == "equipos":
+        reject((chunk.marca == "") | (chunk.modelo == ""), "Marca y modelo son obligatorios")
+        chunk = chunk.assign(precio_base=pd.to_numeric(chunk.precio_base, errors="coerce"),
+                             estado=chunk.estado.str.lower().replace("", "disponible"))
+        reject(~(chunk.precio_base > 0), "El precio base debe ser mayor a 0")
+        reject(~chunk.estado.isin(ESTADOS), f"Estado inválido (usa {', '.join(ESTADOS)})")
+    else:
+        vacios = (chunk.nombre == "") | (chunk.contacto == "") | (chunk.correo == "")
+        reject(vacios, "Todos los campos son obligatorios")
+        reject(~vacios & ~valid_emails(chunk.correo), "Correo electrónico inválido")
+        reject(~vacios & ~valid_phones(chunk.contacto), "Teléfono inválido (debe tener 10-15 dígitos)")
+    return errors.str.rstrip("; "), chunk
+
+
+def import_file(db_path, table, source, chunk_size=CHUNK_SIZE, filename=None, progress=None):
+    """Importar `source` en `table`; regresa el reporte con insertados, rechazados y errores por fila"""
+    if table not in TABLES:
+        raise ValueError(f"Solo se pueden importar: {', '.join(TABLES)}")
+    prefix, required, defaults = TABLES[table]
+    pk, _ = database.SCHEMA[table]
+    columns = required + list(defaults)
+    sql = (f"INSERT INTO {table} ({pk}, {', '.join(columns)}) "
+           f"VALUES ({', '.join('?' * (len(columns) + 1))})")
+    report = {"tabla": table, "filas": 0, "insertados": 0, "rechazados": 0, "errores": [], "ids": []}
+    formatter = database.NextId(prefix)
+
+    with tracing.span("import.file", table=table) as span:
+        for chunk in read_chunks(source, chunk_size, filename):
+            raw = _normalize(table, chunk)
+            errors, chunk = validate_chunk(table, raw)
+            # Fila del archivo: la 1 es el encabezado
+            first_line = report["filas"] + 2
+            rejected = errors != ""
+            for position in rejected[rejected].index:
+                report["errores"].append({"fila": first_line + position, "error": errors[position],
+                                          **raw.loc[position, columns].to_dict()})
+            valid = chunk[~rejected]
+            if len(valid):
+                with database.transaction(db_path) as conn:
+                    last = database.next_id(conn, prefix, len(valid))
+                    ids = [formatter.format(n) for n in range(last - len(valid) + 1, last + 1)]
+                    conn.executemany(sql, zip(ids, *(valid[column].tolist() for column in columns)))
+                    database.touch(db_path, table)
+                report["ids"].append((ids[0], ids[-1]))
+            report["filas"] += len(chunk)
+            report["insertados"] += len(valid)
+            report["rechazados"] += int(rejected.sum())
+            if progress is not None:
+                progress(report)
+        if span:
+            span.set(rows=report["insertados"], rejected=report["rechazados"])
+    return report
+
+
+def error_report(report):
+    """Errores por fila como DataFrame (para mostrarlos o descargarlos como CSV)"""
+    _, required, defaults = TABLES[report["tabla"]]
+    return pd.DataFrame(report["errores"], columns=["fila", "error"] + required + list(defaults))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("tabla", choices=list(TABLES))
+    parser.add_argument("archivo")
+    parser.add_argument("--db", default="rentapp_database.db")
+    parser.add_argument("--bloque", type=int, default=CHUNK_SIZE, help="filas por bloque y transacción")
+    parser.add_argument("--errores", help="guardar las filas rechazadas en este CSV")
+    parser.add_argument("--sync-dir", help="subir la base a snapshots locales al terminar")
+    parser.add_argument("--repo", default="Yorchemtz24/rentapp",
+                        help="repositorio de GitHub para subir la base si hay GITHUB_TOKEN")
+    args = parser.parse_args()
+
+    migrations.migrate(args.db)
+    report = import_file(args.db, args.tabla, args.archivo, args.bloque,
+                         progress=lambda r: print(f"\r{r['filas']:,} filas leídas", end="", flush=True))
+    print(f"\ninsertados: {report['insertados']:,}  rechazados: {report['rechazados']:,}")
+    if report["ids"]:
+        print(f"identificadores: {report['ids'][0][0]} – {report['ids'][-1][1]}")
+    if args.errores and report["errores"]:
+        error_report(report).to_csv(args.errores, index=False)
+        print(f"errores en {args.errores}")
+
+    # Una sola subida al final, no una por fila o por bloque
+    token = os.environ.get("GITHUB_TOKEN")
+    if report["insertados"] and (token or args.sync_dir):
+        repo = sync.github_repo(token, args.repo) if token else sync.LocalRepo(args.sync_dir)
+        print(f"sincronización: {snapshots.SnapshotStore(repo).push(args.db)}")
+
+
+if __name__ == "__main__":
+    main()
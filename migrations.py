@@ -0,0 +1,206 @@
+"""Migraciones versionadas del esquema.
+
+Cada paso tiene un número de versión y se aplica una sola vez, en orden y en
+su propia transacción; la tabla ``schema_version`` registra los pasos
+aplicados. Los primeros pasos usan ``IF NOT EXISTS`` para adoptar bases
+creadas antes de que existiera el versionado.
+"""
+from datetime import datetime
+
+import database
+import reminders
+import rollups
+
+
+def _esquema_inicial(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS equipos (
+            id_equipo TEXT PRIMARY KEY,
+            marca TEXT,
+            modelo TEXT,
+            caracteristicas TEXT,
+            estado TEXT,
+            precio_base REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS clientes (
+            id_cliente TEXT PRIMARY KEY,
+            nombre TEXT,
+            contacto TEXT,
+            correo TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rentas (
+            id_renta TEXT PRIMARY KEY,
+            cliente TEXT,
+            contacto TEXT,
+            equipos TEXT,
+            fecha_inicio TEXT,
+            fecha_fin TEXT,
+            subtotal REAL,
+            precio REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS usuarios (
+            usuario TEXT PRIMARY KEY,
+            password TEXT
+        )
+    """)
+
+
+def _renta_equipos(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS renta_equipos (
+            id_renta TEXT NOT NULL,
+            id_equipo TEXT NOT NULL,
+            precio REAL,
+            PRIMARY KEY (id_renta, id_equipo)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_renta_equipos_equipo ON renta_equipos (id_equipo)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_equipos_estado ON equipos (estado)")
+    database.migrate_renta_equipos(conn)
+
+
+def _indices_listados(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_clientes_nombre ON clientes (nombre)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rentas_fecha_fin ON rentas (fecha_fin)")
+
+
+# Tabla, columna y prefijo de los identificadores generados
+ID_PREFIXES = [("equipos", "id_equipo", "ME"), ("clientes", "id_cliente", "MC"), ("rentas", "id_renta", "RE-")]
+
+
+def _secuencias(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS secuencias (
+            prefijo TEXT PRIMARY KEY,
+            valor INTEGER NOT NULL
+        )
+    """)
+    # Continuar después del mayor identificador existente para no reutilizar ninguno
+    for table, column, prefix in ID_PREFIXES:
+        conn.execute(f"""
+            INSERT OR REPLACE INTO secuencias (prefijo, valor)
+            SELECT ?, MAX(COALESCE((SELECT valor FROM secuencias WHERE prefijo = ?), 0),
+                          COALESCE(MAX(CAST(substr({column}, ?) AS INTEGER)), 0))
+            FROM {table} WHERE {column} LIKE ? || '%'
+        """, (prefix, prefix, len(prefix) + 1, prefix))
+
+
+def _versiones_de_fila(conn):
+    for table in ("equipos", "clientes", "rentas"):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+def _fechas_normalizadas(conn):
+    # Fechas guardadas con hora (datetime.isoformat) quedan como 'YYYY-MM-DD'
+    conn.execute("""
+        UPDATE rentas SET fecha_inicio = substr(fecha_inicio, 1, 10), fecha_fin = substr(fecha_fin, 1, 10)
+        WHERE length(fecha_inicio) > 10 OR length(fecha_fin) > 10
+    """)
+    # y los triggers mantienen el formato para que las consultas de rango usen los índices
+    for evento in ("INSERT", "UPDATE OF fecha_inicio, fecha_fin"):
+        nombre = "rentas_fechas_" + evento.split()[0].lower()
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {nombre} AFTER {evento} ON rentas
+            WHEN length(NEW.fecha_inicio) > 10 OR length(NEW.fecha_fin) > 10
+            BEGIN
+                UPDATE rentas SET fecha_inicio = substr(NEW.fecha_inicio, 1, 10),
+                                  fecha_fin = substr(NEW.fecha_fin, 1, 10)
+                WHERE id_renta = NEW.id_renta;
+            END
+        """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rentas_fecha_inicio ON rentas (fecha_inicio)")
+
+
+def _busqueda_texto(conn):
+    # Índices FTS5 de contenido externo: guardan solo los términos y leen el texto de la tabla
+    for table, weights in database.SEARCH_COLUMNS.items():
+        fts = f"{table}_fts"
+        columns = ", ".join(weights)
+        old = ", ".join(f"OLD.{column}" for column in weights)
+        new = ", ".join(f"NEW.{column}" for column in weights)
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                {columns}, content='{table}', content_rowid='rowid',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        """)
+        # Cambios que no tocan las columnas buscadas (como el estado de un equipo) no reindexan
+        triggers = {
+            f"{fts}_insert": (f"AFTER INSERT ON {table}",
+                              f"INSERT INTO {fts} (rowid, {columns}) VALUES (NEW.rowid, {new});"),
+            f"{fts}_delete": (f"AFTER DELETE ON {table}",
+                              f"INSERT INTO {fts} ({fts}, rowid, {columns}) VALUES ('delete', OLD.rowid, {old});"),
+            f"{fts}_update": (f"AFTER UPDATE OF {columns} ON {table}",
+                              f"INSERT INTO {fts} ({fts}, rowid, {columns}) VALUES ('delete', OLD.rowid, {old});\n"
+                              f"INSERT INTO {fts} (rowid, {columns}) VALUES (NEW.rowid, {new});"),
+        }
+        for name, (event, body) in triggers.items():
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN\n{body}\nEND")
+        conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+def _versiones_tablas(conn):
+    # Cada transacción incrementa aquí la versión de las tablas que modifica, para que
+    # los demás procesos (la API, la línea de comandos) invaliden sus cachés
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS versiones_tablas (
+            tabla TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+
+
+def _sesiones_revocables(conn):
+    # Contador por usuario incluido en la firma de los tokens; cerrar sesión lo incrementa
+    conn.execute("ALTER TABLE usuarios ADD COLUMN sesion_version INTEGER NOT NULL DEFAULT 0")
+
+
+# (versión, descripción, función) en orden de aplicación
+MIGRATIONS = [
+    (1, "Esquema inicial", _esquema_inicial),
+    (2, "Tabla renta_equipos a partir de rentas.equipos", _renta_equipos),
+    (3, "Índices para los listados paginados", _indices_listados),
+    (4, "Secuencias atómicas de identificadores", _secuencias),
+    (5, "Columna version para concurrencia optimista", _versiones_de_fila),
+    (6, "Fechas de renta normalizadas e índice de fecha_inicio", _fechas_normalizadas),
+    (7, "Resúmenes diarios de ingresos y utilización", rollups.install),
+    (8, "Búsqueda de texto completo en equipos y clientes", _busqueda_texto),
+    (9, "Versiones de tablas compartidas entre procesos", _versiones_tablas),
+    (10, "Bandeja de recordatorios de rentas por vencer", reminders.install),
+    (11, "Días-equipo de los resúmenes repartidos en los días rentados", rollups.spread_days),
+    (12, "Contador de sesiones por usuario para revocar tokens", _sesiones_revocables),
+]
+
+
+def current_version(conn):
+    """Última versión aplicada del esquema (0 si la base es nueva)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            descripcion TEXT,
+            aplicada TEXT
+        )
+    """)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate(db_path):
+    """Aplicar las migraciones pendientes; regresa las versiones aplicadas"""
+    applied = []
+    for version, descripcion, step in MIGRATIONS:
+        with database.transaction(db_path) as conn:
+            # Se relee dentro de la transacción por si otro proceso migró antes
+            if version <= current_version(conn):
+                continue
+            step(conn)
+            conn.execute("INSERT INTO schema_version (version, descripcion, aplicada) VALUES (?, ?, ?)",
+                         (version, descripcion, datetime.now().isoformat(timespec="seconds")))
+            database.touch(db_path, *database.SCHEMA)
+        applied.append(version)
+    return applied
@@ -0,0 +1,94 @@
+"""Cotización de rentas según su duración.
+
+El ``precio_base`` de un equipo es su tarifa diaria. La tabla de tarifas
+define cuántos días se cobran por semana completa y por mes (30 días), los
+descuentos por número de equipos y la tasa de IVA. Cobrar días sueltos nunca
+cuesta más que la semana o el mes que los cubre.
+
+Los precios de muchas líneas (equipo y periodo) se calculan en un solo paso
+con numpy, y las líneas sugeridas para un formulario se memorizan por
+equipos, periodo y tarifas: editar el precio de una línea solo vuelve a
+sumar los totales.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+# semana y mes: días cobrados por 7 y por 30 días de renta; descuentos: ((mínimo de equipos, tasa), ...)
+RateTable = namedtuple("RateTable", ["semana", "mes", "descuentos", "iva"])
+
+DEFAULT_RATES = RateTable(semana=5.0, mes=20.0, descuentos=(), iva=0.16)
+
+
+def rate_table(config=None):
+    """Tabla de tarifas a partir de la configuración (la sección ``[TARIFAS]`` de secrets)"""
+    config = dict(config or {})
+    descuentos = dict(config.get("descuentos", {}))
+    rates = RateTable(
+        semana=float(config.get("semana", DEFAULT_RATES.semana)),
+        mes=float(config.get("mes", DEFAULT_RATES.mes)),
+        descuentos=tuple(sorted((int(minimo), float(tasa)) for minimo, tasa in descuentos.items())),
+        iva=float(config.get("iva", DEFAULT_RATES.iva)),
+    )
+    if not 0 < rates.semana <= 7 or not rates.semana <= rates.mes <= 30:
+        raise ValueError("Las tarifas deben cumplir 0 < semana <= 7 y semana <= mes <= 30 días cobrados")
+    if any(not 0 <= tasa < 1 for _, tasa in rates.descuentos) or rates.iva < 0:
+        raise ValueError("Los descuentos deben estar entre 0 y 1 y el IVA no puede ser negativo")
+    return rates
+
+
+def price_index(equipos):
+    """Diccionario id_equipo -> tarifa diaria de un DataFrame de equipos"""
+    return dict(zip(equipos.id_equipo, equipos.precio_base.fillna(0).astype(float)))
+
+
+def rental_days(inicio, fin):
+    """Días cobrados de cada periodo (al menos uno); acepta fechas o arreglos de fechas"""
+    days = np.asarray(fin, dtype="datetime64[D]") - np.asarray(inicio, dtype="datetime64[D]")
+    return np.maximum(days.astype(int), 1)
+
+
+def charged_days(days, rates):
+    """Días que se cobran a tarifa diaria por cada duración (vectorizado)"""
+    months, rest = np.divmod(np.asarray(days, dtype=int), 30)
+    weeks, rest = np.divmod(rest, 7)
+    resto_del_mes = np.minimum(weeks * rates.semana + np.minimum(rest, rates.semana), rates.mes)
+    return months * rates.mes + resto_del_mes
+
+
+def line_prices(daily, days, rates):
+    """Precio de cada línea para tarifas diarias `daily` y duraciones `days` (se combinan por broadcasting)"""
+    return np.round(np.asarray(daily, dtype=float) * charged_days(days, rates), 2)
+
+
+def quote_batch(daily, inicio, fin, rates):
+    """Precios de muchas líneas con su propio periodo en un solo cálculo"""
+    return line_prices(daily, rental_days(inicio, fin), rates)
+
+
+@lru_cache(maxsize=256)
+def _suggested(daily, days, rates):
+    return tuple(line_prices(daily, days, rates).tolist())
+
+
+def suggested_prices(prices, equipos, inicio, fin, rates):
+    """Precio sugerido por equipo para el periodo, con `prices` de ``price_index``"""
+    equipos = tuple(equipos)
+    daily = tuple(prices[equipo] for equipo in equipos)
+    return dict(zip(equipos, _suggested(daily, int(rental_days(inicio, fin)), rates)))
+
+
+def volume_discount(count, rates):
+    """Tasa de descuento para `count` equipos (la del mayor mínimo alcanzado)"""
+    return max((tasa for minimo, tasa in rates.descuentos if count >= minimo), default=0.0)
+
+
+def totals(prices, rates, incluir_iva=True):
+    """Importe, descuento, subtotal, IVA y total de las líneas (ya con los precios editados)"""
+    importe = round(float(sum(prices)), 2)
+    descuento = round(importe * volume_discount(len(prices), rates), 2)
+    subtotal = round(importe - descuento, 2)
+    iva = round(subtotal * rates.iva, 2) if incluir_iva else 0.0
+    return {"importe": importe, "descuento": descuento, "subtotal": subtotal, "iva": iva,
+            "total": round(subtotal + iva, 2)}
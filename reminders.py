@@ -0,0 +1,393 @@
+"""Recordatorios de rentas por vencer con una bandeja de salida local.
+
+El programador revisa periódicamente las rentas cuyo ``fecha_fin`` entra en
+la ventana ``[hoy, hoy + horizonte]`` y deja un mensaje por renta en la
+tabla ``recordatorios``. Un emisor intercambiable (archivo JSONL o SMTP)
+vacía la bandeja en lotes.
+
+- El escaneo es incremental: ``recordatorios_estado`` guarda hasta qué
+  fecha ya se revisó y cada corrida lee con el índice de ``fecha_fin`` solo
+  las fechas que entraron a la ventana desde la anterior. Las rentas que se
+  registran con un fin dentro de la ventana ya revisada se encolan con un
+  trigger en la misma transacción.
+- ``UNIQUE (id_renta, fecha_fin)`` evita encolar dos veces la misma renta.
+- Antes de enviar, cada lote se reclama (``enviando``) en una transacción,
+  así que varios procesos pueden vaciar la bandeja sin repetir mensajes.
+  Un reclamo que nunca se confirmó (el proceso terminó a media entrega)
+  queda en ``error`` en lugar de reenviarse; los fallos reportados por el
+  emisor se reintentan hasta ``MAX_ATTEMPTS`` veces.
+- El emisor anota el resultado de cada mensaje conforme lo envía; si el lote
+  se interrumpe (conexión perdida, error al cerrar la sesión SMTP), los ya
+  entregados se confirman y solo los demás vuelven a la bandeja.
+
+Uso: ``python -m reminders [--db ruta] [--horizonte 3] (--archivo salida.jsonl | --smtp host[:puerto])``
+"""
+import argparse
+import json
+import smtplib
+import threading
+from datetime import date, datetime, timedelta
+from email.message import EmailMessage
+
+import database
+import tracing
+
+MAX_ATTEMPTS = 3
+# Un reclamo sin confirmar después de este tiempo se da por interrumpido
+CLAIM_TIMEOUT_SECONDS = 600
+BATCH_SIZE = 100
+
+ESTADOS = ["pendiente", "enviando", "enviado", "error", "cancelado"]
+
+_DDL = [
+    """CREATE TABLE IF NOT EXISTS recordatorios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_renta TEXT NOT NULL,
+        cliente TEXT,
+        contacto TEXT,
+        correo TEXT,
+        equipos TEXT,
+        fecha_fin TEXT NOT NULL,
+        creado TEXT NOT NULL,
+        estado TEXT NOT NULL DEFAULT 'pendiente',
+        intentos INTEGER NOT NULL DEFAULT 0,
+        reclamado TEXT,
+        enviado TEXT,
+        error TEXT,
+        UNIQUE (id_renta, fecha_fin)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_recordatorios_estado ON recordatorios (estado, id)",
+    # Una sola fila: la ventana [desde, hasta] ya revisada
+    """CREATE TABLE IF NOT EXISTS recordatorios_estado (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        desde TEXT NOT NULL,
+        hasta TEXT NOT NULL,
+        escaneado TEXT NOT NULL
+    )""",
+    # El correo se busca por el cliente de la renta (nombre y teléfono)
+    "CREATE INDEX IF NOT EXISTS idx_clientes_contacto ON clientes (contacto)",
+]
+
+_NOW_SQL = "strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')"
+
+_ENQUEUE = """
+    INSERT OR IGNORE INTO recordatorios (id_renta, cliente, contacto, correo, equipos, fecha_fin, creado)
+    SELECT r.id_renta, r.cliente, r.contacto,
+           (SELECT c.correo FROM clientes c WHERE c.contacto = r.contacto AND c.nombre = r.cliente LIMIT 1),
+           r.equipos, r.fecha_fin, {creado}
+    FROM rentas r WHERE {filtro}
+"""
+
+
+def install(conn):
+    """Crear la bandeja, el estado del escaneo y el trigger para rentas nuevas"""
+    for ddl in _DDL:
+        conn.execute(ddl)
+    filtro = """r.id_renta = NEW.id_renta
+        AND r.fecha_fin >= (SELECT desde FROM recordatorios_estado WHERE id = 1)
+        AND r.fecha_fin <= (SELECT hasta FROM recordatorios_estado WHERE id = 1)"""
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS recordatorios_rentas_insert AFTER INSERT ON rentas BEGIN
+        {_ENQUEUE.format(creado=_NOW_SQL, filtro=filtro)};
+    END""")
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def scan(db_path, hoy, horizon_days):
+    """Encolar las rentas que entraron a la ventana desde el último escaneo; regresa cuántas"""
+    hoy = database.iso_day(hoy)
+    hasta = (date.fromisoformat(hoy) + timedelta(days=int(horizon_days))).isoformat()
+    with tracing.span("reminders.scan") as span, database.transaction(db_path) as conn:
+        row = conn.execute("SELECT hasta FROM recordatorios_estado WHERE id = 1").fetchone()
+        # Solo el tramo nuevo; lo anterior ya se revisó o lo encoló el trigger
+        filtro, params = "r.fecha_fin >= ? AND r.fecha_fin <= ?", [hoy, hasta]
+        if row is not None:
+            filtro += " AND r.fecha_fin > ?"
+            params.append(row[0])
+        nuevos = conn.execute(_ENQUEUE.format(creado="?", filtro=filtro), [_now()] + params).rowcount
+        conn.execute("""
+            INSERT INTO recordatorios_estado (id, desde, hasta, escaneado) VALUES (1, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET desde = excluded.desde, hasta = excluded.hasta,
+                                           escaneado = excluded.escaneado
+        """, (hoy, hasta, _now()))
+        database.touch(db_path, "recordatorios")
+        if span:
+            span.set(rows=nuevos)
+    return nuevos
+
+
+def claim(db_path, limit=BATCH_SIZE):
+    """Reclamar hasta `limit` recordatorios pendientes para enviarlos; regresa sus filas"""
+    vencido = (datetime.now() - timedelta(seconds=CLAIM_TIMEOUT_SECONDS)).isoformat(timespec="seconds")
+    with database.transaction(db_path) as conn:
+        # Rentas finalizadas antes de avisar: ya no hace falta el recordatorio
+        conn.execute("""
+            UPDATE recordatorios SET estado = 'cancelado'
+            WHERE estado = 'pendiente' AND id_renta NOT IN (SELECT id_renta FROM rentas)
+        """)
+        # Un reclamo sin confirmar pudo haberse entregado: no se reenvía
+        conn.execute("""
+            UPDATE recordatorios SET estado = 'error', error = 'Envío interrumpido; revisar si se entregó'
+            WHERE estado = 'enviando' AND reclamado < ?
+        """, (vencido,))
+        cursor = conn.execute("""
+            UPDATE recordatorios SET estado = 'enviando', reclamado = ?
+            WHERE id IN (SELECT id FROM recordatorios WHERE estado = 'pendiente' ORDER BY id LIMIT ?)
+            RETURNING id, id_renta, cliente, contacto, correo, equipos, fecha_fin
+        """, (_now(), int(limit)))
+        columns = [column[0] for column in cursor.description]
+        rows = sorted((dict(zip(columns, values)) for values in cursor.fetchall()), key=lambda row: row["id"])
+        database.touch(db_path, "recordatorios")
+    return rows
+
+
+def complete(db_path, sent, failed):
+    """Confirmar los enviados y regresar los fallidos a pendientes (o a error tras `MAX_ATTEMPTS`)"""
+    with database.transaction(db_path) as conn:
+        ahora = _now()
+        conn.executemany("UPDATE recordatorios SET estado = 'enviado', enviado = ?, error = NULL, "
+                         "intentos = intentos + 1 WHERE id = ? AND estado = 'enviando'",
+                         [(ahora, id_) for id_ in sent])
+        conn.executemany("""
+            UPDATE recordatorios
+            SET estado = CASE WHEN intentos + 1 >= ? THEN 'error' ELSE 'pendiente' END,
+                intentos = intentos + 1, error = ?
+            WHERE id = ? AND estado = 'enviando'
+        """, [(MAX_ATTEMPTS, str(error), id_) for id_, error in failed.items()])
+        database.touch(db_path, "recordatorios")
+
+
+def message(row):
+    """Asunto y cuerpo del recordatorio de una renta"""
+    try:
+        equipos = json.loads(row["equipos"]) if row["equipos"] else []
+    except ValueError:
+        equipos = []
+    asunto = f"Recordatorio: tu renta {row['id_renta']} vence el {row['fecha_fin']}"
+    cuerpo = (f"Hola {row['cliente']},\n\n"
+              f"Te recordamos que la renta {row['id_renta']} vence el {row['fecha_fin']}.\n"
+              f"Equipos: {', '.join(map(str, equipos)) or 'sin detalle'}.\n\n"
+              "Si necesitas extenderla, contáctanos antes de esa fecha.\n\nMarTech Rent")
+    return asunto, cuerpo
+
+
+def message_id(row):
+    """Identificador estable del mensaje, para que un destinatario pueda descartar duplicados"""
+    return f"<recordatorio-{row['id']}-{row['id_renta']}@martechrent>"
+
+
+class FileSender:
+    """Emisor que agrega cada mensaje como una línea JSON a un archivo (pruebas y desarrollo)"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, rows, results):
+        """Enviar un lote anotando en `results` {id: None si se envió, o el error}"""
+        with open(self.path, "a", encoding="utf-8") as f:
+            for row in rows:
+                asunto, cuerpo = message(row)
+                f.write(json.dumps({"id": row["id"], "message_id": message_id(row), "para": row["correo"],
+                                    "contacto": row["contacto"], "asunto": asunto, "cuerpo": cuerpo,
+                                    "enviado": _now()}, ensure_ascii=False) + "\n")
+                f.flush()
+                results[row["id"]] = None
+        return results
+
+
+class SmtpSender:
+    """Emisor por correo con una sola sesión SMTP por lote.
+
+    `smtp_class` permite usar un servidor de prueba o un sustituto con la
+    interfaz de ``smtplib.SMTP``.
+    """
+
+    def __init__(self, host, port=25, remitente="rentas@localhost", usuario=None, password=None, tls=False,
+                 timeout=30, smtp_class=smtplib.SMTP):
+        self.host = host
+        self.port = int(port)
+        self.remitente = remitente
+        self.usuario = usuario
+        self.password = password
+        self.tls = tls
+        self.timeout = timeout
+        self.smtp_class = smtp_class
+
+    def send(self, rows, results):
+        """Enviar un lote anotando en `results` {id: None si se envió, o el error}"""
+        results.update({row["id"]: "Cliente sin correo" for row in rows if not row["correo"]})
+        pendientes = [row for row in rows if row["correo"]]
+        if not pendientes:
+            return results
+        with self.smtp_class(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.tls:
+                smtp.starttls()
+            if self.usuario:
+                smtp.login(self.usuario, self.password)
+            for row in pendientes:
+                asunto, cuerpo = message(row)
+                msg = EmailMessage()
+                msg["From"] = self.remitente
+                msg["To"] = row["correo"]
+                msg["Subject"] = asunto
+                msg["Message-ID"] = message_id(row)
+                msg.set_content(cuerpo)
+                try:
+                    smtp.send_message(msg)
+                except smtplib.SMTPException as e:
+                    results[row["id"]] = str(e)
+                else:
+                    results[row["id"]] = None
+        return results
+
+
+def make_sender(config):
+    """Emisor según la configuración (la sección ``[RECORDATORIOS]`` de secrets); None si no hay"""
+    config = dict(config or {})
+    envio = config.get("envio")
+    if envio == "archivo":
+        return FileSender(config.get("archivo", "recordatorios.jsonl"))
+    if envio == "smtp":
+        return SmtpSender(config["smtp_host"], config.get("smtp_puerto", 25),
+                          config.get("remitente", "rentas@localhost"), config.get("usuario"),
+                          config.get("password"), bool(config.get("tls", False)))
+    if envio:
+        raise ValueError(f"Envío de recordatorios desconocido: {envio} (usa 'archivo' o 'smtp')")
+    return None
+
+
+def drain(db_path, sender, batch_size=BATCH_SIZE):
+    """Enviar los recordatorios pendientes en lotes; regresa {"enviados": n, "fallidos": n}"""
+    enviados = fallidos = 0
+    while True:
+        rows = claim(db_path, batch_size)
+        if not rows:
+            break
+        results = {}
+        interrumpido = False
+        with tracing.span("reminders.send", rows=len(rows)):
+            try:
+                sender.send(rows, results)
+            except Exception as e:
+                # Conexión perdida o error al cerrar la sesión: los mensajes ya
+                # entregados se confirman y solo los demás se reintentan después
+                interrumpido = True
+                for row in rows:
+                    results.setdefault(row["id"], str(e))
+        sent = [id_ for id_, error in results.items() if error is None]
+        failed = {id_: error for id_, error in results.items() if error is not None}
+        complete(db_path, sent, failed)
+        enviados += len(sent)
+        fallidos += len(failed)
+        if failed or interrumpido:
+            # No insistir con un emisor que está fallando en la misma corrida
+            break
+    return {"enviados": enviados, "fallidos": fallidos}
+
+
+def run_once(db_path, sender, hoy, horizon_days, batch_size=BATCH_SIZE):
+    """Escanear la ventana y vaciar la bandeja"""
+    encolados = scan(db_path, hoy, horizon_days)
+    return dict(drain(db_path, sender, batch_size), encolados=encolados)
+
+
+def outbox_summary(db_path):
+    """Conteo de recordatorios por estado"""
+    df = database.query(db_path, ["recordatorios", "rentas"], ("recordatorios_resumen",),
+                        "SELECT estado, COUNT(*) AS n FROM recordatorios GROUP BY estado",
+                        span_name="db.outbox_summary")
+    conteos = dict.fromkeys(ESTADOS, 0)
+    conteos.update({str(estado): int(n) for estado, n in zip(df.estado, df.n)})
+    return conteos
+
+
+def recent(db_path, limit=50):
+    """Últimos recordatorios encolados (las inserciones del trigger llegan con `rentas`)"""
+    return database.query(db_path, ["recordatorios", "rentas"], ("recordatorios_recientes", limit), """
+        SELECT id_renta, cliente, correo, fecha_fin, estado, intentos, enviado, error
+        FROM recordatorios ORDER BY id DESC LIMIT ?
+    """, (int(limit),), span_name="db.outbox_recent")
+
+
+class ReminderScheduler:
+    """Hilo de fondo que escanea y vacía la bandeja cada `interval_seconds`.
+
+    `on_change` se llama cuando una corrida modificó la bandeja (p. ej., para
+    respaldar la base y no repetir envíos tras restaurarla).
+    """
+
+    def __init__(self, db_path, sender, horizon_days=3, interval_seconds=300.0, batch_size=BATCH_SIZE,
+                 on_change=None):
+        self.db_path = db_path
+        self.sender = sender
+        self.horizon_days = horizon_days
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self.last_run = None
+        self.last_result = None
+        self.last_error = None
+        self._thread = threading.Thread(target=self._run, name="reminders", daemon=True)
+        self._thread.start()
+
+    def run_now(self):
+        """Adelantar la siguiente corrida"""
+        self._wake.set()
+
+    def status(self):
+        with self._lock:
+            return {"last_run": self.last_run, "last_result": self.last_result, "last_error": self.last_error}
+
+    def stop(self, timeout=30):
+        self._stopping = True
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping:
+            try:
+                result, error = run_once(self.db_path, self.sender, date.today(), self.horizon_days,
+                                         self.batch_size), None
+            except Exception as e:
+                result, error = None, str(e)
+            with self._lock:
+                self.last_run = datetime.now()
+                self.last_result = result
+                self.last_error = error
+            if result and any(result.values()) and self.on_change is not None:
+                self.on_change()
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="rentapp_database.db")
+    parser.add_argument("--horizonte", type=int, default=3, help="días antes del fin de la renta")
+    parser.add_argument("--hoy", default=None, help="fecha de referencia (AAAA-MM-DD); hoy por defecto")
+    parser.add_argument("--lote", type=int, default=BATCH_SIZE)
+    destino = parser.add_mutually_exclusive_group(required=True)
+    destino.add_argument("--archivo", help="agregar los mensajes a este archivo JSONL")
+    destino.add_argument("--smtp", help="servidor SMTP host[:puerto]")
+    parser.add_argument("--remitente", default="rentas@localhost")
+    args = parser.parse_args()
+    import migrations
+
+    migrations.migrate(args.db)
+    if args.archivo:
+        sender = FileSender(args.archivo)
+    else:
+        host, _, port = args.smtp.partition(":")
+        sender = SmtpSender(host, port or 25, args.remitente)
+    resultado = run_once(args.db, sender, args.hoy or date.today(), args.horizonte, args.lote)
+    print(f"encolados: {resultado['encolados']}  enviados: {resultado['enviados']}  "
+          f"fallidos: {resultado['fallidos']}")
+
+
+if __name__ == "__main__":
+    main()
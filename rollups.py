@@ -0,0 +1,276 @@
+"""Resúmenes diarios de ingresos y utilización.
+
+Tres tablas acumulan por día. Las rentas y los ingresos se cuentan el día
+de inicio de la renta; los días-equipo, en cada día del periodo rentado
+``[fecha_inicio, fecha_fin)``, de modo que la utilización de un periodo
+solo incluye los días que caen dentro de él:
+
+- ``rollup_diario``: rentas, subtotal, IVA, ingresos y días-equipo rentados.
+- ``rollup_cliente``: rentas, subtotal, IVA e ingresos por cliente.
+- ``rollup_equipo``: rentas, ingresos y días rentados por equipo.
+
+Los días se reparten con ``rollup_calendario`` (una fila por día de 2000 a
+2099), porque SQLite no admite CTE recursivas dentro de los triggers.
+
+Triggers sobre ``rentas`` y ``renta_equipos`` actualizan los resúmenes en la
+misma transacción que la escritura, sin importar quién escriba (la
+aplicación, la importación o los benchmarks). ``rollup_aplicadas`` registra
+qué rentas y líneas ya se contaron, así que reemplazar una fila no la cuenta
+dos veces y ``rebuild`` puede completar lo que falte. Finalizar una renta no
+resta nada: los resúmenes conservan el historial.
+
+Las consultas del tablero leen solo los resúmenes, de modo que su costo
+depende del número de días del periodo y no del historial de rentas.
+
+Uso: ``python -m rollups [--db ruta] [--desde-cero]``
+"""
+import argparse
+
+import database
+
+# Las rentas que lleguen a estas tablas cambian los resúmenes (vía triggers)
+SOURCE_TABLES = ["rentas", "renta_equipos"]
+ROLLUP_TABLES = ["rollup_diario", "rollup_cliente", "rollup_equipo", "rollup_aplicadas"]
+
+_DDL = [
+    """CREATE TABLE IF NOT EXISTS rollup_diario (
+        dia TEXT PRIMARY KEY,
+        rentas INTEGER NOT NULL DEFAULT 0,
+        subtotal REAL NOT NULL DEFAULT 0,
+        iva REAL NOT NULL DEFAULT 0,
+        ingresos REAL NOT NULL DEFAULT 0,
+        dias_equipo REAL NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE IF NOT EXISTS rollup_cliente (
+        dia TEXT NOT NULL,
+        cliente TEXT NOT NULL,
+        rentas INTEGER NOT NULL DEFAULT 0,
+        subtotal REAL NOT NULL DEFAULT 0,
+        iva REAL NOT NULL DEFAULT 0,
+        ingresos REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (dia, cliente)
+    )""",
+    """CREATE TABLE IF NOT EXISTS rollup_equipo (
+        dia TEXT NOT NULL,
+        id_equipo TEXT NOT NULL,
+        rentas INTEGER NOT NULL DEFAULT 0,
+        ingresos REAL NOT NULL DEFAULT 0,
+        dias_rentados REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (dia, id_equipo)
+    )""",
+    # id_equipo = '' marca la renta; cualquier otro valor, una de sus líneas
+    """CREATE TABLE IF NOT EXISTS rollup_aplicadas (
+        id_renta TEXT NOT NULL,
+        id_equipo TEXT NOT NULL,
+        PRIMARY KEY (id_renta, id_equipo)
+    ) WITHOUT ROWID""",
+    "CREATE TABLE IF NOT EXISTS rollup_calendario (dia TEXT PRIMARY KEY) WITHOUT ROWID",
+]
+
+_CALENDARIO = """
+    INSERT OR IGNORE INTO rollup_calendario (dia)
+    WITH RECURSIVE d(dia) AS (SELECT '2000-01-01' UNION ALL SELECT date(dia, '+1 day') FROM d WHERE dia < '2099-12-31')
+    SELECT dia FROM d
+"""
+
+# Sentencias parametrizadas por {filtro}: en los triggers se limitan a la fila
+# nueva y en `rebuild` abarcan todo lo que aún no se ha contado
+_RENTA_NUEVA = """r.fecha_inicio IS NOT NULL AND {filtro}
+    AND NOT EXISTS (SELECT 1 FROM rollup_aplicadas a WHERE a.id_renta = r.id_renta AND a.id_equipo = '')"""
+_LINEA_NUEVA = """r.fecha_inicio IS NOT NULL AND {filtro}
+    AND NOT EXISTS (SELECT 1 FROM rollup_aplicadas a WHERE a.id_renta = re.id_renta AND a.id_equipo = re.id_equipo)"""
+
+_RENTA_STATEMENTS = [
+    f"""INSERT INTO rollup_diario (dia, rentas, subtotal, iva, ingresos)
+    SELECT r.fecha_inicio, COUNT(*), SUM(COALESCE(r.subtotal, 0)),
+           SUM(COALESCE(r.precio, 0) - COALESCE(r.subtotal, 0)), SUM(COALESCE(r.precio, 0))
+    FROM rentas r WHERE {_RENTA_NUEVA}
+    GROUP BY r.fecha_inicio
+    ON CONFLICT (dia) DO UPDATE SET rentas = rentas + excluded.rentas, subtotal = subtotal + excluded.subtotal,
+        iva = iva + excluded.iva, ingresos = ingresos + excluded.ingresos""",
+    f"""INSERT INTO rollup_cliente (dia, cliente, rentas, subtotal, iva, ingresos)
+    SELECT r.fecha_inicio, COALESCE(r.cliente, ''), COUNT(*), SUM(COALESCE(r.subtotal, 0)),
+           SUM(COALESCE(r.precio, 0) - COALESCE(r.subtotal, 0)), SUM(COALESCE(r.precio, 0))
+    FROM rentas r WHERE {_RENTA_NUEVA}
+    GROUP BY r.fecha_inicio, COALESCE(r.cliente, '')
+    ON CONFLICT (dia, cliente) DO UPDATE SET rentas = rentas + excluded.rentas,
+        subtotal = subtotal + excluded.subtotal, iva = iva + excluded.iva, ingresos = ingresos + excluded.ingresos""",
+    f"""INSERT INTO rollup_aplicadas (id_renta, id_equipo)
+    SELECT r.id_renta, '' FROM rentas r WHERE {_RENTA_NUEVA}""",
+]
+
+# Un día-equipo por cada día del periodo [fecha_inicio, fecha_fin) de la línea
+_DIAS_RENTADOS = f"""FROM renta_equipos re JOIN rentas r ON r.id_renta = re.id_renta
+    JOIN rollup_calendario c ON c.dia >= r.fecha_inicio AND c.dia < r.fecha_fin
+    WHERE {_LINEA_NUEVA}"""
+_LINEA_STATEMENTS = [
+    f"""INSERT INTO rollup_equipo (dia, id_equipo, rentas, ingresos)
+    SELECT r.fecha_inicio, re.id_equipo, COUNT(*), SUM(COALESCE(re.precio, 0))
+    FROM renta_equipos re JOIN rentas r ON r.id_renta = re.id_renta WHERE {_LINEA_NUEVA}
+    GROUP BY r.fecha_inicio, re.id_equipo
+    ON CONFLICT (dia, id_equipo) DO UPDATE SET rentas = rentas + excluded.rentas,
+        ingresos = ingresos + excluded.ingresos""",
+    f"""INSERT INTO rollup_equipo (dia, id_equipo, dias_rentados)
+    SELECT c.dia, re.id_equipo, COUNT(*) {_DIAS_RENTADOS}
+    GROUP BY c.dia, re.id_equipo
+    ON CONFLICT (dia, id_equipo) DO UPDATE SET dias_rentados = dias_rentados + excluded.dias_rentados""",
+    f"""INSERT INTO rollup_diario (dia, dias_equipo)
+    SELECT c.dia, COUNT(*) {_DIAS_RENTADOS}
+    GROUP BY c.dia
+    ON CONFLICT (dia) DO UPDATE SET dias_equipo = dias_equipo + excluded.dias_equipo""",
+    f"""INSERT INTO rollup_aplicadas (id_renta, id_equipo)
+    SELECT re.id_renta, re.id_equipo
+    FROM renta_equipos re JOIN rentas r ON r.id_renta = re.id_renta WHERE {_LINEA_NUEVA}""",
+]
+
+
+def _statements(statements, filtro):
+    return [sql.format(filtro=filtro) for sql in statements]
+
+
+def install(conn):
+    """Crear las tablas y los triggers de los resúmenes y contar las rentas existentes"""
+    _create(conn)
+    backfill(conn)
+
+
+def _create(conn):
+    for ddl in _DDL:
+        conn.execute(ddl)
+    conn.execute(_CALENDARIO)
+    triggers = {
+        # Las líneas de equipo se insertan después de su renta
+        "rollup_rentas_insert": ("rentas", _statements(_RENTA_STATEMENTS, "r.id_renta = NEW.id_renta")),
+        "rollup_renta_equipos_insert": ("renta_equipos", _statements(
+            _LINEA_STATEMENTS, "re.id_renta = NEW.id_renta AND re.id_equipo = NEW.id_equipo")),
+    }
+    for name, (table, statements) in triggers.items():
+        body = ";\n".join(statements)
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} AFTER INSERT ON {table} BEGIN\n{body};\nEND")
+
+
+def spread_days(conn):
+    """Repartir entre los días rentados los días-equipo que se contaron el día de inicio.
+
+    Las bases anteriores sumaban toda la duración de cada línea en su día de
+    inicio. Como un equipo no puede tener dos rentas que se traslapen, cada
+    fila de ``rollup_equipo`` con ``dias_rentados = d`` corresponde a los días
+    ``[dia, dia + d)`` y puede repartirse sin leer las rentas (las ya
+    finalizadas solo quedan en el historial).
+    """
+    old = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'rollup_renta_equipos_insert'"
+                       ).fetchone()
+    if old is not None and "rollup_calendario" not in old[0]:
+        conn.execute("DROP TRIGGER rollup_renta_equipos_insert")
+        _create(conn)
+        conn.execute("""
+            CREATE TEMP TABLE rollup_repartidos AS
+            SELECT c.dia, e.id_equipo, COUNT(*) AS dias
+            FROM rollup_equipo e
+            JOIN rollup_calendario c
+              ON c.dia >= e.dia AND c.dia < date(e.dia, printf('+%d days', CAST(e.dias_rentados AS INTEGER)))
+            WHERE e.dias_rentados > 0
+            GROUP BY c.dia, e.id_equipo
+        """)
+        conn.execute("UPDATE rollup_equipo SET dias_rentados = 0")
+        conn.execute("UPDATE rollup_diario SET dias_equipo = 0")
+        conn.execute("""
+            INSERT INTO rollup_equipo (dia, id_equipo, dias_rentados)
+            SELECT dia, id_equipo, dias FROM temp.rollup_repartidos WHERE 1
+            ON CONFLICT (dia, id_equipo) DO UPDATE SET dias_rentados = dias_rentados + excluded.dias_rentados
+        """)
+        conn.execute("""
+            INSERT INTO rollup_diario (dia, dias_equipo)
+            SELECT dia, SUM(dias) FROM temp.rollup_repartidos WHERE 1 GROUP BY dia
+            ON CONFLICT (dia) DO UPDATE SET dias_equipo = dias_equipo + excluded.dias_equipo
+        """)
+        conn.execute("DROP TABLE temp.rollup_repartidos")
+    else:
+        _create(conn)
+
+
+def backfill(conn):
+    """Contar en los resúmenes las rentas y líneas que todavía no estén registradas"""
+    for sql in _statements(_RENTA_STATEMENTS, "1") + _statements(_LINEA_STATEMENTS, "1"):
+        conn.execute(sql)
+
+
+def rebuild(db_path, from_scratch=False):
+    """Completar los resúmenes; con `from_scratch` se recalculan desde las rentas actuales.
+
+    Recalcular desde cero pierde lo que aportaron las rentas ya finalizadas.
+    """
+    with database.transaction(db_path) as conn:
+        if from_scratch:
+            for table in ROLLUP_TABLES:
+                conn.execute(f"DELETE FROM {table}")
+        backfill(conn)
+        database.touch(db_path, *SOURCE_TABLES)
+    return totals(db_path)
+
+
+def _period(desde, hasta):
+    return database.iso_day(desde), database.iso_day(hasta)
+
+
+def totals(db_path, desde="0000-01-01", hasta="9999-12-31"):
+    """Rentas, subtotal, IVA, ingresos y días-equipo del periodo"""
+    desde, hasta = _period(desde, hasta)
+    df = database.query(db_path, SOURCE_TABLES, ("rollup_totales", desde, hasta), """
+        SELECT COUNT(*) AS dias, COALESCE(SUM(rentas), 0) AS rentas, COALESCE(SUM(subtotal), 0) AS subtotal,
+               COALESCE(SUM(iva), 0) AS iva, COALESCE(SUM(ingresos), 0) AS ingresos,
+               COALESCE(SUM(dias_equipo), 0) AS dias_equipo
+        FROM rollup_diario WHERE dia BETWEEN ? AND ?
+    """, (desde, hasta), span_name="db.rollup_totals")
+    return df.iloc[0].to_dict()
+
+
+def monthly_revenue(db_path, desde, hasta):
+    """Ingresos, IVA y días-equipo por mes"""
+    desde, hasta = _period(desde, hasta)
+    return database.query(db_path, SOURCE_TABLES, ("rollup_mensual", desde, hasta), """
+        SELECT substr(dia, 1, 7) AS mes, SUM(rentas) AS rentas, SUM(subtotal) AS subtotal, SUM(iva) AS iva,
+               SUM(ingresos) AS ingresos, SUM(dias_equipo) AS dias_equipo
+        FROM rollup_diario WHERE dia BETWEEN ? AND ?
+        GROUP BY mes ORDER BY mes
+    """, (desde, hasta), span_name="db.rollup_monthly")
+
+
+def revenue_by_client(db_path, desde, hasta, limit=20):
+    """Clientes con más ingresos en el periodo"""
+    desde, hasta = _period(desde, hasta)
+    return database.query(db_path, SOURCE_TABLES, ("rollup_clientes", desde, hasta, limit), """
+        SELECT cliente, SUM(rentas) AS rentas, SUM(subtotal) AS subtotal, SUM(iva) AS iva,
+               SUM(ingresos) AS ingresos
+        FROM rollup_cliente WHERE dia BETWEEN ? AND ?
+        GROUP BY cliente ORDER BY ingresos DESC LIMIT ?
+    """, (desde, hasta, int(limit)), span_name="db.rollup_clients")
+
+
+def utilization_by_equipo(db_path, desde, hasta, limit=50):
+    """Días rentados, ingresos y porcentaje de utilización por equipo en el periodo"""
+    desde, hasta = _period(desde, hasta)
+    return database.query(db_path, SOURCE_TABLES, ("rollup_equipos", desde, hasta, limit), """
+        SELECT id_equipo, SUM(rentas) AS rentas, SUM(ingresos) AS ingresos, SUM(dias_rentados) AS dias_rentados,
+               ROUND(100.0 * SUM(dias_rentados) / (julianday(?) - julianday(?) + 1), 1) AS utilizacion
+        FROM rollup_equipo WHERE dia BETWEEN ? AND ?
+        GROUP BY id_equipo ORDER BY dias_rentados DESC LIMIT ?
+    """, (hasta, desde, desde, hasta, int(limit)), span_name="db.rollup_equipos")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="rentapp_database.db")
+    parser.add_argument("--desde-cero", action="store_true",
+                        help="borrar los resúmenes y recalcularlos solo con las rentas actuales")
+    args = parser.parse_args()
+    import migrations
+
+    migrations.migrate(args.db)
+    resultado = rebuild(args.db, args.desde_cero)
+    print(f"rentas: {resultado['rentas']:,.0f}  ingresos: ${resultado['ingresos']:,.2f}  "
+          f"días-equipo: {resultado['dias_equipo']:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
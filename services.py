@@ -0,0 +1,342 @@
+"""Operaciones de negocio de MarTech Rent, independientes de la interfaz.
+
+Registrar, editar y eliminar equipos y clientes, crear rentas y
+finalizarlas. La aplicación de Streamlit, la API HTTP local (``api.py``) y
+la línea de comandos por lotes usan estas mismas funciones. Cada función
+valida los datos (``ValidationError`` con el mensaje para el usuario) y
+aplica todas sus escrituras en una sola transacción. Las versiones por lote
+(``create_rentas``, ``finalize_rentas``, ``register``) procesan cientos de
+registros en una transacción.
+
+Uso: ``python -m services {equipos,clientes,rentas} archivo.jsonl [--db ruta]`` o
+``python -m services finalizar ID [ID ...] [--db ruta]``
+"""
+import argparse
+import inspect
+import json
+import os
+import sys
+from datetime import date
+
+import archive
+import availability
+import database
+import quote
+from validation import validate_email, validate_phone
+
+ESTADOS = ["disponible", "rentado", "mantenimiento"]
+
+
+class ValidationError(ValueError):
+    """Datos inválidos; el mensaje se muestra tal cual al usuario"""
+
+
+def _day(value):
+    try:
+        return date.fromisoformat(database.iso_day(value))
+    except ValueError:
+        raise ValidationError(f"Fecha inválida: {value}") from None
+
+
+def equipo_values(marca, modelo, precio_base, caracteristicas="", estado="disponible"):
+    """Columnas validadas de un equipo nuevo"""
+    if not marca or not modelo:
+        raise ValidationError("Marca y modelo son obligatorios")
+    try:
+        precio_base = float(precio_base)
+    except (TypeError, ValueError):
+        precio_base = 0.0
+    if not precio_base > 0:
+        raise ValidationError("El precio por día debe ser mayor a 0")
+    if estado not in ESTADOS:
+        raise ValidationError(f"Estado inválido (usa {', '.join(ESTADOS)})")
+    return {"marca": marca, "modelo": modelo, "caracteristicas": caracteristicas or "", "estado": estado,
+            "precio_base": precio_base}
+
+
+def cliente_values(nombre, contacto, correo):
+    """Columnas validadas de un cliente nuevo"""
+    if not nombre or not contacto or not correo:
+        raise ValidationError("Todos los campos son obligatorios")
+    if not validate_email(correo):
+        raise ValidationError("Correo electrónico inválido")
+    if not validate_phone(contacto):
+        raise ValidationError("Teléfono inválido (debe tener 10-15 dígitos)")
+    return {"nombre": nombre, "contacto": contacto, "correo": correo}
+
+
+# Tabla -> (prefijo del identificador, validación de las columnas)
+_REGISTROS = {
+    "equipos": ("ME", equipo_values),
+    "clientes": ("MC", cliente_values),
+}
+
+
+def _record(value):
+    """Validar que un registro recibido (de JSON) sea un objeto"""
+    if not isinstance(value, dict):
+        raise ValidationError("Cada registro debe ser un objeto con sus columnas")
+    return value
+
+
+def _validated(validate, values):
+    """Llamar a `validate` con las columnas de `values`, reportando las desconocidas o faltantes"""
+    params = inspect.signature(validate).parameters
+    desconocidas = sorted(set(_record(values)) - set(params))
+    if desconocidas:
+        raise ValidationError(f"Columnas desconocidas: {', '.join(desconocidas)}")
+    faltantes = [name for name, param in params.items()
+                 if param.default is inspect.Parameter.empty and name not in values]
+    if faltantes:
+        raise ValidationError(f"Columnas faltantes: {', '.join(faltantes)}")
+    return validate(**values)
+
+
+def register(db_path, table, rows):
+    """Registrar equipos o clientes (diccionarios de columnas) en una transacción; regresa sus IDs"""
+    prefix, validate = _REGISTROS[table]
+    pk, _ = database.SCHEMA[table]
+    ids = [database.NextId(prefix) for _ in rows]
+    operations = [database.insert(table, {pk: new_id, **_validated(validate, row)}) for new_id, row in zip(ids, rows)]
+    database.apply_operations(db_path, operations)
+    return [new_id.value for new_id in ids]
+
+
+def register_equipo(db_path, marca, modelo, precio_base, caracteristicas="", estado="disponible"):
+    """Registrar un equipo; regresa su ID"""
+    return register(db_path, "equipos", [{"marca": marca, "modelo": modelo, "precio_base": precio_base,
+                                          "caracteristicas": caracteristicas, "estado": estado}])[0]
+
+
+def register_cliente(db_path, nombre, contacto, correo):
+    """Registrar un cliente; regresa su ID"""
+    return register(db_path, "clientes", [{"nombre": nombre, "contacto": contacto, "correo": correo}])[0]
+
+
+def _update(db_path, table, key, values, expected_version):
+    """Actualizar solo las columnas dadas de un registro; las demás no se escriben"""
+    _, validate = _REGISTROS[table]
+    pk, _ = database.SCHEMA[table]
+    columns = list(inspect.signature(validate).parameters)
+    cambios = _record(values)
+    if not cambios:
+        raise ValidationError("No hay columnas que actualizar")
+
+    def merged(conn):
+        row = conn.execute(f"SELECT {', '.join(columns)} FROM {table} WHERE {pk} = ?", (key,)).fetchone()
+        if row is None:
+            raise database.ConflictError(f"{key} ya no existe en {table}", table, key)
+        return _validated(validate, dict(zip(columns, row), **cambios))
+
+    # La fila combinada se valida de nuevo dentro de la transacción de escritura,
+    # donde ya no puede cambiar; el UPDATE solo lleva las columnas recibidas
+    with database.connection(db_path) as conn:
+        validos = merged(conn)
+    operation = database.update(table, key, {column: validos[column] for column in cambios}, expected_version)
+    return database.apply_operations(db_path, [operation], guard=merged)
+
+
+def update_equipo(db_path, id_equipo, values, expected_version=None):
+    """Actualizar un equipo (las columnas de `values`) si sigue en `expected_version`"""
+    return _update(db_path, "equipos", id_equipo, values, expected_version)
+
+
+def update_cliente(db_path, id_cliente, values, expected_version=None):
+    """Actualizar un cliente (las columnas de `values`) si sigue en `expected_version`"""
+    return _update(db_path, "clientes", id_cliente, values, expected_version)
+
+
+def delete_record(db_path, table, key, expected_version=None):
+    """Eliminar un equipo o cliente si sigue en `expected_version`"""
+    if table not in _REGISTROS:
+        raise ValueError(f"Solo se pueden eliminar: {', '.join(_REGISTROS)}")
+    return database.apply_operations(db_path, [database.delete(table, key, expected_version)])
+
+
+def _overlapping(rentas):
+    """Equipos pedidos dos veces en el lote con periodos que se traslapan"""
+    periodos = {}
+    repetidos = set()
+    for renta in rentas:
+        for id_equipo in renta["equipos"]:
+            for inicio, fin in periodos.get(id_equipo, []):
+                if inicio < renta["fecha_fin"] and renta["fecha_inicio"] < fin:
+                    repetidos.add(id_equipo)
+            periodos.setdefault(id_equipo, []).append((renta["fecha_inicio"], renta["fecha_fin"]))
+    return sorted(repetidos)
+
+
+def _line_prices(equipos):
+    """Equipos de una renta como diccionario ID -> precio (None para cotizarlo)"""
+    if isinstance(equipos, dict):
+        return dict(equipos)
+    if isinstance(equipos, (list, tuple)):
+        return dict.fromkeys(equipos)
+    if equipos:
+        raise ValidationError("equipos debe ser una lista de IDs o un objeto ID -> precio")
+    return {}
+
+
+def renta_operations(db_path, rentas, rates=quote.DEFAULT_RATES, hoy=None):
+    """IDs, operaciones y validación para crear `rentas` en una sola transacción.
+
+    Cada renta es un diccionario con ``id_cliente``, ``equipos`` (lista de IDs
+    o diccionario ID -> precio de la línea; sin precio se cotiza con
+    `rates`), ``fecha_inicio``, ``fecha_fin`` y opcionalmente ``incluir_iva``
+    y ``versiones`` (ID de equipo -> versión leída, para detectar cambios
+    concurrentes). Las rentas que empiezan a más tardar `hoy` marcan sus
+    equipos como rentados; las reservas a futuro no.
+    """
+    hoy = _day(hoy or date.today())
+    rentas = [dict(_record(renta), fecha_inicio=_day(renta.get("fecha_inicio")), fecha_fin=_day(renta.get("fecha_fin")),
+                   equipos=_line_prices(renta.get("equipos"))) for renta in rentas]
+    for renta in rentas:
+        if renta["fecha_fin"] <= renta["fecha_inicio"]:
+            raise ValidationError("La fecha de fin debe ser posterior a la fecha de inicio")
+        if not renta["equipos"]:
+            raise ValidationError("Debe seleccionar al menos un equipo")
+    repetidos = _overlapping(rentas)
+    if repetidos:
+        raise ValidationError(f"Equipos repetidos en periodos que se traslapan: {', '.join(repetidos)}")
+
+    equipos = database.read_rows(db_path, "equipos", sorted({e for renta in rentas for e in renta["equipos"]}))
+    equipos = equipos.set_index("id_equipo")
+    clientes = database.read_rows(db_path, "clientes", sorted({renta.get("id_cliente") for renta in rentas} - {None}))
+    clientes = clientes.set_index("id_cliente")
+    faltantes = sorted({e for renta in rentas for e in renta["equipos"]} - set(equipos.index))
+    if faltantes:
+        raise ValidationError(f"Equipos inexistentes: {', '.join(faltantes)}")
+    tarifas = quote.price_index(equipos.reset_index())
+
+    # Todas las líneas sin precio del lote se cotizan en un solo cálculo
+    lineas = [(renta, equipo) for renta in rentas for equipo, precio in renta["equipos"].items() if precio is None]
+    cotizadas = quote.quote_batch([tarifas[equipo] for _, equipo in lineas],
+                                  [renta["fecha_inicio"] for renta, _ in lineas],
+                                  [renta["fecha_fin"] for renta, _ in lineas], rates) if lineas else []
+    sugeridos = {(id(renta), equipo): precio for (renta, equipo), precio in zip(lineas, cotizadas)}
+
+    ids, operations, guards, rentados = [], [], [], {}
+    for renta in rentas:
+        if renta.get("id_cliente") not in clientes.index:
+            raise ValidationError(f"Cliente inexistente: {renta.get('id_cliente')}")
+        cliente = clientes.loc[renta["id_cliente"]]
+        precios = {e: float(sugeridos[id(renta), e] if precio is None else precio)
+                   for e, precio in renta["equipos"].items()}
+        cotizacion = quote.totals(list(precios.values()), rates, renta.get("incluir_iva", False))
+        if cotizacion["subtotal"] <= 0:
+            raise ValidationError("El subtotal debe ser mayor a 0")
+
+        nuevo_id = database.NextId("RE-")
+        ids.append(nuevo_id)
+        operations.append(database.insert("rentas", {
+            "id_renta": nuevo_id, "cliente": cliente.nombre, "contacto": cliente.contacto,
+            "equipos": json.dumps(list(precios)), "fecha_inicio": renta["fecha_inicio"].isoformat(),
+            "fecha_fin": renta["fecha_fin"].isoformat(), "subtotal": cotizacion["subtotal"],
+            "precio": cotizacion["total"]}))
+        operations += database.renta_equipos_operations(nuevo_id, precios)
+        guards.append(availability.booking_guard(list(precios), renta["fecha_inicio"], renta["fecha_fin"]))
+        if renta["fecha_inicio"] <= hoy:
+            versiones = renta.get("versiones") or {}
+            for id_equipo in precios:
+                if equipos.estado[id_equipo] != "disponible":
+                    raise database.ConflictError(f"El equipo {id_equipo} ya no está disponible", "equipos",
+                                                 id_equipo)
+                rentados[id_equipo] = versiones.get(id_equipo, equipos.version[id_equipo])
+    # Un equipo cambia de estado una sola vez aunque aparezca en varias rentas del lote
+    operations += [database.update("equipos", id_equipo, {"estado": "rentado"}, expected_version=version)
+                   for id_equipo, version in rentados.items()]
+
+    def guard(conn):
+        for check in guards:
+            check(conn)
+
+    return ids, operations, guard
+
+
+def create_rentas(db_path, rentas, rates=quote.DEFAULT_RATES, hoy=None):
+    """Crear varias rentas en una sola transacción; regresa sus IDs"""
+    ids, operations, guard = renta_operations(db_path, rentas, rates, hoy)
+    database.apply_operations(db_path, operations, guard=guard)
+    return [new_id.value for new_id in ids]
+
+
+def create_renta(db_path, id_cliente, equipos, fecha_inicio, fecha_fin, incluir_iva=False, versiones=None,
+                 rates=quote.DEFAULT_RATES, hoy=None):
+    """Crear una renta; regresa su ID"""
+    return create_rentas(db_path, [{"id_cliente": id_cliente, "equipos": equipos, "fecha_inicio": fecha_inicio,
+                                    "fecha_fin": fecha_fin, "incluir_iva": incluir_iva, "versiones": versiones}],
+                         rates, hoy)[0]
+
+
+def finalize_renta(db_path, id_renta, expected_version=None, hoy=None):
+    """Finalizar una renta: libera sus equipos y la mueve al historial de su año"""
+    return archive.finalize(db_path, id_renta, expected_version, hoy)
+
+
+def finalize_rentas(db_path, ids, hoy=None):
+    """Finalizar varias rentas en una sola transacción; regresa cuántas se finalizaron.
+
+    Se adjuntan a la vez las particiones del historial de todos los años de
+    inicio del lote, así que si una renta falla no se finaliza ninguna.
+    """
+    years, operations, guards = set(), [], []
+    for id_renta in ids:
+        year, ops, check = archive.finalize_operations(db_path, id_renta, hoy=hoy, batch=set(ids))
+        years.add(year)
+        operations += ops
+        guards.append(check)
+    if len(years) > 10:
+        raise ValidationError("Un lote solo puede finalizar rentas de hasta 10 años de inicio distintos")
+
+    def guard(conn):
+        for check in guards:
+            check(conn)
+
+    with archive.attached(db_path, *years):
+        database.apply_operations(db_path, operations, guard=guard)
+    return len(ids)
+
+
+def _read_jsonl(path):
+    with open(path, encoding="utf-8") if path != "-" else sys.stdin as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_rates(path=None):
+    """Tabla de tarifas de un TOML con sección [TARIFAS] (la misma que usa la aplicación)"""
+    import tomllib
+
+    path = path or os.path.join(".streamlit", "secrets.toml")
+    if not os.path.exists(path):
+        return quote.DEFAULT_RATES
+    with open(path, "rb") as f:
+        return quote.rate_table(tomllib.load(f).get("TARIFAS", {}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("accion", choices=["equipos", "clientes", "rentas", "finalizar"])
+    parser.add_argument("entrada", nargs="+", help="archivo JSONL ('-' para stdin) o IDs de renta a finalizar")
+    parser.add_argument("--db", default="rentapp_database.db")
+    parser.add_argument("--tarifas", help="archivo TOML con la sección [TARIFAS] (por defecto .streamlit/secrets.toml)")
+    args = parser.parse_args()
+    import migrations
+
+    migrations.migrate(args.db)
+    try:
+        if args.accion == "finalizar":
+            resultado = {"finalizadas": finalize_rentas(args.db, args.entrada)}
+        elif args.accion == "rentas":
+            rentas = [row for path in args.entrada for row in _read_jsonl(path)]
+            resultado = {"ids": create_rentas(args.db, rentas, load_rates(args.tarifas))}
+        else:
+            rows = [row for path in args.entrada for row in _read_jsonl(path)]
+            resultado = {"ids": register(args.db, args.accion, rows)}
+    except (ValidationError, database.ConflictError) as e:
+        print(json.dumps({"error": str(e)}, ensure_ascii=False))
+        sys.exit(1)
+    print(json.dumps(resultado, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""Snapshots incrementales y comprimidos de la base de datos.
+
+Formato en el destino (repositorio de GitHub o directorio local):
+
+- ``manifest.json``: generación actual, snapshot base y lista de deltas.
+- ``base-<gen>.db.gz``: copia completa hecha con la API de respaldo de SQLite.
+- ``delta-<gen>-<n>.bin.gz``: solo las páginas que cambiaron desde el envío
+  anterior.
+
+Restaurar aplica la base y luego los deltas en orden. Cuando los deltas
+acumulan demasiado tamaño o número se compacta creando una base nueva.
+"""
+import gzip
+import hashlib
+import json
+import os
+import struct
+
+import sync
+import tracing
+
+MAGIC = b"RDLT"
+_HEADER = struct.Struct(">4sII")  # magia, tamaño de página, número de páginas
+_PAGE_NO = struct.Struct(">I")
+
+
+def _page_size(data):
+    """Tamaño de página según el encabezado del archivo SQLite"""
+    if len(data) < 100:
+        return 4096
+    size = struct.unpack(">H", data[16:18])[0]
+    return 65536 if size == 1 else size
+
+
+def _page_hashes(data, page_size):
+    return [hashlib.blake2b(data[i:i + page_size], digest_size=16).digest()
+            for i in range(0, len(data), page_size)]
+
+
+def encode_delta(old_hashes, data, page_size):
+    """Delta comprimido con las páginas de `data` que no coinciden con `old_hashes`"""
+    new_hashes = _page_hashes(data, page_size)
+    parts = [_HEADER.pack(MAGIC, page_size, len(new_hashes))]
+    changed = 0
+    for page_no, digest in enumerate(new_hashes):
+        if page_no >= len(old_hashes) or old_hashes[page_no] != digest:
+            offset = page_no * page_size
+            parts.append(_PAGE_NO.pack(page_no))
+            parts.append(data[offset:offset + page_size])
+            changed += 1
+    return gzip.compress(b"".join(parts)), changed, new_hashes
+
+
+def apply_delta(data, delta):
+    """Aplicar un delta comprimido sobre el contenido de la base"""
+    raw = gzip.decompress(delta)
+    magic, page_size, page_count = _HEADER.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError("Delta con formato desconocido")
+    out = bytearray(data[:page_count * page_size])
+    out.extend(b"\0" * (page_count * page_size - len(out)))
+    pos = _HEADER.size
+    while pos < len(raw):
+        (page_no,) = _PAGE_NO.unpack_from(raw, pos)
+        pos += _PAGE_NO.size
+        out[page_no * page_size:(page_no + 1) * page_size] = raw[pos:pos + page_size]
+        pos += page_size
+    return bytes(out)
+
+
+class SnapshotStore:
+    """Base comprimida más deltas de páginas sobre un repositorio tipo PyGithub"""
+
+    def __init__(self, repo, prefix="db/snapshot", max_deltas=50, max_delta_ratio=0.5):
+        self.repo = repo
+        self.prefix = prefix
+        self.max_deltas = max_deltas
+        self.max_delta_ratio = max_delta_ratio
+        self._manifest = None
+        self._hashes = None
+
+    def _path(self, name):
+        return f"{self.prefix}/{name}"
+
+    def _read(self, name):
+        return self.repo.get_contents(self._path(name)).decoded_content
+
+    def _write(self, name, content, message):
+        path = self._path(name)
+        try:
+            current = self.repo.get_contents(path)
+        except Exception:
+            self.repo.create_file(path, message, content)
+        else:
+            self.repo.update_file(path, message, content, current.sha)
+
+    def _delete(self, name):
+        try:
+            current = self.repo.get_contents(self._path(name))
+            self.repo.delete_file(current.path, f"Remove {name}", current.sha)
+        except Exception:
+            pass
+
+    def load_manifest(self):
+        """Leer el manifiesto del destino; None si todavía no hay snapshots"""
+        try:
+            self._manifest = json.loads(self._read("manifest.json"))
+        except Exception:
+            self._manifest = None
+        return self._manifest
+
+    def restore(self, db_path):
+        """Reconstruir la base local desde la base y sus deltas"""
+        with tracing.span("sync.restore") as span:
+            restored = self._restore(db_path, span)
+            if span:
+                span.set(restored=restored)
+            return restored
+
+    def _restore(self, db_path, span):
+        manifest = self.load_manifest()
+        if manifest is None:
+            return False
+        base = self._read(manifest["base"])
+        data = gzip.decompress(base)
+        transferred = len(base)
+        for name in manifest["deltas"]:
+            delta = self._read(name)
+            transferred += len(delta)
+            data = apply_delta(data, delta)
+        if span:
+            span.set(bytes=transferred, deltas=len(manifest["deltas"]))
+        tmp_path = db_path + ".restore"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, db_path)
+        self._hashes = _page_hashes(data, manifest["page_size"])
+        return True
+
+    def push(self, db_path):
+        """Enviar los cambios de la base; regresa qué se subió y cuántos bytes"""
+        with tracing.span("sync.push") as span:
+            result = self._push(db_path)
+            if span:
+                span.set(kind=result["kind"], bytes=result["bytes"])
+            return result
+
+    def _push(self, db_path):
+        data = sync.snapshot_bytes(db_path)
+        page_size = _page_size(data)
+        manifest = self._manifest if self._manifest is not None else self.load_manifest()
+        if manifest is None or self._hashes is None or manifest["page_size"] != page_size:
+            return self._push_base(data, page_size, manifest)
+
+        delta, changed, new_hashes = encode_delta(self._hashes, data, page_size)
+        if changed == 0 and len(new_hashes) == len(self._hashes):
+            return {"kind": "none", "bytes": 0}
+        if (len(manifest["deltas"]) >= self.max_deltas
+                or manifest["delta_bytes"] + len(delta) > manifest["base_bytes"] * self.max_delta_ratio):
+            return self._push_base(data, page_size, manifest)
+
+        name = f"delta-{manifest['generation']:06d}-{len(manifest['deltas']) + 1:06d}.bin.gz"
+        self._write(name, delta, f"Add {name}")
+        manifest = dict(manifest, deltas=manifest["deltas"] + [name],
+                        delta_bytes=manifest["delta_bytes"] + len(delta))
+        self._write("manifest.json", json.dumps(manifest, indent=1).encode("utf-8"), "Update snapshot manifest")
+        self._manifest = manifest
+        self._hashes = new_hashes
+        return {"kind": "delta", "bytes": len(delta), "pages": changed}
+
+    def _push_base(self, data, page_size, previous):
+        """Compactar: subir una base nueva y descartar los deltas anteriores"""
+        generation = previous["generation"] + 1 if previous else 1
+        base = gzip.compress(data)
+        name = f"base-{generation:06d}.db.gz"
+        self._write(name, base, f"Add {name}")
+        manifest = {
+            "version": 1,
+            "generation": generation,
+            "page_size": page_size,
+            "base": name,
+            "base_bytes": len(base),
+            "deltas": [],
+            "delta_bytes": 0,
+        }
+        self._write("manifest.json", json.dumps(manifest, indent=1).encode("utf-8"), "Update snapshot manifest")
+        if previous:
+            for old in [previous["base"]] + previous["deltas"]:
+                self._delete(old)
+        self._manifest = manifest
+        self._hashes = _page_hashes(data, page_size)
+        return {"kind": "base", "bytes": len(base)}
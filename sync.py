@@ -0,0 +1,207 @@
+"""Sincronización en segundo plano de la base de datos con GitHub.
+
+Las escrituras locales solo marcan la base como "sucia"; un hilo de fondo
+agrupa las ráfagas de escrituras y sube la base como máximo una vez por
+ventana de espera (debounce).
+"""
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import tracing
+
+REMOTE_PATH = "db/database.db"
+
+
+def github_repo(token, repo_name):
+    """Obtener el repositorio de GitHub (PyGithub se importa solo si hay token)"""
+    from github import Github
+
+    return Github(token).get_repo(repo_name)
+
+
+class LocalRepo:
+    """Sustituto local de la API de contenidos de un repositorio de PyGithub.
+
+    Guarda los archivos en un directorio; sirve para desarrollo sin token y
+    para probar la sincronización sin red.
+    """
+
+    class _Contents:
+        def __init__(self, path, content):
+            self.path = path
+            self.decoded_content = content
+            self.sha = hashlib.sha1(content).hexdigest()
+
+    def __init__(self, root):
+        self.root = root
+        self.calls = {"get_contents": 0, "create_file": 0, "update_file": 0, "delete_file": 0}
+
+    def _file(self, path):
+        return os.path.join(self.root, path)
+
+    def get_contents(self, path):
+        self.calls["get_contents"] += 1
+        try:
+            with open(self._file(path), "rb") as f:
+                return self._Contents(path, f.read())
+        except FileNotFoundError:
+            raise FileNotFoundError(f"{path} no existe en el repositorio")
+
+    def create_file(self, path, message, content):
+        self.calls["create_file"] += 1
+        os.makedirs(os.path.dirname(self._file(path)), exist_ok=True)
+        with open(self._file(path), "wb") as f:
+            f.write(content)
+
+    def update_file(self, path, message, content, sha):
+        self.calls["update_file"] += 1
+        current = self.get_contents(path)
+        if current.sha != sha:
+            raise RuntimeError(f"SHA desactualizado para {path}")
+        with open(self._file(path), "wb") as f:
+            f.write(content)
+
+    def delete_file(self, path, message, sha):
+        self.calls["delete_file"] += 1
+        if self.get_contents(path).sha != sha:
+            raise RuntimeError(f"SHA desactualizado para {path}")
+        os.remove(self._file(path))
+
+
+def snapshot_bytes(db_path):
+    """Copia consistente de la base con la API de respaldo de SQLite"""
+    fd, tmp_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        src = sqlite3.connect(db_path, timeout=30)
+        dst = sqlite3.connect(tmp_path)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        with open(tmp_path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(tmp_path)
+
+
+def download_file(repo, local_path, remote_path=REMOTE_PATH):
+    """Descargar la base del repositorio; regresa False si no existe"""
+    with tracing.span("sync.download") as span:
+        try:
+            contents = repo.get_contents(remote_path)
+        except Exception:
+            return False
+        tmp_path = local_path + ".download"
+        with open(tmp_path, "wb") as f:
+            f.write(contents.decoded_content)
+        shutil.move(tmp_path, local_path)
+        if span:
+            span.set(bytes=len(contents.decoded_content))
+        return True
+
+
+class SyncWorker:
+    """Hilo de fondo que sube la base como máximo una vez por ventana"""
+
+    def __init__(self, upload, debounce_seconds=10.0):
+        self._upload = upload
+        self.debounce_seconds = debounce_seconds
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._stopping = False
+        self._dirty = False
+        self._dirty_since = None
+        self._last_attempt = 0.0
+        self.last_success = None
+        self.last_error = None
+        self.last_error_at = None
+        self.uploads = 0
+        self.last_result = None
+        self._thread = threading.Thread(target=self._run, name="db-sync", daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self):
+        """Registrar que la base cambió; la subida ocurre en segundo plano"""
+        with self._lock:
+            if not self._dirty:
+                self._dirty = True
+                self._dirty_since = time.monotonic()
+            self._idle.clear()
+        self._wake.set()
+
+    def status(self):
+        """Estado de la sincronización para mostrarlo en la interfaz"""
+        with self._lock:
+            return {
+                "pending": self._dirty,
+                "last_success": self.last_success,
+                "last_error": self.last_error,
+                "last_error_at": self.last_error_at,
+                "uploads": self.uploads,
+                "last_result": self.last_result,
+            }
+
+    def flush(self, timeout=None):
+        """Subir de inmediato los cambios pendientes y esperar a que termine"""
+        with self._lock:
+            self._last_attempt = 0.0
+            self._dirty_since = 0.0 if self._dirty else None
+        self._wake.set()
+        return self._idle.wait(timeout)
+
+    def stop(self, flush=True, timeout=30):
+        """Detener el hilo, subiendo antes lo pendiente si se pide"""
+        if flush:
+            self.flush(timeout)
+        self._stopping = True
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _next_upload_at(self):
+        return max(self._dirty_since + self.debounce_seconds, self._last_attempt + self.debounce_seconds)
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait()
+            self._wake.clear()
+            while not self._stopping:
+                with self._lock:
+                    if not self._dirty:
+                        self._idle.set()
+                        break
+                    delay = self._next_upload_at() - time.monotonic()
+                    if delay <= 0:
+                        # Las escrituras que lleguen durante la subida vuelven a marcar la base
+                        self._dirty = False
+                        self._dirty_since = None
+                        self._last_attempt = time.monotonic()
+                if delay > 0:
+                    self._wake.wait(delay)
+                    self._wake.clear()
+                    continue
+                try:
+                    result = self._upload()
+                except Exception as e:
+                    with self._lock:
+                        self.last_error = str(e)
+                        self.last_error_at = datetime.now()
+                        # Reintentar en la siguiente ventana
+                        if not self._dirty:
+                            self._dirty = True
+                            self._dirty_since = time.monotonic()
+                else:
+                    with self._lock:
+                        self.uploads += 1
+                        self.last_result = result
+                        self.last_success = datetime.now()
+                        self.last_error = None
@@ -0,0 +1,23 @@
+import archive
+import exporter
+import migrations
+import services
+
+
+def test_export_incluye_rentas_finalizadas(tmp_path):
+    db_path = str(tmp_path / "rentas.db")
+    migrations.migrate(db_path)
+    id_cliente = services.register_cliente(db_path, "Ana", "5512345678", "ana@example.com")
+    equipos = [services.register_equipo(db_path, "Dell", "XPS", 100) for _ in range(2)]
+    finalizada = services.create_renta(db_path, id_cliente, [equipos[0]], "2025-03-01", "2025-03-10")
+    activa = services.create_renta(db_path, id_cliente, [equipos[1]], "2025-03-05", "2025-03-20")
+    archive.finalize(db_path, finalizada, hoy="2025-03-10")
+
+    out = tmp_path / "rentas.csv"
+    assert exporter.export(db_path, "rentas", str(out), desde="2025-03-01", hasta="2025-03-31") == 2
+    df = next(exporter.iter_chunks(db_path, "rentas", desde="2025-03-01", hasta="2025-03-31"))
+    assert df.id_renta.tolist() == [finalizada, activa]
+    assert df.id_equipo.tolist() == equipos
+
+    # Fuera del rango no se exporta ninguna de las dos
+    assert exporter.export(db_path, "rentas", str(out), hasta="2024-12-31") == 0
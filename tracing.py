@@ -0,0 +1,170 @@
+"""Instrumentación ligera de las rutas críticas.
+
+``span(nombre, **atributos)`` mide la duración de un bloque y registra
+atributos como filas o bytes transferidos. Los tiempos se guardan por nombre
+en una ventana móvil para calcular p50/p95, y opcionalmente cada span se
+agrega como una línea a un archivo JSONL para analizarlo después.
+
+Mientras la instrumentación está apagada ``span`` regresa un objeto vacío
+compartido, así que el costo es una llamada a función. El objeto vacío es
+falso, lo que permite omitir el cálculo de atributos costosos::
+
+    with tracing.span("sqlite.read", table="equipos") as s:
+        df = ...
+        if s:
+            s.set(rows=len(df))
+"""
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __bool__(self):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """Bloque medido; `set` agrega atributos (filas, bytes, ...)"""
+
+    __slots__ = ("tracer", "name", "attrs", "parent", "_start")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.parent = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        self.tracer._stack().pop()
+        # Las excepciones de control (p. ej. st.rerun) no son errores
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.record(self, duration)
+        return False
+
+
+class Tracer:
+    """Ventana móvil de duraciones por nombre de span y exportador JSONL opcional"""
+
+    def __init__(self, window=1000, export_path=None):
+        self.window = window
+        self.export_path = export_path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._durations = {}
+        self._totals = {}
+        self._export = open(export_path, "a", encoding="utf-8") if export_path else None
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def record(self, span, duration):
+        with self._lock:
+            durations = self._durations.get(span.name)
+            if durations is None:
+                durations = self._durations[span.name] = deque(maxlen=self.window)
+                self._totals[span.name] = {"count": 0, "rows": 0, "bytes": 0, "errors": 0}
+            durations.append(duration)
+            totals = self._totals[span.name]
+            totals["count"] += 1
+            totals["rows"] += span.attrs.get("rows") or 0
+            totals["bytes"] += span.attrs.get("bytes") or 0
+            totals["errors"] += "error" in span.attrs
+            if self._export is not None:
+                line = {"ts": datetime.now().isoformat(timespec="milliseconds"), "span": span.name,
+                        "ms": round(duration * 1000, 3), "parent": span.parent,
+                        "thread": threading.current_thread().name, **span.attrs}
+                self._export.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+                self._export.flush()
+
+    def summary(self):
+        """p50/p95/máximo en ms por span dentro de la ventana, con totales acumulados"""
+        with self._lock:
+            items = [(name, sorted(durations), dict(self._totals[name]))
+                     for name, durations in self._durations.items()]
+        rows = []
+        for name, durations, totals in sorted(items):
+            n = len(durations)
+            rows.append({
+                "span": name,
+                "n": n,
+                "p50_ms": round(durations[(n - 1) // 2] * 1000, 2),
+                "p95_ms": round(durations[min(n - 1, int(n * 0.95))] * 1000, 2),
+                "max_ms": round(durations[-1] * 1000, 2),
+                **totals,
+            })
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._totals.clear()
+
+    def close(self):
+        with self._lock:
+            if self._export is not None:
+                self._export.close()
+                self._export = None
+
+
+_tracer = None
+
+
+def configure(enabled, window=1000, export_path=None):
+    """Encender (o apagar) la instrumentación del proceso; regresa el tracer activo"""
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+    _tracer = Tracer(window, export_path) if enabled else None
+    return _tracer
+
+
+def enabled():
+    return _tracer is not None
+
+
+def span(name, **attrs):
+    """Medir un bloque `with`; sin costo apreciable si la instrumentación está apagada"""
+    if _tracer is None:
+        return _NOOP
+    return Span(_tracer, name, attrs)
+
+
+def summary():
+    return _tracer.summary() if _tracer is not None else []
+
+
+def reset():
+    if _tracer is not None:
+        _tracer.reset()
@@ -0,0 +1,30 @@
+"""Reglas de validación de datos de contacto.
+
+Las mismas expresiones se usan fila por fila en los formularios y de forma
+vectorizada (sobre una columna completa de pandas) en la importación masiva.
+"""
+import re
+
+EMAIL_PATTERN = r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+"
+PHONE_PATTERN = r"\+?\d{10,15}"
+
+_EMAIL = re.compile(EMAIL_PATTERN)
+_PHONE = re.compile(PHONE_PATTERN)
+
+
+def validate_email(email):
+    return _EMAIL.fullmatch(email) is not None
+
+
+def validate_phone(phone):
+    return _PHONE.fullmatch(phone) is not None
+
+
+def valid_emails(values):
+    """Máscara booleana de correos válidos para una Series de texto"""
+    return values.astype("string").str.fullmatch(EMAIL_PATTERN).fillna(False).astype(bool)
+
+
+def valid_phones(values):
+    """Máscara booleana de teléfonos válidos para una Series de texto"""
+    return values.astype("string").str.fullmatch(PHONE_PATTERN).fillna(False).astype(bool)